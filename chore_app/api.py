@@ -0,0 +1,257 @@
+"""
+Versioned JSON API for tablets and home automation.
+
+The same operations as the dashboards, without the HTML: the child's chore
+board, claiming and returning chores, approving and rejecting claims, the
+leaderboard and the point history. Responses are serialized straight from
+values() rows with compact separators, so a board is a few hundred bytes
+instead of a full page render.
+
+Clients sign in through /login/ like the browser and send the session
+cookie. POSTs need the CSRF token from the csrftoken cookie, which every
+GET sets, in an X-CSRFToken header. Every response carries the household's
+data version as "v"; GETs also answer If-None-Match with 304.
+"""
+
+import functools
+import hashlib
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition
+
+import chore_app.claims as claims
+import chore_app.models as models
+from chore_app.approvals import approve_claims
+from chore_app.board import get_chore_board_values
+from chore_app.constants import API_HISTORY_PER_PAGE
+from chore_app.pagination import keyset_paginate
+from chore_app.standings import get_leaderboard
+from chore_app.sync import changes_since
+from chore_app.utils import validate_pk
+from chore_app.versioning import profile_last_modified, request_data_version
+
+logger = logging.getLogger(__name__)
+
+CHORE_FIELDS = ('id', 'name', 'comment', 'points', 'available_time', 'early_bonus', 'bonus_end_time')
+CLAIM_FIELDS = ('id', 'chore_id', 'chore_name', 'user_id', 'points', 'approved', 'comment')
+BALANCE_FIELDS = ('points_balance', 'pocket_money', 'place_1', 'place_2', 'place_3')
+POINT_LOG_FIELDS = ('id', 'date_recorded', 'user_id', 'points_change', 'penalty', 'reason', 'chore', 'approver_id')
+
+
+def api_response(request, data, status=200):
+    """
+    Serialize an API response.
+
+    Args:
+        request: HTTP request object with authenticated user
+        data: Dict of plain values, Decimals and datetimes
+        status: HTTP status code
+
+    Returns:
+        JsonResponse: The compact JSON response, with the data version as "v"
+    """
+    data['v'] = request_data_version(request)[0]
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'separators': (',', ':')})
+
+
+def api_error(message, status):
+    return JsonResponse({'error': message}, status=status, json_dumps_params={'separators': (',', ':')})
+
+
+def api_etag(request, *args, **kwargs):
+    """
+    ETag for an API GET.
+
+    Like profile_etag(), but responses embed no CSRF token and no flash
+    messages, so only the data version, viewer, hour and URL matter.
+    """
+    if not request.user.is_authenticated:
+        return None
+    version, _ = request_data_version(request)
+    hour = timezone.localtime().strftime('%Y%m%d%H')
+    path = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()[:12]
+    return f"{version}-{request.user.household_id}-{request.user.pk}-{hour}-{path}"
+
+
+def api_view(methods, role=None):
+    """
+    Decorate an API view: JSON errors instead of login redirects, method
+    and role checks, and conditional GETs.
+
+    Args:
+        methods: Allowed HTTP methods
+        role: 'Parent' or 'Child' to restrict the view to one role
+    """
+    def decorator(view):
+        if 'GET' in methods:
+            view = condition(etag_func=api_etag, last_modified_func=profile_last_modified)(view)
+            view = ensure_csrf_cookie(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = api_error('Method not allowed', 405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            if not request.user.is_authenticated:
+                return api_error('Not signed in', 401)
+            if role and request.user.role != role:
+                return api_error(f'Only for {role.lower()} accounts', 403)
+            try:
+                return view(request, *args, **kwargs)
+            except Http404 as e:
+                return api_error(str(e) or 'Not found', 404)
+        return wrapper
+    return decorator
+
+
+@api_view(['GET'], role='Child')
+def board(request):
+    """
+    The child's chore board and balances.
+
+    Returns:
+        JSON with available, future, missed and claimed lists, points and
+        pocket_money
+    """
+    child = request.user
+    chore_board = get_chore_board_values(child, timezone.localtime().hour, CHORE_FIELDS, CLAIM_FIELDS)
+    balances = models.User.objects.filter(pk=child.pk).values('points_balance', 'pocket_money').get()
+    return api_response(request, {
+        **chore_board,
+        'points': balances['points_balance'],
+        'pocket_money': balances['pocket_money'],
+    })
+
+
+@api_view(['GET'], role='Child')
+def changes(request):
+    """
+    What changed on the child's board since ?since=<v>, for kiosk sync.
+
+    Returns:
+        JSON from chore_app.sync.changes_since(); just "v" when nothing
+        changed
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return api_error('Invalid version', 400)
+    data = changes_since(request.user, since, CHORE_FIELDS, CLAIM_FIELDS, BALANCE_FIELDS)
+    return JsonResponse(data, encoder=DjangoJSONEncoder, json_dumps_params={'separators': (',', ':')})
+
+
+@api_view(['GET'])
+def claim_list(request):
+    """
+    Pending claims: the household's for a parent, their own for a child.
+    """
+    pending = models.ChoreClaim.objects.filter(household_id=request.user.household_id, approved=0)
+    if request.user.role != 'Parent':
+        pending = pending.filter(user=request.user)
+    return api_response(request, {'claims': list(pending.order_by('pk').values(*CLAIM_FIELDS))})
+
+
+@api_view(['POST'], role='Child')
+def claim_chore(request, pk):
+    """
+    Claim a chore.
+
+    Returns:
+        JSON with the new claim (201), or an error: 404 for an unknown
+        chore, 409 if it can't be claimed
+    """
+    try:
+        claim = claims.claim_chore(request.user, pk)
+    except models.Chore.DoesNotExist:
+        return api_error('Chore not found', 404)
+    except claims.ClaimError as e:
+        return api_error(str(e), 409)
+    claim_row = models.ChoreClaim.objects.filter(pk=claim.pk).values(*CLAIM_FIELDS).get()
+    return api_response(request, {'claim': claim_row}, status=201)
+
+
+@api_view(['POST'])
+def return_claim(request, pk):
+    try:
+        claims.return_claim(request.user.household_id, pk)
+    except models.ChoreClaim.DoesNotExist:
+        return api_error('Claim not found', 404)
+    except claims.ClaimError as e:
+        return api_error(str(e), 409)
+    return api_response(request, {'returned': pk})
+
+
+@api_view(['POST'], role='Parent')
+def approve_claim(request, pk):
+    """
+    Approve a claim, with an optional "penalty" percentage (0-100) posted.
+
+    Returns:
+        JSON with the points awarded, or 409 if the claim was already
+        processed
+    """
+    try:
+        penalty = int(request.POST.get('penalty', 0))
+    except ValueError:
+        return api_error('Invalid penalty percentage', 400)
+    try:
+        approved = approve_claims(request.user.household_id, {pk: penalty}, request.user)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    if not approved:
+        return api_error('Claim not found or already processed', 409)
+    _, points_awarded = approved[0]
+    return api_response(request, {'approved': pk, 'points': points_awarded})
+
+
+@api_view(['POST'], role='Parent')
+def reject_claim(request, pk):
+    try:
+        claims.reject_claim(request.user.household_id, pk, request.user)
+    except models.ChoreClaim.DoesNotExist:
+        return api_error('Claim not found', 404)
+    except claims.ClaimError as e:
+        return api_error(str(e), 409)
+    return api_response(request, {'rejected': pk})
+
+
+@api_view(['GET'])
+def leaderboard(request):
+    """
+    Today's leaderboard, highest total first.
+    """
+    rows = get_leaderboard(request.user.household_id).values('user_id', 'user__username', 'total_points')
+    return api_response(request, {'leaderboard': list(rows)})
+
+
+@api_view(['GET'])
+def history(request):
+    """
+    Point history, newest first, a page at a time.
+
+    A child sees their own; a parent sees the household's, or one child's
+    with ?user=<pk>. Pass ?before=<next> for older entries and
+    ?after=<previous> for newer ones.
+
+    Returns:
+        JSON with the entries and the cursors of the neighbouring pages,
+        null where there is none
+    """
+    point_logs = models.PointLog.objects.filter(household_id=request.user.household_id)
+    if request.user.role != 'Parent':
+        point_logs = point_logs.filter(user=request.user)
+    elif request.GET.get('user'):
+        point_logs = point_logs.filter(user_id=validate_pk(request.GET['user']))
+
+    page = keyset_paginate(point_logs.values(*POINT_LOG_FIELDS), request.GET, API_HISTORY_PER_PAGE)
+    return api_response(request, {
+        'entries': page.object_list,
+        'next': page.next_cursor if page.has_next else None,
+        'previous': page.previous_cursor if page.has_previous else None,
+    })
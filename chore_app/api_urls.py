@@ -0,0 +1,20 @@
+"""
+URL configuration for version 1 of the JSON API, mounted at /api/v1/.
+"""
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path('board/', api.board, name='api_board'),
+    path('changes/', api.changes, name='api_changes'),
+    path('chores/<int:pk>/claim/', api.claim_chore, name='api_claim_chore'),
+
+    path('claims/', api.claim_list, name='api_claims'),
+    path('claims/<int:pk>/return/', api.return_claim, name='api_return_claim'),
+    path('claims/<int:pk>/approve/', api.approve_claim, name='api_approve_claim'),
+    path('claims/<int:pk>/reject/', api.reject_claim, name='api_reject_claim'),
+
+    path('leaderboard/', api.leaderboard, name='api_leaderboard'),
+    path('history/', api.history, name='api_history'),
+]
@@ -0,0 +1,131 @@
+"""
+Bulk approval of chore claims.
+
+Approving a claim writes a point log, credits the child's balance and daily
+standing, marks the claim approved and retires a non-daily chore. Doing that
+one claim at a time costs a transaction and several reads and saves per
+claim. approve_claims() approves any number of claims in one transaction with
+a fixed number of bulk statements; the parent's approve buttons, the "approve
+selected" action and the nightly auto-approve all go through it.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+import chore_app.events as events
+import chore_app.models as models
+from chore_app.metrics import count_on_commit
+from chore_app.standings import record_points_bulk
+from chore_app.sync import stamp_changes
+from chore_app.tenancy import current_database
+
+logger = logging.getLogger(__name__)
+
+
+def points_after_penalty(points, penalty):
+    """
+    Points awarded for a claim after a percentage penalty.
+
+    Args:
+        points: The claim's points
+        penalty: Penalty percentage, 0-100
+
+    Returns:
+        Decimal: Points awarded, never negative
+    """
+    penalty_decimal = Decimal(str(penalty))
+    points_awarded = points - (points * (penalty_decimal / 100))
+    return max(points_awarded, Decimal('0'))
+
+
+def approve_claims(household_id, penalties, approver):
+    """
+    Approve pending chore claims of a household.
+
+    Claims that no longer exist, belong to another household or were already
+    approved or rejected are skipped.
+
+    Args:
+        household_id: The household's pk
+        penalties: Dict of claim pk to penalty percentage (0-100)
+        approver: The user recorded as approver, or None for automatic approval
+
+    Returns:
+        list: (ChoreClaim, points_awarded) for each claim approved
+
+    Raises:
+        ValueError: If a penalty is outside 0-100; nothing is approved
+    """
+    for pk, penalty in penalties.items():
+        if penalty < 0 or penalty > 100:
+            raise ValueError(f"Invalid penalty percentage {penalty} for chore claim {pk}")
+
+    with transaction.atomic(using=current_database()):
+        # Take the pending claims with a write before reading them, so a return
+        # or rejection racing this approval finds their version changed
+        models.ChoreClaim.objects.filter(
+            household_id=household_id, pk__in=list(penalties), approved=0
+        ).update(version=F('version') + 1)
+        claims = list(models.ChoreClaim.objects.select_related('chore').filter(
+            household_id=household_id, pk__in=list(penalties), approved=0
+        ).order_by('pk'))
+
+        skipped = set(penalties) - {claim.pk for claim in claims}
+        if skipped:
+            logger.warning(f"Chore claims {sorted(skipped)} not found or already processed")
+        if not claims:
+            return []
+
+        approved = []
+        point_logs = []
+        user_totals = defaultdict(Decimal)
+        retired_chore_ids = set()
+        for claim in claims:
+            penalty = penalties[claim.pk]
+            points_awarded = points_after_penalty(claim.points, penalty)
+            claim.approved = points_awarded
+            approved.append((claim, points_awarded))
+            point_logs.append(models.PointLog(
+                household_id=household_id,
+                user_id=claim.user_id,
+                points_change=points_awarded,
+                penalty=penalty,
+                reason='Approved',
+                chore=claim.chore_name,
+                approver=approver,
+            ))
+            user_totals[claim.user_id] += points_awarded
+            # Non-daily chores stay unavailable once completed
+            if claim.chore and not claim.chore.daily:
+                retired_chore_ids.add(claim.chore_id)
+
+        models.PointLog.objects.bulk_create(point_logs)
+        record_points_bulk(user_totals)
+        models.User.objects.filter(pk__in=list(user_totals)).update(
+            points_balance=F('points_balance') + Case(
+                *[When(pk=user_id, then=Value(total)) for user_id, total in user_totals.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+        models.ChoreClaim.objects.bulk_update([claim for claim, _ in approved], ['approved'])
+        if retired_chore_ids:
+            models.Chore.objects.filter(pk__in=retired_chore_ids).update(
+                available=False, version=F('version') + 1)
+
+        # Bulk writes send no signals
+        stamp_changes(
+            household_id,
+            models.User.objects.filter(pk__in=list(user_totals)),
+            models.ChoreClaim.objects.filter(pk__in=[claim.pk for claim, _ in approved]),
+            models.Chore.objects.filter(pk__in=retired_chore_ids),
+        )
+        for claim, _ in approved:
+            events.publish_on_commit(events.CLAIM_APPROVED, household_id, claim=claim.pk, user=claim.user_id)
+        count_on_commit('chore_claims_total', len(approved), outcome='approved')
+
+    logger.info(f"Approved {len(approved)} chore claims")
+    return approved
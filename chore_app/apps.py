@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+
+
+class ChoreAppConfig(AppConfig):
+    name = 'chore_app'
+
+    def ready(self):
+        # Connect signal receivers
+        import chore_app.signals  # noqa: F401
+
+        # Count each request's queries for the metrics
+        from django.db.backends.signals import connection_created
+        from chore_app.metrics import install_query_counter
+        connection_created.connect(install_query_counter, dispatch_uid='chore_app_metrics_query_counter')
+
+        # Opt-in slow query log
+        from chore_app.slow_queries import install_slow_query_log
+        connection_created.connect(install_slow_query_log, dispatch_uid='chore_app_slow_query_log')
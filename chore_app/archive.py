@@ -0,0 +1,188 @@
+"""
+Hot/cold archival of point logs.
+
+PointLog only ever grows. Entries older than a configurable age are moved in
+batches to ArchivedPointLog, and each child's monthly totals are added to
+PointLogMonthlyRollup as they go, so the hot table (dashboards, leaderboard
+repairs, pagination) stays small. point_log_history() reads both tables;
+parents download the whole history from the export_point_log view.
+"""
+
+import csv
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+import chore_app.models as models
+from chore_app.constants import POINT_LOG_ARCHIVE_AFTER_DAYS, POINT_LOG_ARCHIVE_BATCH_SIZE
+from chore_app.tenancy import current_database
+from chore_app.versioning import bump_data_version, household_key
+
+logger = logging.getLogger(__name__)
+
+# Fields shared by PointLog and ArchivedPointLog
+HISTORY_FIELDS = (
+    'id', 'household', 'user', 'points_change', 'reason', 'chore', 'penalty',
+    'multiplier_type', 'date_recorded', 'approver',
+)
+
+# Columns of the point log export, as on the parents' dashboard
+EXPORT_COLUMNS = ('Date', 'User', 'Chore', 'Points Change', 'Penalty', 'Reason', 'Approver')
+
+
+def archive_cutoff(days=POINT_LOG_ARCHIVE_AFTER_DAYS):
+    """
+    The moment before which point logs are archived.
+
+    Args:
+        days: Age in days after which entries are archived
+
+    Returns:
+        datetime: Start of the local day `days` days ago
+    """
+    day = timezone.localdate() - datetime.timedelta(days=days)
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _month_of(moment):
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def _archive_batch(household_id, cutoff, batch_size):
+    """
+    Move one batch of a household's old point logs to the archive.
+
+    Returns:
+        int: Number of entries archived
+    """
+    with transaction.atomic(using=current_database()):
+        batch = list(models.PointLog.objects.filter(
+            household_id=household_id, date_recorded__lt=cutoff
+        ).order_by('date_recorded', 'id')[:batch_size])
+        if not batch:
+            return 0
+
+        models.ArchivedPointLog.objects.bulk_create([
+            models.ArchivedPointLog(
+                id=log.id,
+                household_id=log.household_id,
+                user_id=log.user_id,
+                points_change=log.points_change,
+                reason=log.reason,
+                chore=log.chore,
+                penalty=log.penalty,
+                multiplier_type=log.multiplier_type,
+                date_recorded=log.date_recorded,
+                approver_id=log.approver_id,
+            )
+            for log in batch
+        ])
+
+        totals = defaultdict(lambda: {'entries': 0, 'earned': Decimal('0'), 'lost': Decimal('0')})
+        for log in batch:
+            total = totals[(log.user_id, _month_of(log.date_recorded))]
+            total['entries'] += 1
+            if log.points_change >= 0:
+                total['earned'] += log.points_change
+            else:
+                total['lost'] += log.points_change
+
+        for (user_id, month), total in totals.items():
+            rollup, created = models.PointLogMonthlyRollup.objects.get_or_create(
+                user_id=user_id, month=month)
+            models.PointLogMonthlyRollup.objects.filter(pk=rollup.pk).update(
+                entries=F('entries') + total['entries'],
+                points_earned=F('points_earned') + total['earned'],
+                points_lost=F('points_lost') + total['lost'],
+                points_change=F('points_change') + total['earned'] + total['lost'],
+            )
+
+        models.PointLog.objects.filter(id__in=[log.id for log in batch]).delete()
+    return len(batch)
+
+
+def archive_point_logs(household_id, days=POINT_LOG_ARCHIVE_AFTER_DAYS, batch_size=POINT_LOG_ARCHIVE_BATCH_SIZE):
+    """
+    Move every point log of a household older than `days` days to the archive.
+
+    Each batch is its own transaction, so the job can be stopped and re-run
+    at any point without losing or duplicating entries.
+
+    Args:
+        household_id: The household's pk
+        days: Age in days after which entries are archived
+        batch_size: Entries moved per transaction
+
+    Returns:
+        int: Total number of entries archived
+    """
+    cutoff = archive_cutoff(days)
+    total = 0
+    while True:
+        moved = _archive_batch(household_id, cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        logger.info(f"Archived {moved} point logs older than {cutoff:%Y-%m-%d}")
+
+    if total:
+        # bulk_create and queryset deletes bypass the versioning signals
+        bump_data_version(household_key(household_id))
+    return total
+
+
+def point_log_history(household_id, user=None):
+    """
+    Every point log entry of a household, hot and archived, newest first.
+
+    Args:
+        household_id: The household's pk
+        user: Limit to one user's entries
+
+    Returns:
+        QuerySet: Dicts with the fields in HISTORY_FIELDS
+    """
+    hot = models.PointLog.objects.filter(household_id=household_id)
+    cold = models.ArchivedPointLog.objects.filter(household_id=household_id)
+    if user is not None:
+        hot = hot.filter(user=user)
+        cold = cold.filter(user=user)
+    return hot.values(*HISTORY_FIELDS).union(
+        cold.values(*HISTORY_FIELDS), all=True
+    ).order_by('-date_recorded', '-id')
+
+
+class _Line:
+    # File-like target for csv.writer that hands back each row it writes
+    def write(self, value):
+        return value
+
+
+def point_log_csv(household_id):
+    """
+    A household's whole point log, archived entries included, as CSV.
+
+    Args:
+        household_id: The household's pk
+
+    Yields:
+        str: The header, then a line per entry, newest first
+    """
+    usernames = dict(models.User.objects.filter(household_id=household_id).values_list('pk', 'username'))
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for log in point_log_history(household_id).iterator(chunk_size=POINT_LOG_ARCHIVE_BATCH_SIZE):
+        yield writer.writerow([
+            timezone.localtime(log['date_recorded']).isoformat(),
+            usernames.get(log['user'], ''),
+            log['chore'],
+            log['points_change'],
+            log['penalty'],
+            log['reason'],
+            usernames.get(log['approver'], ''),
+        ])
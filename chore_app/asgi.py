@@ -3,6 +3,11 @@ ASGI config for chore_app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Live dashboard updates (``/events/``) are Server-Sent Event streams, which are
+only held open cheaply under an ASGI server, e.g.
+``uvicorn chore_app.asgi:application``. Under WSGI the dashboards fall back to
+refreshing every 60 seconds.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -0,0 +1,155 @@
+"""
+Benchmark of the nightly job, phase by phase.
+
+benchmark_nightly() runs nightly_action for a household and records the
+time, query count and time spent in SQL of each phase, along with the size of
+the household's data, so runs against households seeded at different sizes
+(see the seed_scale command) show which phase grows faster than the data.
+
+Every run is rolled back: the household is left as it was, and it can be
+benchmarked again. The per-child phases run in this process, so their queries
+are counted.
+"""
+
+import contextlib
+import logging
+import statistics
+import time
+from collections import Counter
+
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+import chore_app.models as models
+from chore_app.nightly import PHASES
+from chore_app.query_budget import normalize_sql
+from chore_app.standings import standing_day
+from chore_app.tenancy import current_database, registry, use_household
+from chore_app.utils import nightly_action
+
+logger = logging.getLogger(__name__)
+
+
+class SQLTimer:
+    """
+    Execute wrapper that adds up the time spent in SQL.
+
+    CaptureQueriesContext rounds each query's time to the millisecond, so
+    the many sub-millisecond queries of a phase would add up to nothing.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+class PhaseRecorder:
+    """Time and queries of each phase, over one or more runs."""
+
+    def __init__(self):
+        self.runs = []
+
+    def start_run(self):
+        self.runs.append({})
+
+    @contextlib.contextmanager
+    def observe(self, phase):
+        connection = connections[current_database()]
+        timer = SQLTimer()
+        with CaptureQueriesContext(connection) as queries, connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            yield
+            seconds = time.perf_counter() - started
+        statements = Counter(normalize_sql(query['sql']) for query in queries.captured_queries)
+        sql, repeats = statements.most_common(1)[0] if statements else ('', 0)
+        self.runs[-1][phase] = {
+            'ms': seconds * 1000,
+            'queries': len(queries),
+            'sql_ms': timer.seconds * 1000,
+            'most_repeated': repeats,
+            'most_repeated_sql': sql,
+        }
+
+    def summary(self):
+        """
+        Returns:
+            dict: Phase to median time, median SQL time and the query counts
+                of the first run, in run order
+        """
+        phases = {}
+        for phase in PHASES:
+            rows = [run[phase] for run in self.runs if phase in run]
+            if not rows:
+                continue
+            phases[phase] = {
+                'ms': round(statistics.median(row['ms'] for row in rows), 1),
+                'sql_ms': round(statistics.median(row['sql_ms'] for row in rows), 2),
+                'queries': rows[0]['queries'],
+                'most_repeated': rows[0]['most_repeated'],
+                'most_repeated_sql': rows[0]['most_repeated_sql'],
+            }
+        return phases
+
+
+def data_size(household_id):
+    """
+    Row counts the nightly job's work depends on.
+
+    Args:
+        household_id: The household's pk
+
+    Returns:
+        dict: Counts of children, chores, pending claims and point logs
+    """
+    return {
+        'children': models.User.objects.filter(household_id=household_id, role='Child').count(),
+        'chores': models.Chore.objects.filter(household_id=household_id).count(),
+        'pending_claims': models.ChoreClaim.objects.filter(household_id=household_id, approved=0).count(),
+        'point_logs': models.PointLog.objects.filter(household_id=household_id).count(),
+    }
+
+
+def benchmark_nightly(household_id, repeat=1):
+    """
+    Time each phase of the nightly job for a household, rolling it back.
+
+    Args:
+        household_id: The household's pk
+        repeat: Runs to take the median time of
+
+    Returns:
+        dict: Household, data size, runs and per-phase results (see
+            PhaseRecorder.summary()), with the total
+    """
+    household = registry.get(household_id)
+    recorder = PhaseRecorder()
+    with use_household(household):
+        size = data_size(household_id)
+        approver = models.User.objects.filter(household_id=household_id, role='Parent').first()
+        for _ in range(repeat):
+            recorder.start_run()
+            with transaction.atomic(using=current_database()):
+                # Measure exactly one full run, even if tonight's has happened
+                models.NightlyRun.objects.filter(household_id=household_id).filter(
+                    finished_at__isnull=True).delete()
+                models.NightlyRun.objects.filter(household_id=household_id, run_date=standing_day()).delete()
+                nightly_action(household_id, approver=approver, workers=1, observe_phase=recorder.observe)
+                transaction.set_rollback(True, using=current_database())
+    phases = recorder.summary()
+    logger.info(f"Benchmarked the nightly job for {household.name} over {repeat} runs")
+    return {
+        'household': household.name,
+        'size': size,
+        'runs': repeat,
+        'phases': phases,
+        'total': {
+            'ms': round(sum(row['ms'] for row in phases.values()), 1),
+            'queries': sum(row['queries'] for row in phases.values()),
+        },
+    }
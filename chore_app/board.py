@@ -0,0 +1,133 @@
+"""
+Chore board engine for the child dashboard.
+
+Fetches every chore a child is eligible for in a single query and splits the
+rows into available, future and missed buckets in Python, so the cost of a
+board render does not grow with the number of buckets.
+"""
+
+from django.db.models import Q
+
+import chore_app.models as models
+from chore_app.constants import ALWAYS_AVAILABLE_TIME
+
+OPEN_ASSIGNMENT_TYPES = ('any_child', 'all_children')
+SELECTED_ASSIGNMENT_TYPES = ('any_selected', 'all_selected')
+
+BUCKET_AVAILABLE = 'available'
+BUCKET_FUTURE = 'future'
+BUCKET_MISSED = 'missed'
+
+
+def chore_time_bucket(available_time, current_hour):
+    """
+    Work out which board bucket a chore belongs in for the given hour.
+
+    A positive available_time means "available after that hour", a negative
+    one means "available before abs(available_time)" and zero means always
+    available.
+
+    Args:
+        available_time: The chore's available_time value
+        current_hour: The current hour (0-23)
+
+    Returns:
+        str: One of BUCKET_AVAILABLE, BUCKET_FUTURE or BUCKET_MISSED
+    """
+    if available_time == ALWAYS_AVAILABLE_TIME:
+        return BUCKET_AVAILABLE
+    if available_time > 0:
+        return BUCKET_AVAILABLE if current_hour >= available_time else BUCKET_FUTURE
+    return BUCKET_MISSED if current_hour > -available_time else BUCKET_AVAILABLE
+
+
+def eligible_chores(child):
+    """
+    Build the queryset of available chores a child may see on their board.
+
+    Chores assigned to selected children are matched through a subquery on the
+    assignment table rather than a join, so a chore never appears twice.
+    "Any of Selected" chores already claimed by one of the selected children
+    are excluded as well.
+
+    Args:
+        child: The child user
+
+    Returns:
+        QuerySet: Eligible, currently available chores
+    """
+    assigned_chore_ids = models.Chore.assigned_children.through.objects.filter(
+        user=child
+    ).values('chore_id')
+
+    claimed_by_others = models.ChoreClaim.objects.filter(
+        chore__assignment_type='any_selected',
+        chore__assigned_children=child
+    ).values('chore_id')
+
+    return models.Chore.objects.filter(household_id=child.household_id, available=True).filter(
+        Q(assignment_type__in=OPEN_ASSIGNMENT_TYPES) |
+        Q(assignment_type__in=SELECTED_ASSIGNMENT_TYPES, id__in=assigned_chore_ids)
+    ).exclude(id__in=claimed_by_others)
+
+
+def get_chore_board(child, current_hour):
+    """
+    Load the chore board for a child.
+
+    Runs one query for the child's claims and one for the eligible chores,
+    then buckets the chores by time in Python.
+
+    Args:
+        child: The child user
+        current_hour: The current hour (0-23)
+
+    Returns:
+        dict: Lists under 'available', 'future', 'missed' and 'claimed'
+    """
+    claimed_chores = list(models.ChoreClaim.objects.filter(user=child))
+    claimed_chore_names = {claim.chore_name for claim in claimed_chores}
+
+    board = {
+        BUCKET_AVAILABLE: [],
+        BUCKET_FUTURE: [],
+        BUCKET_MISSED: [],
+        'claimed': claimed_chores,
+    }
+    for chore in eligible_chores(child):
+        if chore.name in claimed_chore_names:
+            continue
+        board[chore_time_bucket(chore.available_time, current_hour)].append(chore)
+    return board
+
+
+def get_chore_board_values(child, current_hour, chore_fields, claim_fields):
+    """
+    Load the chore board for a child as dicts straight from values().
+
+    The same board as get_chore_board(), without building model instances,
+    for the JSON API.
+
+    Args:
+        child: The child user
+        current_hour: The current hour (0-23)
+        chore_fields: Chore fields to read; must include name and available_time
+        claim_fields: ChoreClaim fields to read; must include chore_name
+
+    Returns:
+        dict: Lists of dicts under 'available', 'future', 'missed' and 'claimed'
+    """
+    claimed_chores = list(models.ChoreClaim.objects.filter(user=child).order_by('pk').values(*claim_fields))
+    claimed_chore_names = {claim['chore_name'] for claim in claimed_chores}
+
+    board = {
+        BUCKET_AVAILABLE: [],
+        BUCKET_FUTURE: [],
+        BUCKET_MISSED: [],
+        'claimed': claimed_chores,
+    }
+    for chore in eligible_chores(child).order_by('pk').values(*chore_fields):
+        if chore['name'] in claimed_chore_names:
+            continue
+        board[chore_time_bucket(chore['available_time'], current_hour)].append(chore)
+    return board
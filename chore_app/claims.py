@@ -0,0 +1,237 @@
+"""
+Claiming, returning and rejecting chores.
+
+Shared by the HTML dashboards and the JSON API. Each function does the whole
+change in one transaction and queues the matching live event; anything the
+user is not allowed to do raises ClaimError with a message fit to show them.
+
+Nothing is locked while checking. Chores and claims carry a version that every
+claim, return, rejection and approval bumps, and each change starts with a
+conditional UPDATE that only matches the row as it was read (available, not
+yet processed, same version). When two children race for a chore exactly one
+UPDATE matches; the other finds the chore taken as soon as the winner commits.
+Starting with a write also means each transaction takes SQLite's write lock
+before reading anything, so it never has to upgrade a read lock.
+"""
+
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+import chore_app.events as events
+import chore_app.models as models
+from chore_app.config import get_config
+from chore_app.constants import CLAIM_ATTEMPTS, EARLY_BONUS_START_HOUR, REJECTION_PENALTY
+from chore_app.metrics import count_on_commit
+from chore_app.standings import record_points
+from chore_app.sync import stamp_changes
+from chore_app.tenancy import current_database
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimError(Exception):
+    """A claim, return or rejection that is not allowed."""
+
+
+def can_claim(chore, child):
+    """
+    Check the chore's assignment type allows the child to claim it.
+
+    Args:
+        chore: The chore
+        child: The child user
+
+    Returns:
+        bool: True if the child may claim the chore
+    """
+    if chore.assignment_type in ('any_child', 'all_children'):
+        return True
+    if chore.assignment_type in ('any_selected', 'all_selected'):
+        return chore.assigned_children.filter(id=child.id).exists()
+    return False
+
+
+def claim_points(chore, current_time):
+    """
+    Points and comment for a claim made at a given time, with any early bonus.
+
+    Args:
+        chore: The chore being claimed
+        current_time: The local time of the claim
+
+    Returns:
+        tuple: (points, comment)
+    """
+    if current_time <= datetime.time(chore.bonus_end_time) \
+            and current_time > datetime.time(EARLY_BONUS_START_HOUR) \
+            and chore.early_bonus:
+        bonus_percent = get_config(chore.household_id).setting('bonus_percent')
+        if bonus_percent is not None:
+            points = chore.points * ((bonus_percent + 100) / 100)
+            bonus_points = points - chore.points
+            return points, f'Early Bonus of {bonus_points:.0f} points: {chore.comment}'
+    return chore.points, chore.comment
+
+
+def claim_chore(child, chore_pk):
+    """
+    Claim a chore for a child.
+
+    Args:
+        child: The child user
+        chore_pk: The chore's pk
+
+    Returns:
+        ChoreClaim: The new claim
+
+    Raises:
+        Chore.DoesNotExist: If the chore is not in the child's household
+        ClaimError: If the chore is unavailable, not assigned to the child or
+            already claimed by them
+    """
+    current_time = timezone.localtime().time()
+
+    for _ in range(CLAIM_ATTEMPTS):
+        chore = models.Chore.objects.get(pk=chore_pk, household_id=child.household_id)
+
+        if not chore.available:
+            raise ClaimError('This chore is no longer available.')
+        if not can_claim(chore, child):
+            raise ClaimError('You are not allowed to claim this chore.')
+        if models.ChoreClaim.objects.filter(chore=chore, user=child, approved=0).exists():
+            raise ClaimError('You have already claimed this chore.')
+
+        points, comment = claim_points(chore, current_time)
+        claim = _take_chore(child, chore, points, comment)
+        if claim is not None:
+            return claim
+        # Someone else claimed, returned or had a claim approved since we read
+        # the chore; check again against the new state
+
+    raise ClaimError('This chore is busy, please try again.')
+
+
+def _take_chore(child, chore, points, comment):
+    # Claim the chore as read, or return None if it has changed since
+    with transaction.atomic(using=current_database()):
+        changes = {'version': F('version') + 1}
+        # "Any child" chores are hidden by the claim that wins them
+        if chore.assignment_type in ('any_child', 'any_selected'):
+            changes['available'] = False
+        taken = models.Chore.objects.filter(
+            pk=chore.pk, available=True, version=chore.version).update(**changes)
+        if not taken:
+            return None
+
+        claim = models.ChoreClaim.objects.create(
+            household_id=chore.household_id,
+            chore=chore,
+            user=child,
+            chore_name=chore.name,
+            points=points,
+            comment=comment
+        )
+
+        if chore.assignment_type == 'all_selected':
+            # For "All of Selected Children", only hide after ALL selected children claim it
+            selected_children = chore.assigned_children.all()
+            claimed_by_selected = models.ChoreClaim.objects.filter(
+                chore=chore,
+                user__in=selected_children
+            ).values_list('user', flat=True).distinct()
+            if set(claimed_by_selected) == set(selected_children.values_list('id', flat=True)):
+                models.Chore.objects.filter(pk=chore.pk).update(available=False)
+        # 'all_children' chores stay available for every child
+
+        # update() sends no signals
+        stamp_changes(chore.household_id, models.Chore.objects.filter(pk=chore.pk))
+        events.publish_on_commit(events.CHORE_CLAIMED, chore.household_id, chore=chore.pk, user=child.pk)
+        count_on_commit('chore_claims_total', outcome='claimed')
+    return claim
+
+
+def _make_available(household_id, chore_pk):
+    chore = models.Chore.objects.filter(pk=chore_pk)
+    chore.update(available=True, version=F('version') + 1)
+    # update() sends no signals
+    stamp_changes(household_id, chore)
+
+
+def _pending_claim(household_id, claim_pk):
+    claim = models.ChoreClaim.objects.get(pk=claim_pk, household_id=household_id)
+    if claim.approved != 0:
+        raise ClaimError('This chore claim has already been processed.')
+    return claim
+
+
+def _take_claim(claim):
+    # Bump the claim's version if it is unchanged since it was read
+    taken = models.ChoreClaim.objects.filter(
+        pk=claim.pk, approved=0, version=claim.version).update(version=F('version') + 1)
+    if not taken:
+        raise ClaimError('This chore claim has already been processed.')
+
+
+def return_claim(household_id, claim_pk):
+    """
+    Hand back a pending claim, making its chore available again.
+
+    Args:
+        household_id: The household's pk
+        claim_pk: The claim's pk
+
+    Returns:
+        ChoreClaim: The deleted claim
+
+    Raises:
+        ChoreClaim.DoesNotExist: If the claim is not in the household
+        ClaimError: If the claim was already approved, rejected or returned
+    """
+    claim = _pending_claim(household_id, claim_pk)
+    with transaction.atomic(using=current_database()):
+        _take_claim(claim)
+        if claim.chore_id:
+            _make_available(household_id, claim.chore_id)
+        claim.delete()
+        events.publish_on_commit(events.CHORE_RETURNED, household_id, chore=claim.chore_id, user=claim.user_id)
+        count_on_commit('chore_claims_total', outcome='returned')
+    return claim
+
+
+def reject_claim(household_id, claim_pk, approver):
+    """
+    Reject a pending claim, making its chore available again.
+
+    The child gets a zero-point log entry, which still places them on
+    today's leaderboard.
+
+    Args:
+        household_id: The household's pk
+        claim_pk: The claim's pk
+        approver: The parent rejecting the claim
+
+    Returns:
+        ChoreClaim: The deleted claim
+
+    Raises:
+        ChoreClaim.DoesNotExist: If the claim is not in the household
+        ClaimError: If the claim was already approved, rejected or returned
+    """
+    claim = _pending_claim(household_id, claim_pk)
+    with transaction.atomic(using=current_database()):
+        _take_claim(claim)
+        if claim.chore_id:
+            _make_available(household_id, claim.chore_id)
+        models.PointLog.objects.create(household_id=household_id, user_id=claim.user_id, points_change=0,
+                                       penalty=REJECTION_PENALTY, reason='Rejected', chore=claim.chore_name,
+                                       approver=approver)
+        # Rejections still place the child on today's leaderboard
+        record_points(claim.user_id, 0)
+        claim.delete()
+        events.publish_on_commit(events.CLAIM_REJECTED, household_id, claim=claim_pk, user=claim.user_id)
+        count_on_commit('chore_claims_total', outcome='rejected')
+    return claim
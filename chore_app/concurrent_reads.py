@@ -0,0 +1,49 @@
+"""
+Concurrent database reads for async views.
+
+Django's async ORM runs each query on the request's one sync thread, one
+after another. gather_reads() runs independent reads on separate worker
+threads instead, each with its own database connection, so a page costs
+about as much as its slowest read rather than the sum of them. SQLite serves
+concurrent readers, and the sqlite3 module releases the GIL while a query
+runs.
+
+Reads see the caller's household database and time zone: both are context
+variables, which the worker threads inherit. With settings.CONCURRENT_READS
+off they run one after another on the request's thread instead, where
+query counting (see chore_app.query_budget) sees them.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def _run_read(read):
+    try:
+        return read()
+    finally:
+        # Worker threads are outside the request cycle that closes connections;
+        # persistent ones (CONN_MAX_AGE) stay open for the thread's next read
+        close_old_connections()
+
+
+async def gather_reads(*reads):
+    """
+    Run independent reads concurrently.
+
+    Args:
+        *reads: Callables doing sync ORM reads. They must not write, and must
+            return evaluated results (lists, not lazy querysets).
+
+    Returns:
+        list: Their results, in order
+    """
+    if not settings.CONCURRENT_READS:
+        return [await sync_to_async(read)() for read in reads]
+    return await asyncio.gather(*[
+        sync_to_async(_run_read, thread_sensitive=False)(read)
+        for read in reads
+    ])
@@ -0,0 +1,121 @@
+"""
+Process-wide cache of configuration and nightly run state.
+
+Settings, Text and RunLog rows change a few times a month but are read on
+every dashboard request. Each household's rows are loaded once per process
+into an immutable snapshot. Saves in this process invalidate the snapshot straight away through
+signals; saves in other processes (the cron job, other server workers) bump
+the 'config' version stamp, which is re-checked at most every
+CONFIG_RECHECK_SECONDS.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, NamedTuple, Optional
+
+from django.db.models import Max
+
+from chore_app.tenancy import current_database
+from chore_app.versioning import CONFIG_VERSION_KEY, get_data_version
+
+logger = logging.getLogger(__name__)
+
+# How often to look for changes made by other processes
+CONFIG_RECHECK_SECONDS = 5
+
+
+class TextEntry(NamedTuple):
+    key: str
+    text: str
+    enabled: bool
+
+
+class ConfigSnapshot(NamedTuple):
+    version: int
+    settings: Dict[str, Decimal]
+    texts: Dict[str, TextEntry]
+    last_runs: Dict[str, datetime.date]
+
+    def setting(self, key: str, default: Optional[Decimal] = None) -> Optional[Decimal]:
+        return self.settings.get(key, default)
+
+    def text(self, key: str) -> Optional[TextEntry]:
+        return self.texts.get(key)
+
+    def last_run(self, job_code: str) -> Optional[datetime.date]:
+        return self.last_runs.get(job_code)
+
+
+class ConfigCache:
+    """
+    Holds the current ConfigSnapshot of each household for this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (database alias, household pk) -> (snapshot, checked_at)
+        self._snapshots = {}
+
+    def get(self, household_id):
+        """
+        Get a household's current snapshot, loading or reloading it if needed.
+
+        Args:
+            household_id: The household's pk
+
+        Returns:
+            ConfigSnapshot: The cached configuration
+        """
+        cache_key = (current_database(), household_id)
+        snapshot, checked_at = self._snapshots.get(cache_key, (None, 0.0))
+        now = time.monotonic()
+        if snapshot is not None and now - checked_at < CONFIG_RECHECK_SECONDS:
+            return snapshot
+
+        with self._lock:
+            snapshot, checked_at = self._snapshots.get(cache_key, (None, 0.0))
+            if snapshot is not None and now - checked_at < CONFIG_RECHECK_SECONDS:
+                return snapshot
+            version, _ = get_data_version(CONFIG_VERSION_KEY)
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._load(household_id, version)
+            self._snapshots[cache_key] = (snapshot, now)
+            return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots = {}
+
+    def _load(self, household_id, version):
+        from chore_app.models import RunLog, Settings, Text  # Import here to avoid circular imports
+        settings = dict(Settings.objects.filter(household_id=household_id).values_list('key', 'value'))
+        texts = {
+            key: TextEntry(key, text, enabled)
+            for key, text, enabled in Text.objects.filter(household_id=household_id).values_list('key', 'text', 'enabled')
+        }
+        # RunLog has a row per attempt; failed runs don't count as runs
+        last_runs = dict(
+            RunLog.objects.filter(household_id=household_id, succeeded=True)
+            .values('job_code').annotate(last=Max('run_date')).values_list('job_code', 'last')
+        )
+        logger.debug(f"Loaded configuration snapshot for household {household_id} at version {version}")
+        return ConfigSnapshot(version, settings, texts, last_runs)
+
+
+config_cache = ConfigCache()
+
+
+def get_config(household_id):
+    """
+    Get a household's cached configuration snapshot for this process.
+
+    Args:
+        household_id: The household's pk
+
+    Returns:
+        ConfigSnapshot: Settings, texts and last run dates
+    """
+    return config_cache.get(household_id)
@@ -12,6 +12,18 @@ EARLY_BONUS_START_HOUR = 5
 # Pagination constants
 POINT_LOGS_PER_PAGE = 20
 CHILD_POINT_LOGS_PER_PAGE = 10
+API_HISTORY_PER_PAGE = 50
+
+# Point log archival constants
+POINT_LOG_ARCHIVE_AFTER_DAYS = 90
+POINT_LOG_ARCHIVE_BATCH_SIZE = 1000
+
+# Kiosk sync constants
+SYNC_TOMBSTONE_KEEP_DAYS = 30  # Kiosks offline for longer start over with a full sync
+
+# Nightly run constants
+NIGHTLY_CHILD_BATCH_SIZE = 100  # Children per transaction in per-child phases
+NIGHTLY_JOB_CODE = 'chore_app.cron.nightly_action'  # RunLog job code of the nightly run
 
 # Leaderboard constants
 LEADERBOARD_FIRST_PLACE_MULTIPLIER = 1
@@ -25,3 +37,7 @@ REJECTION_PENALTY = 100
 # Chore availability constants
 ALWAYS_AVAILABLE_TIME = 0
 
+
+# Claim constants
+# Times a claim re-reads a chore that changed under it before giving up
+CLAIM_ATTEMPTS = 3
@@ -0,0 +1,252 @@
+"""
+Live update events for the dashboards.
+
+Views publish a small event whenever the board changes (a chore is claimed or
+returned, a claim is approved or rejected, availability is toggled). The
+Server-Sent Events endpoint streams these to every connected tablet of the
+same household, so pages only refresh the blocks that changed instead of
+re-rendering every minute.
+
+The broker is in-process: events reach only the streams of the worker that
+made the change. Writes from the cron job or another worker are noticed by
+VersionWatcher, which polls each watched household's data version once per
+VERSION_CHECK_INTERVAL for all of the worker's streams, and sent as
+DATA_CHANGED.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+from django.db import transaction
+
+from chore_app.tenancy import current_database
+from chore_app.versioning import aget_data_version, household_key
+
+logger = logging.getLogger(__name__)
+
+# Event names
+CHORE_CLAIMED = 'chore_claimed'
+CHORE_RETURNED = 'chore_returned'
+CLAIM_APPROVED = 'claim_approved'
+CLAIM_REJECTED = 'claim_rejected'
+AVAILABILITY_CHANGED = 'availability_changed'
+BALANCE_CHANGED = 'balance_changed'
+# Sent when the data version moved without an in-process event, e.g. a write
+# from the cron job or another server worker
+DATA_CHANGED = 'data_changed'
+
+# Seconds between keepalive comments on an idle stream
+KEEPALIVE_INTERVAL = 25
+
+# Seconds between checks of a household's data version, per worker. Writes
+# from the cron job or another server worker reach streams within this
+VERSION_CHECK_INTERVAL = 1
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBroker:
+    """
+    In-process fan-out of events to connected SSE streams.
+
+    Subscribers are asyncio queues owned by the event loop serving the stream.
+    Publishing is thread-safe, so sync views running in a worker thread can
+    publish without touching the loop directly.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, household_id=None):
+        """
+        Register a new subscriber on the running event loop.
+
+        Args:
+            household_id: Only receive this household's events; None for all
+
+        Returns:
+            tuple: (loop, queue, household_id) handle to pass back to unsubscribe
+        """
+        handle = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE), household_id)
+        with self._lock:
+            self._subscribers.add(handle)
+        return handle
+
+    def unsubscribe(self, handle):
+        with self._lock:
+            self._subscribers.discard(handle)
+
+    def publish(self, event, data=None, household_id=None):
+        """
+        Send an event to every subscriber of a household.
+
+        Args:
+            event: Event name, one of the constants in this module
+            data: JSON-serialisable payload
+            household_id: The household the event belongs to
+        """
+        message = format_event(event, data or {})
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue, subscribed_to in subscribers:
+            if subscribed_to is not None and subscribed_to != household_id:
+                continue
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # Loop already closed; the stream's cleanup will unsubscribe it
+                pass
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _offer(queue, message):
+    """Queue a message, dropping the oldest one if a slow client is behind."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+def format_event(event, data):
+    """
+    Encode an event in the text/event-stream wire format.
+
+    Args:
+        event: Event name
+        data: JSON-serialisable payload
+
+    Returns:
+        str: The encoded event
+    """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+broker = EventBroker()
+
+
+class VersionWatcher:
+    """
+    One poll of a household's data version per process, shared by every
+    stream of that household, publishing DATA_CHANGED when it moves.
+
+    The poll runs while the household has a stream open, on the event loop
+    of the stream that started it.
+    """
+
+    def __init__(self):
+        self._watches = {}
+        self._lock = threading.Lock()
+
+    def watch(self, household_id, database):
+        """
+        Start polling a household's version, or join the running poll.
+
+        Args:
+            household_id: The household's pk
+            database: The household's database alias
+
+        Returns:
+            tuple: Key to pass back to unwatch
+        """
+        key = (household_id, database)
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                watch = self._watches[key] = [asyncio.get_running_loop().create_task(self._poll(*key)), 0]
+            watch[1] += 1
+        return key
+
+    def unwatch(self, key):
+        with self._lock:
+            watch = self._watches[key]
+            watch[1] -= 1
+            if watch[1]:
+                return
+            del self._watches[key]
+        task = watch[0]
+        try:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # Loop already closed, and the task with it
+            pass
+
+    async def _poll(self, household_id, database):
+        version_key = household_key(household_id)
+        version = None
+        while True:
+            try:
+                latest, _ = await aget_data_version(version_key, using=database)
+            except Exception as e:
+                logger.error(f"Error checking the data version of household {household_id}: {e}")
+            else:
+                # A local write moves the version too, so its page may refresh twice
+                if version is not None and latest != version:
+                    broker.publish(DATA_CHANGED, {'version': latest}, household_id)
+                version = latest
+            await asyncio.sleep(VERSION_CHECK_INTERVAL)
+
+    @property
+    def watch_count(self):
+        with self._lock:
+            return len(self._watches)
+
+
+version_watcher = VersionWatcher()
+
+
+def publish_on_commit(event, household_id, **data):
+    """
+    Publish an event once the current transaction commits.
+
+    Outside a transaction the event is published immediately.
+
+    Args:
+        event: Event name
+        household_id: The household the event belongs to
+        **data: Payload fields
+    """
+    def _publish():
+        try:
+            broker.publish(event, data, household_id)
+        except Exception as e:
+            logger.error(f"Error publishing {event} event: {e}")
+
+    transaction.on_commit(_publish, using=current_database())
+
+
+async def event_stream(household_id, database):
+    """
+    Subscribe to a household's events and yield them, with keepalives while
+    idle.
+
+    The subscription is made on first iteration, on the loop serving the
+    response, and dropped when the client disconnects. Writes from other
+    processes arrive through version_watcher as DATA_CHANGED events.
+
+    Args:
+        household_id: The household's pk
+        database: The household's database alias
+    """
+    handle = broker.subscribe(household_id)
+    _, queue, _ = handle
+    watch = version_watcher.watch(household_id, database)
+    try:
+        # Tell the browser how long to wait before reconnecting
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield message
+    finally:
+        version_watcher.unwatch(watch)
+        broker.unsubscribe(handle)
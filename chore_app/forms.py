@@ -27,6 +27,12 @@ class ChoreForm(forms.ModelForm):
             'assigned_children': forms.CheckboxSelectMultiple()
         }
 
+    def __init__(self, *args, household_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the household's own children can be assigned
+        if household_id is not None:
+            self.fields['assigned_children'].queryset = User.objects.filter(household_id=household_id, role='Child')
+
 
 class EditChoreForm(forms.ModelForm):
     class Meta:
@@ -52,6 +58,12 @@ class EditChoreForm(forms.ModelForm):
             'assigned_children': forms.CheckboxSelectMultiple()
         }
 
+    def __init__(self, *args, household_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the household's own children can be assigned
+        if household_id is not None:
+            self.fields['assigned_children'].queryset = User.objects.filter(household_id=household_id, role='Child')
+
 
 class PointAdjustmentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,345 @@
+"""
+Load test for the tablet polling workload.
+
+Simulates a household's tablets: children poll child_profile, claim chores
+and return some of them; parents poll parent_profile and approve claims.
+Each virtual user polls once per interval like the dashboards do, sending the
+last ETag so unchanged pages come back as 304, and acts on the forms of the
+last page it got, as a person tapping its buttons would.
+
+Requests go either through the Django test client, in this process, or over
+HTTP to a running server that uses the same database. Latencies are recorded
+per view and summarized as percentiles and throughput (see run_load_test()).
+"""
+
+import http.cookiejar
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import Client
+
+import chore_app.models as models
+from chore_app.sync import delete_synced
+from chore_app.versioning import bump_data_version, household_key
+
+logger = logging.getLogger(__name__)
+
+# Seconds before an HTTP request counts as failed
+REQUEST_TIMEOUT = 30
+
+CLAIM_ACTION = re.compile(rb'action="(/claim_chore/\d+/)"')
+RETURN_ACTION = re.compile(rb'action="(/return_chore/\d+/)"')
+APPROVE_ACTION = re.compile(rb'action="(/approve_chore_claim/\d+/0/)"')
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile.
+
+    Args:
+        sorted_values: Values in ascending order
+        percent: 0-100
+
+    Returns:
+        The value, or None for no values
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class TestClientSession:
+    """Requests through the Django test client, in this process."""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, data=None, headers=None):
+        if method == 'POST':
+            response = self.client.post(path, data or {}, headers=headers)
+        else:
+            response = self.client.get(path, headers=headers)
+        body = b'' if response.streaming else response.content
+        return response.status_code, response.headers, body
+
+    def cookie(self, name):
+        morsel = self.client.cookies.get(name)
+        return morsel.value if morsel else ''
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Report redirects as they are, like the test client
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """Requests over HTTP to a running server, with a cookie jar."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def request(self, method, path, data=None, headers=None):
+        body = urllib.parse.urlencode(data or {}).encode() if method == 'POST' else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers or {}, method=method)
+        try:
+            with self.opener.open(request, timeout=REQUEST_TIMEOUT) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def cookie(self, name):
+        for cookie in self.cookies:
+            if cookie.name == name:
+                return cookie.value
+        return ''
+
+
+class Recorder:
+    """Thread-safe latency samples per view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, view, seconds, status):
+        with self._lock:
+            self.samples[view].append((seconds, status))
+
+    def summary(self, elapsed):
+        """
+        Args:
+            elapsed: Length of the measured window, in seconds
+
+        Returns:
+            dict: View name to request count, errors, status counts,
+                throughput (requests/s) and latency percentiles (ms)
+        """
+        views = {}
+        with self._lock:
+            samples = {view: list(rows) for view, rows in self.samples.items()}
+        for view, rows in sorted(samples.items()):
+            latencies = sorted(seconds * 1000 for seconds, _ in rows)
+            statuses = Counter(status for _, status in rows)
+            views[view] = {
+                'requests': len(rows),
+                'errors': sum(count for status, count in statuses.items() if status == 0 or status >= 500),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'throughput': round(len(rows) / elapsed, 3) if elapsed else None,
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 2),
+                    'p95': round(percentile(latencies, 95), 2),
+                    'p99': round(percentile(latencies, 99), 2),
+                    'max': round(latencies[-1], 2),
+                    'mean': round(sum(latencies) / len(latencies), 2),
+                },
+            }
+        return views
+
+
+class VirtualUser:
+    """One tablet: logs in, then polls its dashboard and acts on it."""
+
+    def __init__(self, session, recorder, username, password, role, rng, rates):
+        self.session = session
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.role = role
+        self.rng = rng
+        self.rates = rates
+        self.page_view = 'parent_profile' if role == 'Parent' else 'child_profile'
+        self.etag = None
+        self.page = b''
+
+    def _timed(self, view, method, path, data=None, headers=None):
+        started = time.perf_counter()
+        try:
+            status, response_headers, body = self.session.request(method, path, data, headers)
+        except OSError as e:
+            logger.warning(f"Load test {method} {path} failed: {e}")
+            status, response_headers, body = 0, {}, b''
+        self.recorder.record(view, time.perf_counter() - started, status)
+        return status, response_headers, body
+
+    def _post(self, view, path):
+        token = self.session.cookie(settings.CSRF_COOKIE_NAME)
+        return self._timed(view, 'POST', path, {'csrfmiddlewaretoken': token}, {'X-CSRFToken': token})
+
+    def login(self):
+        """
+        Returns:
+            bool: True if the login was accepted
+        """
+        self.session.request('GET', '/login/')
+        token = self.session.cookie(settings.CSRF_COOKIE_NAME)
+        status, _, _ = self.session.request('POST', '/login/', {
+            'username': self.username, 'password': self.password, 'csrfmiddlewaretoken': token,
+        })
+        return status == 302
+
+    def poll(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        status, response_headers, body = self._timed(self.page_view, 'GET', f'/{self.page_view}/', headers=headers)
+        if status == 200:
+            self.etag = response_headers.get('ETag')
+            self.page = body
+
+    def act(self):
+        if self.role == 'Parent':
+            # Each claim has two approve forms on the page; approve it once
+            for path in dict.fromkeys(APPROVE_ACTION.findall(self.page)):
+                if self.rng.random() < self.rates['approve']:
+                    self._post('approve_chore_claim', path.decode())
+            return
+        returnable = RETURN_ACTION.findall(self.page)
+        if returnable and self.rng.random() < self.rates['return']:
+            self._post('return_chore', self.rng.choice(returnable).decode())
+        claimable = CLAIM_ACTION.findall(self.page)
+        if claimable and self.rng.random() < self.rates['claim']:
+            self._post('claim_chore', self.rng.choice(claimable).decode())
+
+    def run(self, start_at, stop_at, interval):
+        # Spread the tablets over the interval, as they would be in practice
+        next_poll = start_at + self.rng.uniform(0, interval)
+        while next_poll < stop_at:
+            time.sleep(max(0.0, next_poll - time.monotonic()))
+            self.poll()
+            self.act()
+            next_poll += interval
+
+
+def prepare_household(name, children, parents, chores, password):
+    """
+    Create or reset the load test household and its accounts.
+
+    Pending and finished claims are cleared and every chore made available,
+    so each run starts from the same state.
+
+    Args:
+        name: Household name
+        children: Number of child accounts
+        parents: Number of parent accounts
+        chores: Number of "any child" daily chores
+        password: Password set on every account of the household
+
+    Returns:
+        tuple: (household, [(username, role), ...])
+    """
+    household = models.Household.objects.filter(name=name).first()
+    if household is None:
+        call_command('create_household', name, stdout=StringIO())
+        household = models.Household.objects.get(name=name)
+    if household.database:
+        raise ValueError(f"Household {name} has its own database; use a household on the default database")
+
+    accounts = [(f'loadtest{household.pk}_child_{i}', 'Child') for i in range(children)]
+    accounts += [(f'loadtest{household.pk}_parent_{i}', 'Parent') for i in range(parents)]
+    existing = set(models.User.objects.filter(household=household).values_list('username', flat=True))
+    models.User.objects.bulk_create([
+        models.User(username=username, role=role, household=household)
+        for username, role in accounts if username not in existing
+    ])
+    # One hash for every account: hashing is slow on purpose
+    models.User.objects.filter(username__in=[username for username, _ in accounts]).update(
+        password=make_password(password))
+
+    existing_chores = models.Chore.objects.filter(household=household).count()
+    models.Chore.objects.bulk_create([
+        models.Chore(household=household, name=f'Load test chore {i}', points=10, daily=True,
+                     assignment_type='any_child')
+        for i in range(existing_chores, chores)
+    ])
+    delete_synced(household.pk, models.ChoreClaim.objects.filter(household=household))
+    models.Chore.objects.filter(household=household).update(available=True)
+    bump_data_version(household_key(household.pk))
+    return household, accounts
+
+
+def run_load_test(base_url=None, household_name='Load test', children=10, parents=2, chores=20,
+                  duration=60, interval=60, rates=None, seed=0):
+    """
+    Run the polling workload and summarize it.
+
+    Args:
+        base_url: Server to load over HTTP, or None for the test client
+        household_name: Household to run in, created if needed
+        children: Number of child tablets
+        parents: Number of parent tablets
+        chores: Number of chores in the household
+        duration: Seconds to measure for
+        interval: Seconds between polls of each tablet
+        rates: Chance per poll of a claim, a return and approving each pending
+            claim, as {'claim', 'return', 'approve'}
+        seed: Random seed, for repeatable runs
+
+    Returns:
+        dict: Settings of the run, totals and per-view results
+    """
+    rates = {'claim': 0.3, 'return': 0.1, 'approve': 0.5, **(rates or {})}
+    password = secrets.token_urlsafe(16)
+    household, accounts = prepare_household(household_name, children, parents, chores, password)
+
+    recorder = Recorder()
+    users = [
+        VirtualUser(HttpSession(base_url) if base_url else TestClientSession(), recorder,
+                    username, password, role, random.Random(seed + index), rates)
+        for index, (username, role) in enumerate(accounts)
+    ]
+    failed = [user.username for user in users if not user.login()]
+    if failed:
+        raise RuntimeError(f"Could not log in as {', '.join(failed)}")
+
+    start_at = time.monotonic()
+    stop_at = start_at + duration
+    threads = [threading.Thread(target=user.run, args=(start_at, stop_at, interval), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start_at
+
+    views = recorder.summary(elapsed)
+    total = sum(view['requests'] for view in views.values())
+    latencies = sorted(seconds * 1000 for rows in recorder.samples.values() for seconds, _ in rows)
+    return {
+        'settings': {
+            'target': base_url or 'test client',
+            'household': household.pk,
+            'children': children,
+            'parents': parents,
+            'chores': chores,
+            'duration': duration,
+            'interval': interval,
+            'rates': rates,
+            'seed': seed,
+        },
+        'elapsed': round(elapsed, 3),
+        'totals': {
+            'requests': total,
+            'errors': sum(view['errors'] for view in views.values()),
+            'throughput': round(total / elapsed, 3) if elapsed else None,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 2) if latencies else None,
+                'p95': round(percentile(latencies, 95), 2) if latencies else None,
+                'p99': round(percentile(latencies, 99), 2) if latencies else None,
+            },
+        },
+        'views': views,
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chore_app.archive import archive_cutoff, archive_point_logs
+from chore_app.constants import POINT_LOG_ARCHIVE_AFTER_DAYS, POINT_LOG_ARCHIVE_BATCH_SIZE
+from chore_app.tenancy import registry, use_household
+
+
+class Command(BaseCommand):
+    help = "Move old point logs to the archive table and update the monthly rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=POINT_LOG_ARCHIVE_AFTER_DAYS,
+                            help=f"Archive entries older than this many days (default {POINT_LOG_ARCHIVE_AFTER_DAYS})")
+        parser.add_argument('--batch-size', type=int, default=POINT_LOG_ARCHIVE_BATCH_SIZE,
+                            help=f"Entries moved per transaction (default {POINT_LOG_ARCHIVE_BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        for household in registry.all():
+            with use_household(household):
+                cutoff = archive_cutoff(options['days'])
+                total = archive_point_logs(household.pk, days=options['days'], batch_size=options['batch_size'])
+            self.stdout.write(f"{household.name}: archived {total} point logs recorded before {cutoff:%Y-%m-%d}")
@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+import chore_app.models as models
+from chore_app.benchmark import benchmark_nightly
+
+
+class Command(BaseCommand):
+    help = ("Time each phase of the nightly job for households, with its query count. "
+            "Every run is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('households', nargs='+', help="Household names, e.g. several seeded by seed_scale")
+        parser.add_argument('--repeat', type=int, default=1, help="Runs per household; times are the median")
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        households = []
+        for name in options['households']:
+            household = models.Household.objects.filter(name=name).first()
+            if household is None:
+                raise CommandError(f"No household named {name}")
+            households.append(household)
+
+        results = [benchmark_nightly(household.pk, options['repeat']) for household in households]
+
+        for result in results:
+            size = ', '.join(f"{count} {what.replace('_', ' ')}" for what, count in result['size'].items())
+            self.stdout.write(f"{result['household']}: {size}")
+            self.stdout.write(f"  {'phase':<28}{'ms':>10}{'sql ms':>10}{'queries':>9}{'most repeated':>15}")
+            for phase, row in result['phases'].items():
+                self.stdout.write(f"  {phase:<28}{row['ms']:>10}{row['sql_ms']:>10}{row['queries']:>9}"
+                                  f"{row['most_repeated']:>15}")
+                if row['most_repeated'] > 1:
+                    self.stdout.write(f"    {row['most_repeated_sql']}")
+            total = result['total']
+            self.stdout.write(f"  {'total':<28}{total['ms']:>10}{'':>10}{total['queries']:>9}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from chore_app.query_budget import EXEMPT_VIEWS, check_budgets, format_sql
+
+
+class Command(BaseCommand):
+    help = ("Check every view and nightly phase against its query and time budget "
+            "(chore_app/query_budget.py), on a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--time-scale', type=float, default=1.0,
+                            help="Multiply the time budgets, e.g. 3 on a slow machine")
+        parser.add_argument('--show-sql', action='store_true', help="Print the SQL of every case")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            results, missing = check_budgets(options['time_scale'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        failed = [result for result in results if not result.ok]
+        for result in results:
+            flag = 'ok  ' if result.ok else 'OVER'
+            response = f"{result.status or ''}"
+            if result.status != result.expected_status:
+                response += f" (expected {result.expected_status})"
+            if result.redirect != result.expected_redirect:
+                response += f" to {result.redirect} (expected {result.expected_redirect})"
+            self.stdout.write(f"{flag} {result.name:<48} {result.queries:>4}/{result.max_queries:<4} queries "
+                              f"{result.ms:>8.1f}/{result.max_ms:.0f} ms {response}")
+            if options['show_sql'] or not result.ok:
+                self.stdout.write(format_sql(result))
+        for view, reason in EXEMPT_VIEWS.items():
+            self.stdout.write(f"skip {view}: {reason}")
+
+        problems = [f"{len(failed)} over budget"] if failed else []
+        if missing:
+            problems.append(f"no budget for {', '.join(missing)}")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(f"All {len(results)} cases within budget")
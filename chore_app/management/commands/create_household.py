@@ -0,0 +1,67 @@
+import zoneinfo
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.text import slugify
+
+import chore_app.models as models
+from chore_app.tenancy import registry
+
+
+class Command(BaseCommand):
+    help = "Create a household, optionally with its own SQLite database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Household name")
+        parser.add_argument('--timezone', default=settings.TIME_ZONE,
+                            help="IANA time zone the household's days and nightly run follow")
+        parser.add_argument('--domain', default='', help="Host name the household is served on")
+        parser.add_argument('--own-database', action='store_true',
+                            help="Keep the household's data in its own file in HOUSEHOLD_DATABASE_DIR")
+
+    def handle(self, *args, **options):
+        name = options['name']
+        try:
+            zoneinfo.ZoneInfo(options['timezone'])
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise CommandError(f"Unknown time zone: {options['timezone']}")
+        if models.Household.objects.filter(name=name).exists():
+            raise CommandError(f"Household {name} already exists")
+
+        alias = ''
+        if options['own_database']:
+            if not settings.HOUSEHOLD_DATABASE_DIR:
+                raise CommandError("Set CHORE_HOUSEHOLD_DATABASE_DIR to give households their own database")
+            slug = slugify(name).replace('-', '_')
+            alias = f'household_{slug}'
+            path = Path(settings.HOUSEHOLD_DATABASE_DIR) / f'{slug}.sqlite3'
+            if path.exists():
+                raise CommandError(f"Database {path} already exists")
+            # Other processes pick the file up from the directory on restart
+            connections.databases[alias] = {**connections.databases[DEFAULT_DB_ALIAS], 'NAME': path}
+            call_command('migrate', database=alias, run_syncdb=True, verbosity=0)
+
+        household = models.Household.objects.create(
+            name=name, timezone=options['timezone'], domain=options['domain'], database=alias)
+        if alias:
+            # Rows in the household's database point at the same household pk
+            models.Household.objects.using(alias).create(
+                pk=household.pk, name=name, timezone=household.timezone, domain=household.domain, database=alias)
+
+        # Start from the default household's settings and messages
+        default_id = models.default_household_id()
+        target = alias or DEFAULT_DB_ALIAS
+        models.Settings.objects.using(target).bulk_create([
+            models.Settings(household_id=household.pk, key=setting.key, name=setting.name, value=setting.value)
+            for setting in models.Settings.objects.using(DEFAULT_DB_ALIAS).filter(household_id=default_id)
+        ])
+        models.Text.objects.using(target).bulk_create([
+            models.Text(household_id=household.pk, key=text.key, text=text.text, enabled=text.enabled)
+            for text in models.Text.objects.using(DEFAULT_DB_ALIAS).filter(household_id=default_id)
+        ])
+
+        registry.invalidate()
+        self.stdout.write(f"Created household {name} (pk {household.pk}) on database {target}")
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chore_app.loadtest import run_load_test
+
+
+class Command(BaseCommand):
+    help = ("Simulate tablets polling the dashboards, claiming, returning and approving chores, "
+            "and report latency percentiles and throughput per view. Runs in a household of its "
+            "own; use a copy of the database, not the live one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server on this database, e.g. "
+                                          "http://127.0.0.1:8000; defaults to the in-process test client")
+        parser.add_argument('--household', default='Load test', help="Household to run in, created if needed")
+        parser.add_argument('--children', type=int, default=10, help="Number of child tablets")
+        parser.add_argument('--parents', type=int, default=2, help="Number of parent tablets")
+        parser.add_argument('--chores', type=int, default=20, help="Number of chores")
+        parser.add_argument('--duration', type=float, default=60, help="Seconds to measure for")
+        parser.add_argument('--interval', type=float, default=60, help="Seconds between polls of each tablet")
+        parser.add_argument('--claim-rate', type=float, default=0.3, help="Chance a child claims a chore per poll")
+        parser.add_argument('--return-rate', type=float, default=0.1, help="Chance a child returns a claim per poll")
+        parser.add_argument('--approve-rate', type=float, default=0.5,
+                            help="Chance a parent approves each pending claim per poll")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed")
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options['children'] < 0 or options['parents'] < 0 or options['children'] + options['parents'] == 0:
+            raise CommandError("Need at least one child or parent tablet")
+        if options['interval'] <= 0 or options['duration'] <= 0:
+            raise CommandError("--interval and --duration must be positive")
+
+        try:
+            results = run_load_test(
+                base_url=options['url'],
+                household_name=options['household'],
+                children=options['children'],
+                parents=options['parents'],
+                chores=options['chores'],
+                duration=options['duration'],
+                interval=options['interval'],
+                rates={
+                    'claim': options['claim_rate'],
+                    'return': options['return_rate'],
+                    'approve': options['approve_rate'],
+                },
+                seed=options['seed'],
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'view':<22}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for view, row in results['views'].items():
+            latency = row['latency_ms']
+            self.stdout.write(f"{view:<22}{row['requests']:>9}{row['errors']:>8}{row['throughput']:>9}"
+                              f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}")
+        totals = results['totals']
+        self.stdout.write(f"{results['elapsed']}s: {totals['requests']} requests, {totals['throughput']} req/s, "
+                          f"p95 {totals['latency_ms']['p95']} ms, {totals['errors']} errors")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
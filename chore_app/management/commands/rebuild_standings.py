@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chore_app.standings import rebuild_standings, standing_day
+from chore_app.tenancy import registry, use_household
+
+
+class Command(BaseCommand):
+    help = "Recompute daily leaderboard standings from the point logs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to rebuild (YYYY-MM-DD); defaults to today")
+        parser.add_argument('--days', type=int, default=1,
+                            help="Number of days to rebuild, ending on --date")
+
+    def handle(self, *args, **options):
+        try:
+            day = datetime.date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Invalid date: {options['date']}")
+
+        for household in registry.all():
+            # Days run midnight to midnight in the household's own time zone
+            with use_household(household):
+                last = day or standing_day()
+                for offset in range(options['days']):
+                    current = last - datetime.timedelta(days=offset)
+                    count = rebuild_standings(household.pk, current)
+                    self.stdout.write(f"{household.name} {current}: {count} standings")
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chore_app.benchmark import data_size
+from chore_app.seeding import seed_household
+
+
+class Command(BaseCommand):
+    help = ("Create households filled with synthetic children, parents, chores, claims and point log "
+            "history, for benchmarking. Use a copy of the database, not the live one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Household name; with --households above 1, a prefix numbered from 1")
+        parser.add_argument('--households', type=int, default=1, help="Number of households to create")
+        parser.add_argument('--children', type=int, default=8, help="Children per household")
+        parser.add_argument('--parents', type=int, default=2, help="Parents per household")
+        parser.add_argument('--chores', type=int, default=60, help="Chores per household")
+        parser.add_argument('--pending-claims', type=int, default=20, help="Claims awaiting approval per household")
+        parser.add_argument('--history-days', type=int, default=30, help="Days of point log history")
+        parser.add_argument('--logs-per-child-per-day', type=int, default=4, help="Point log entries per child per day")
+        parser.add_argument('--password', help="Password for every account; by default they can't log in")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed")
+
+    def handle(self, *args, **options):
+        counts = ('households', 'children', 'parents', 'chores', 'pending_claims', 'history_days',
+                  'logs_per_child_per_day')
+        if any(options[count] < 0 for count in counts) or options['households'] == 0:
+            raise CommandError("Counts can't be negative, and at least one household is needed")
+
+        names = [options['name']] if options['households'] == 1 else \
+            [f"{options['name']} {number}" for number in range(1, options['households'] + 1)]
+        for index, name in enumerate(names):
+            started = time.monotonic()
+            try:
+                household = seed_household(
+                    name,
+                    children=options['children'],
+                    parents=options['parents'],
+                    chores=options['chores'],
+                    pending_claims=options['pending_claims'],
+                    history_days=options['history_days'],
+                    logs_per_child_per_day=options['logs_per_child_per_day'],
+                    password=options['password'],
+                    seed=options['seed'] + index,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            size = ', '.join(f"{count} {what.replace('_', ' ')}" for what, count in data_size(household.pk).items())
+            self.stdout.write(f"Seeded {name} (pk {household.pk}) in {time.monotonic() - started:.1f}s: {size}")
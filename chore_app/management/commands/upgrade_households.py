@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from chore_app.tenancy import backfill_households, missing_household_columns
+
+
+class Command(BaseCommand):
+    help = ("Add the household columns to an install from before households: add them nullable, "
+            "give every row the Home household, then make them required. Does nothing on other installs.")
+
+    def _run_nullable(self, *args):
+        # The models only have nullable household columns in a process started
+        # with the upgrade setting on
+        env = {**os.environ, 'CHORE_HOUSEHOLD_UPGRADE': 'True'}
+        result = subprocess.run([sys.executable, sys.argv[0], *args], env=env)
+        if result.returncode:
+            raise CommandError(f"'{' '.join(args)}' failed with exit code {result.returncode}")
+
+    def handle(self, *args, **options):
+        tables = missing_household_columns()
+        if not tables:
+            self.stdout.write("No tables without a household column")
+            return
+
+        self.stdout.write(f"Adding nullable household columns to {', '.join(tables)}")
+        self._run_nullable('makemigrations', 'chore_app', '--noinput')
+        self._run_nullable('migrate', '--noinput')
+
+        updated = backfill_households()
+        self.stdout.write(f"Moved {updated} rows to the Home household")
+
+        # Every row has a household now, so the columns can be made required
+        call_command('makemigrations', 'chore_app', interactive=False)
+        call_command('migrate', interactive=False)
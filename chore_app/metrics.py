@@ -0,0 +1,455 @@
+"""
+Prometheus metrics, in the text exposition format, without a client library.
+
+MetricsMiddleware records each request's latency, SQL query count and SQL
+time under its URL name. Claims, approvals, rejections and nightly runs are
+counted where they happen (count_on_commit(), record_nightly_run()).
+
+Each process keeps its metrics in memory and writes a snapshot to a file of
+its own in settings.METRICS_DIR, at most every METRICS_FLUSH_SECONDS. The
+/metrics view merges every process's file, so whichever worker answers a
+scrape reports the whole server, and the cron job's nightly runs are included.
+On a scrape the files of stopped processes (cron runs, workers replaced by an
+autoreload) are added into one retired file and deleted, so counters don't go
+backwards and the directory holds a file per running process plus one. The
+production launcher clears the directory at start.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+
+from chore_app.tenancy import current_database
+
+logger = logging.getLogger(__name__)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Upper bounds of the latency histogram's buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name to (type, help)
+METRICS = {
+    'chore_http_requests_total': (COUNTER, "Requests by URL name, method and status"),
+    'chore_http_request_duration_seconds': (HISTOGRAM, "Request latency by URL name"),
+    'chore_db_queries_total': (COUNTER, "SQL queries run by requests, by URL name"),
+    'chore_db_query_seconds_total': (COUNTER, "Time spent in SQL by requests, by URL name"),
+    'chore_claims_total': (COUNTER, "Chore claims by outcome: claimed, returned, approved or rejected"),
+    'chore_nightly_runs_total': (COUNTER, "Nightly job runs by household and result"),
+    'chore_nightly_duration_seconds': (GAUGE, "Duration of the last nightly run, by household"),
+    'chore_nightly_last_success_timestamp_seconds': (GAUGE, "Unix time the last nightly run succeeded, by household"),
+}
+
+# URL name for requests that matched no route
+UNRESOLVED = '<unresolved>'
+
+# This process's snapshot file; the start time tells apart processes that
+# reuse a pid
+_SNAPSHOT_NAME = f'{os.getpid()}-{time.time_ns()}.json'
+# Metrics of stopped processes, added up, and the lock held while adding to it
+_RETIRED_NAME = 'retired.json'
+_RETIRE_LOCK_NAME = 'retired.lock'
+# A lock older than this was left by a process that died holding it
+STALE_LOCK_SECONDS = 60
+
+# Query count and SQL time of the request being handled; asgiref copies
+# context into sync_to_async threads, so their queries count too
+_request_queries = ContextVar('request_queries', default=None)
+
+
+class MetricStore:
+    """One process's metrics, safe to update from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # Key to [per-bucket counts, +Inf count, sum]
+        self.histograms = {}
+        # Key to (value, unix time set)
+        self.gauges = {}
+        self.last_flush = 0.0
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self.counters[self.key(name, labels)] += amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = self.key(name, labels)
+        with self._lock:
+            counts, overflow, total = self.histograms.get(key, ([0] * len(buckets), 0, 0.0))
+            counts = list(counts)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                overflow += 1
+            self.histograms[key] = (counts, overflow, total + value)
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[self.key(name, labels)] = (value, time.time())
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The metrics as JSON-serializable lists
+        """
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), counts, overflow, total]
+                               for (name, labels), (counts, overflow, total) in self.histograms.items()],
+                'gauges': [[name, dict(labels), value, set_at]
+                           for (name, labels), (value, set_at) in self.gauges.items()],
+            }
+
+    def add_snapshot(self, snapshot):
+        """Add another process's snapshot: sum counters and histograms, keep the latest gauges."""
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                self.counters[self.key(name, labels)] += value
+            for name, labels, counts, overflow, value_sum in snapshot['histograms']:
+                key = self.key(name, labels)
+                previous = self.histograms.get(key, ([0] * len(counts), 0, 0.0))
+                self.histograms[key] = ([a + b for a, b in zip(previous[0], counts)],
+                                        previous[1] + overflow, previous[2] + value_sum)
+            for name, labels, value, set_at in snapshot['gauges']:
+                key = self.key(name, labels)
+                if key not in self.gauges or self.gauges[key][1] < set_at:
+                    self.gauges[key] = (value, set_at)
+
+
+store = MetricStore()
+
+
+def _metrics_dir():
+    return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+
+def flush_due():
+    """Whether this process's snapshot file is due to be written."""
+    return (_metrics_dir() is not None
+            and time.monotonic() - store.last_flush >= settings.METRICS_FLUSH_SECONDS)
+
+
+def _write_json(path, data):
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(data))
+    # Readers never see a half-written file
+    os.replace(temporary, path)
+
+
+def flush(force=False):
+    """
+    Write this process's snapshot file, if one is due.
+
+    Args:
+        force: Write even if the last write was under METRICS_FLUSH_SECONDS ago
+    """
+    directory = _metrics_dir()
+    if directory is None or not (force or flush_due()):
+        return
+    store.last_flush = time.monotonic()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        _write_json(directory / _SNAPSHOT_NAME, store.snapshot())
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {directory}: {e}")
+
+
+def _process_alive(pid):
+    if os.name != 'posix':
+        # os.kill() ends the process on Windows; keep its file until the launcher clears it
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, as another user
+        return True
+    return True
+
+
+def _read_retired(directory):
+    # The retired metrics and the names of the files they include
+    try:
+        retired = json.loads((directory / _RETIRED_NAME).read_text())
+    except FileNotFoundError:
+        return None, set()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Skipping retired metrics in {directory}: {e}")
+        return None, set()
+    return retired, set(retired.get('absorbed', ()))
+
+
+def retire_stopped(directory):
+    """
+    Add the snapshot files of stopped processes into the retired file and
+    delete them.
+
+    One process at a time, under a lock file; if another holds it, its
+    scrape does the work. The retired file is written before the files it
+    absorbs are deleted, and lists them, so readers in between skip them.
+
+    Args:
+        directory: The metrics directory
+    """
+    stopped = [
+        path for path in directory.glob('*-*.json')
+        if path.name != _SNAPSHOT_NAME and path.stem.split('-')[0].isdigit()
+        and not _process_alive(int(path.stem.split('-')[0]))
+    ]
+    if not stopped:
+        return
+    lock = directory / _RETIRE_LOCK_NAME
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        with contextlib.suppress(OSError):
+            if time.time() - lock.stat().st_mtime > STALE_LOCK_SECONDS:
+                lock.unlink()
+        return
+    except OSError as e:
+        logger.warning(f"Could not lock {lock}: {e}")
+        return
+    try:
+        retired, absorbed = _read_retired(directory)
+        total = MetricStore()
+        if retired is not None:
+            total.add_snapshot(retired)
+        added = []
+        for path in stopped:
+            if path.name in absorbed:
+                # Added by an earlier run that stopped before deleting it
+                continue
+            try:
+                total.add_snapshot(json.loads(path.read_text()))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable metrics file {path}: {e}")
+            added.append(path.name)
+        _write_json(directory / _RETIRED_NAME, {**total.snapshot(), 'absorbed': added})
+        for path in stopped:
+            path.unlink(missing_ok=True)
+        logger.info(f"Retired the metrics of {len(added)} stopped processes")
+    except OSError as e:
+        logger.warning(f"Could not retire metrics in {directory}: {e}")
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+def _snapshots():
+    # Every other process's file, the retired file, and this process's
+    # metrics as they are now
+    directory = _metrics_dir()
+    if directory is None or not directory.is_dir():
+        return [store.snapshot()]
+    retire_stopped(directory)
+    for _ in range(3):
+        paths = [path for path in directory.glob('*-*.json') if path.name != _SNAPSHOT_NAME]
+        retired, absorbed = _read_retired(directory)
+        snapshots = [store.snapshot()] + ([retired] if retired is not None else [])
+        try:
+            for path in paths:
+                if path.name in absorbed:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except ValueError as e:
+                    logger.warning(f"Skipping metrics file {path}: {e}")
+            return snapshots
+        except FileNotFoundError:
+            # Retired since the listing; read the retired file again
+            continue
+    return snapshots
+
+
+def merged():
+    """
+    Every process's metrics, added up.
+
+    Returns:
+        MetricStore: Counters and histograms summed; the latest set gauges
+    """
+    total = MetricStore()
+    for snapshot in _snapshots():
+        total.add_snapshot(snapshot)
+    return total
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render():
+    """
+    Every process's metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition
+    """
+    total = merged()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == COUNTER:
+            series = sorted((labels, value) for (metric, labels), value in total.counters.items() if metric == name)
+            lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in series]
+        elif kind == GAUGE:
+            series = sorted((labels, value) for (metric, labels), (value, _) in total.gauges.items() if metric == name)
+            lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in series]
+        else:
+            series = sorted((labels, row) for (metric, labels), row in total.histograms.items() if metric == name)
+            for labels, (counts, overflow, value_sum) in series:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}')
+                cumulative += overflow
+                lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value_sum)}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def count_on_commit(name, amount=1, **labels):
+    """
+    Add to a counter once the current transaction commits.
+
+    Args:
+        name: Counter name, from METRICS
+        amount: Amount to add
+        **labels: Label values
+    """
+    transaction.on_commit(lambda: store.inc(name, amount, **labels), using=current_database())
+
+
+def record_nightly_run(household_id, seconds, succeeded):
+    """
+    Record a nightly run and write the snapshot straight away, as the cron
+    job's process is short-lived.
+
+    Args:
+        household_id: The household's pk
+        seconds: How long the run took
+        succeeded: Whether it finished without error
+    """
+    store.inc('chore_nightly_runs_total', household=household_id, result='success' if succeeded else 'error')
+    if succeeded:
+        store.set('chore_nightly_duration_seconds', seconds, household=household_id)
+        store.set('chore_nightly_last_success_timestamp_seconds', time.time(), household=household_id)
+    flush(force=True)
+
+
+def count_query(execute, sql, params, many, context):
+    # Database execute wrapper, installed on every connection
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.add(time.perf_counter() - started)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver adding count_query to the connection."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class _RequestQueries:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+class MetricsMiddleware:
+    """
+    Record each request's latency, query count and SQL time by URL name.
+
+    Goes first in MIDDLEWARE, so the latency covers the whole stack. Not used
+    with METRICS_ENABLED off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = _RequestQueries()
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries)
+        flush()
+        return response
+
+    async def __acall__(self, request):
+        queries = _RequestQueries()
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries)
+        if flush_due():
+            # File writes block; keep them off the event loop
+            await sync_to_async(flush, thread_sensitive=False)()
+        return response
+
+    @staticmethod
+    def record(request, response, seconds, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name or match.view_name if match else UNRESOLVED
+        store.inc('chore_http_requests_total', view=view, method=request.method, status=response.status_code)
+        store.observe('chore_http_request_duration_seconds', seconds, view=view)
+        store.inc('chore_db_queries_total', queries.count, view=view)
+        store.inc('chore_db_query_seconds_total', queries.seconds, view=view)
@@ -1,10 +1,51 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as AuthUserManager
 from django.db import models
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
+DEFAULT_HOUSEHOLD_NAME = 'Home'
+
+
+# A family. Users, chores, claims, point logs, settings and texts all belong to
+# one household and are only ever queried within it (see chore_app.tenancy).
+class Household(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    timezone = models.CharField(max_length=64, default=settings.TIME_ZONE)
+    # Host name the household's dashboards are served on; blank for none
+    domain = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    # Database alias holding the household's data; blank for the default database
+    database = models.CharField(max_length=100, blank=True, default='')
+
+    def __str__(self):
+        return self.name
+
+
+def default_household_id():
+    # The household of single-family installs, for code creating rows without
+    # one of its own (registration, createsuperuser). Queries, so call it only
+    # where such a row is created
+    household, _ = Household.objects.get_or_create(name=DEFAULT_HOUSEHOLD_NAME)
+    return household.pk
+
+
+# Only while an install from before households is upgraded: the household
+# columns are added nullable, filled in, then made required (see the
+# upgrade_households command)
+HOUSEHOLD_NULLABLE = settings.HOUSEHOLD_UPGRADE
+
+
+class UserManager(AuthUserManager):
+    def _create_user(self, username, email, password, **extra_fields):
+        # create_user() and createsuperuser without a household join the default one
+        if 'household' not in extra_fields and 'household_id' not in extra_fields:
+            extra_fields['household_id'] = default_household_id()
+        return super()._create_user(username, email, password, **extra_fields)
+
 
 class User(AbstractUser):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE, related_name='users')
     role = models.CharField(max_length=10, choices=(
         ('Parent', 'Parent'), ('Child', 'Child')), db_index=True)
     points_balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -12,6 +53,16 @@ class User(AbstractUser):
     place_1 = models.IntegerField(default=0)
     place_2 = models.IntegerField(default=0)
     place_3 = models.IntegerField(default=0)
+    # Household data version of the last change, for kiosk delta sync (chore_app.sync)
+    sync_version = models.BigIntegerField(default=0)
+
+    objects = UserManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['household', 'role']),
+            models.Index(fields=['household', 'sync_version']),
+        ]
 
 
 class Chore(models.Model):
@@ -22,6 +73,7 @@ class Chore(models.Model):
         ('all_selected', 'All of Selected Children'),
     ]
     
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
     name = models.CharField(max_length=255)
     comment = models.CharField(max_length=255, default="", blank=True)
     points = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -33,6 +85,9 @@ class Chore(models.Model):
     early_bonus = models.BooleanField(default=False)
     bonus_end_time = models.IntegerField(default=14, help_text="Hour when bonus expires (24-hour format, 0-23)")
     available_time = models.IntegerField(default=0)
+    sync_version = models.BigIntegerField(default=0)
+    # Bumped by claims, returns, rejections and approvals (see claims.py)
+    version = models.IntegerField(default=0)
     
     def clean(self):
         super().clean()
@@ -43,10 +98,13 @@ class Chore(models.Model):
         indexes = [
             models.Index(fields=['assignment_type', 'available']),  # For filtering by assignment type and availability
             models.Index(fields=['available', 'available_time']),    # For time-based filtering
+            models.Index(fields=['household', 'available']),
+            models.Index(fields=['household', 'sync_version']),
         ]
 
 
 class ChoreClaim(models.Model):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
     chore = models.ForeignKey(Chore, on_delete=models.CASCADE, null=True, blank=True, db_index=True)
     chore_name = models.CharField(max_length=255, default="", db_index=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_choreclaim', db_index=True)
@@ -54,16 +112,22 @@ class ChoreClaim(models.Model):
     points = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     multiplier_type = models.BooleanField(default=False)
     comment = models.CharField(max_length=255, default="", blank=True)
+    sync_version = models.BigIntegerField(default=0)
+    # Bumped by returns, rejections and approvals (see claims.py)
+    version = models.IntegerField(default=0)
     
     class Meta:
         indexes = [
             models.Index(fields=['user', 'approved']),
             models.Index(fields=['chore', 'user']),
             models.Index(fields=['chore', 'user', 'approved']),  # For filtering claimed chores by other users
+            models.Index(fields=['household', 'approved']),
+            models.Index(fields=['household', 'sync_version']),
         ]
 
 
 class PointLog(models.Model):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=True)
     points_change = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     reason = models.CharField(max_length=255, blank=True)
@@ -78,22 +142,161 @@ class PointLog(models.Model):
             models.Index(fields=['user', 'date_recorded']),
             models.Index(fields=['date_recorded']),
             models.Index(fields=['chore', 'date_recorded']),
+            models.Index(fields=['household', 'date_recorded']),  # A household's history, newest first
+        ]
+
+
+# Point logs older than the hot window, moved out by chore_app.archive.
+# Rows keep their original PointLog id.
+class ArchivedPointLog(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_pointlogs')
+    points_change = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    reason = models.CharField(max_length=255, blank=True)
+    chore = models.CharField(max_length=255)
+    penalty = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    multiplier_type = models.BooleanField(default=False)
+    date_recorded = models.DateTimeField(db_index=True)
+    approver = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_approver_pointlogs')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date_recorded']),
+        ]
+
+
+# Per-child monthly totals of archived point logs
+class PointLogMonthlyRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pointlog_rollups')
+    month = models.DateField(help_text="First day of the month")
+    entries = models.IntegerField(default=0)
+    points_earned = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    points_lost = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    points_change = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ('user', 'month')
+
+
+# Running total of each child's chore points per day, kept in step with PointLog
+# (see chore_app.standings) so the leaderboard is an indexed lookup
+class DailyStanding(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_standings')
+    day = models.DateField()
+    total_points = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ('day', 'user')
+        indexes = [
+            models.Index(fields=['day', '-total_points']),  # Leaderboard order for a day
         ]
 
 
 class Settings(models.Model):
-    key = models.CharField(max_length=255, unique=True)
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
+    key = models.CharField(max_length=255)
     name = models.CharField(max_length=255, default="")
     value = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
 
+    class Meta:
+        unique_together = ('household', 'key')
+
 class Text(models.Model):
-    key = models.CharField(max_length=255, unique=True)
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
+    key = models.CharField(max_length=255)
     text = models.TextField(default="")
     enabled = models.BooleanField(default=True)
 
+    class Meta:
+        unique_together = ('household', 'key')
+
+# A run of a scheduled job, with its telemetry (see chore_app.telemetry).
+# The job has run on a day if a run that day succeeded.
 class RunLog(models.Model):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
     job_code = models.CharField(max_length=255)
     run_date = models.DateField()
-    
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    succeeded = models.BooleanField(default=True)
+    error = models.TextField(blank=True, default='')
+    # Nightly job totals: claims auto-approved, points taken as incomplete
+    # chore penalties and points given as daily bonuses
+    auto_approved = models.IntegerField(default=0)
+    penalty_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    bonus_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
     class Meta:
-        unique_together = ('job_code', 'run_date')
\ No newline at end of file
+        indexes = [
+            models.Index(fields=['household', 'job_code', 'run_date']),
+        ]
+
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+
+# Time and work of one phase of a run
+class RunLogPhase(models.Model):
+    run = models.ForeignKey(RunLog, on_delete=models.CASCADE, related_name='phases')
+    phase = models.CharField(max_length=50)
+    started_at = models.DateTimeField(null=True, blank=True)
+    seconds = models.FloatField(default=0)
+    # Rows written, and the sum of the points changes it logged
+    rows = models.IntegerField(default=0)
+    points = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['pk']
+
+
+# Version stamp bumped on every write to dashboard data (see chore_app.versioning)
+class DataVersion(models.Model):
+    key = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+
+# A deleted synced row, so kiosks syncing a delta drop it too
+class SyncTombstone(models.Model):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
+    model = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    sync_version = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['household', 'sync_version']),
+        ]
+
+
+# Journal of one nightly run (see chore_app.nightly.NightlyJournal)
+class NightlyRun(models.Model):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, null=HOUSEHOLD_NULLABLE)
+    run_date = models.DateField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('household', 'run_date')
+
+
+# A completed phase of a nightly run, for one child or (user empty) for the whole phase
+class NightlyRunStep(models.Model):
+    run = models.ForeignKey(NightlyRun, on_delete=models.CASCADE, related_name='steps')
+    phase = models.CharField(max_length=50)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('run', 'phase', 'user')
+        constraints = [
+            # NULLs are distinct in unique_together, so the whole-phase steps need their own
+            models.UniqueConstraint(fields=['run', 'phase'], condition=models.Q(user__isnull=True),
+                                    name='nightly_run_phase_once'),
+        ]
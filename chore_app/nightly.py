@@ -0,0 +1,362 @@
+"""
+Set-based, journaled nightly balance engine.
+
+Loads every child's balance and incomplete chore points in one query and
+today's standings in another, applies the penalty, bonus and leaderboard
+phases in memory, and writes the result with one bulk insert of point logs and
+one bulk update of balances. The number of queries no longer depends on the
+number of children.
+
+Each phase commits with its entries in the run journal (NightlyRun and
+NightlyRunStep): once per child for the per-child phases, once for the phase
+as a whole. A run that fails part way is resumed by the next attempt, which
+skips everything already journaled.
+"""
+
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import django
+from django.db import OperationalError, connections, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+import chore_app.models as models
+import chore_app.telemetry as telemetry
+from chore_app.slow_queries import query_source
+from chore_app.standings import get_leaderboard, standing_day
+from chore_app.sync import stamp_changes
+from chore_app.tenancy import current_database, registry, use_household
+
+logger = logging.getLogger(__name__)
+
+# Balances are stored with two decimal places; round in memory the same way
+BALANCE_QUANTUM = Decimal('0.01')
+
+BALANCE_FIELDS = ['points_balance', 'pocket_money', 'place_1', 'place_2', 'place_3']
+
+# Nightly phases in run order
+AUTO_APPROVE = 'auto_approve'
+INCOMPLETE_CHORE_PENALTY = 'incomplete_chore_penalty'
+APPLY_DAILY_BONUS = 'apply_daily_bonus'
+APPLY_LEADERBOARD_SCORING = 'apply_leaderboard_scoring'
+RESET_DAILY_CHORES = 'reset_daily_chores'
+
+PHASES = (
+    AUTO_APPROVE,
+    INCOMPLETE_CHORE_PENALTY,
+    APPLY_DAILY_BONUS,
+    APPLY_LEADERBOARD_SCORING,
+    RESET_DAILY_CHORES,
+)
+
+# Phases applied to each child separately, and journaled per child
+PER_CHILD_PHASES = (INCOMPLETE_CHORE_PENALTY, APPLY_DAILY_BONUS)
+
+# Retries for a worker's batch when another worker holds the database lock
+WORKER_LOCK_RETRIES = 10
+WORKER_LOCK_BACKOFF_SECONDS = 0.2
+
+
+class NightlyBatch:
+    """
+    In-memory state for one household's nightly run over a set of children.
+
+    Phases read and adjust the loaded User instances and queue PointLog rows;
+    nothing is written until flush(). Create, run the phases and flush inside
+    one transaction.
+    """
+
+    def __init__(self, household_id, approver, settings, children=None, day=None):
+        """
+        Args:
+            household_id: The household's pk
+            approver: The user recorded as approver on generated point logs
+            settings: Dict of setting key to value
+            children: Queryset of children to process; defaults to all of
+                the household's children
+            day: The leaderboard day being scored; defaults to today
+        """
+        self.household_id = household_id
+        self.approver = approver
+        self.settings = settings
+        self.day = day or standing_day()
+
+        if children is None:
+            children = models.User.objects.filter(household_id=household_id, role='Child')
+        children = children.annotate(incomplete_chores_sum=incomplete_chores_sum())
+        self.children = {child.pk: child for child in children.select_for_update().order_by('pk')}
+
+        self.has_available_chores = models.Chore.objects.filter(household_id=household_id, available=True).exists()
+
+        self.point_logs = []
+
+    def add_point_log(self, user_id, points_change, reason, penalty=0):
+        self.point_logs.append(models.PointLog(
+            household_id=self.household_id,
+            user_id=user_id,
+            points_change=points_change,
+            penalty=penalty,
+            reason=reason,
+            chore='',
+            approver=self.approver,
+        ))
+
+    def leaderboard(self):
+        """The day's standings, highest first."""
+        return list(get_leaderboard(self.household_id, self.day))
+
+    def flush(self):
+        """
+        Write the queued point logs and the new balances.
+
+        Returns:
+            int: Number of point logs written
+        """
+        models.PointLog.objects.bulk_create(self.point_logs)
+        models.User.objects.bulk_update(list(self.children.values()), BALANCE_FIELDS)
+        # bulk writes send no signals
+        stamp_changes(self.household_id, models.User.objects.filter(pk__in=list(self.children)))
+        written = len(self.point_logs)
+        telemetry.record(rows=written + len(self.children),
+                         points=sum((log.points_change for log in self.point_logs), Decimal(0)))
+        self.point_logs = []
+        return written
+
+
+def incomplete_chores_sum():
+    """
+    Points from available chores a child hasn't completed, as a subquery to
+    annotate children with.
+
+    Returns:
+        Subquery: The sum, or NULL if every available chore is completed
+    """
+    completed = models.ChoreClaim.objects.filter(
+        user=OuterRef(OuterRef('pk')), approved__gt=0, chore__isnull=False
+    ).values('chore_id')
+    incomplete = models.Chore.objects.filter(household_id=OuterRef('household_id'), available=True).exclude(
+        id__in=completed
+    ).order_by().values('available').annotate(total=Sum('points')).values('total')
+    return Subquery(incomplete)
+
+
+def quantize_balance(value):
+    return value.quantize(BALANCE_QUANTUM)
+
+
+class NightlyJournal:
+    """
+    Records which phases of a nightly run, and which children within a
+    phase, have been completed.
+
+    Write each record in the same transaction as the work it records, so the
+    journal never claims work that was rolled back.
+    """
+
+    def __init__(self, run):
+        self.run = run
+
+    @classmethod
+    def for_date(cls, household_id, run_date=None):
+        """
+        Get the journal for a household's run for a day, starting it if needed.
+
+        Args:
+            household_id: The household's pk
+            run_date: The night being run; defaults to today
+
+        Returns:
+            NightlyJournal: The new or resumed journal
+        """
+        run, created = models.NightlyRun.objects.get_or_create(
+            household_id=household_id, run_date=run_date or standing_day())
+        if not created and run.finished_at is None:
+            done = ', '.join(sorted(run.steps.filter(user=None).values_list('phase', flat=True))) or 'none'
+            logger.warning(f"Resuming nightly run for {run.run_date}; completed phases: {done}")
+        return cls(run)
+
+    @classmethod
+    def unfinished(cls, household_id, before=None):
+        """
+        Journals of a household's earlier runs that never finished, oldest first.
+
+        Args:
+            household_id: The household's pk
+            before: Only runs before this date; defaults to today
+        """
+        runs = models.NightlyRun.objects.filter(
+            household_id=household_id, finished_at__isnull=True, run_date__lt=before or standing_day()
+        ).order_by('run_date')
+        return [cls(run) for run in runs]
+
+    @property
+    def day(self):
+        return self.run.run_date
+
+    @property
+    def household_id(self):
+        return self.run.household_id
+
+    @property
+    def finished(self):
+        return self.run.finished_at is not None
+
+    def is_done(self, phase):
+        return self.run.steps.filter(phase=phase, user=None).exists()
+
+    def pending_children(self, phase, children):
+        """
+        The children a per-child phase still has to process.
+
+        Args:
+            phase: The phase name
+            children: Queryset of all children
+
+        Returns:
+            QuerySet: Children with no journal entry for the phase
+        """
+        done = self.run.steps.filter(phase=phase, user__isnull=False).values('user_id')
+        return children.exclude(pk__in=done)
+
+    def record(self, phase, user_ids=None):
+        """
+        Record the completion of a phase, or of a phase for some children.
+
+        Args:
+            phase: The phase name
+            user_ids: Children the phase was completed for; None for the
+                whole phase
+        """
+        if user_ids is None:
+            models.NightlyRunStep.objects.create(run=self.run, phase=phase)
+        else:
+            models.NightlyRunStep.objects.bulk_create([
+                models.NightlyRunStep(run=self.run, phase=phase, user_id=user_id)
+                for user_id in user_ids
+            ])
+
+    def finish(self):
+        self.run.finished_at = timezone.now()
+        self.run.save(update_fields=['finished_at'])
+
+
+def run_per_child_phase(journal, phase, apply, approver, settings, children, batch_size):
+    """
+    Apply a per-child phase to the children the journal says are pending.
+
+    Children are processed in batches of batch_size, each committed with its
+    journal entries, so a failure loses at most one batch of work.
+
+    Args:
+        journal: The run's NightlyJournal
+        phase: The phase name
+        apply: The phase function, called as apply(approver, batch)
+        approver: The user recorded as approver on generated point logs
+        settings: Dict of setting key to value
+        children: Queryset of all children
+        batch_size: Children per transaction
+    """
+    pending = list(journal.pending_children(phase, children).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        with transaction.atomic(using=current_database()):
+            batch = NightlyBatch(journal.household_id, approver, settings, children.filter(pk__in=chunk),
+                                 day=journal.day)
+            apply(approver, batch)
+            batch.flush()
+            journal.record(phase, chunk)
+        logger.info(f"Nightly {phase}: processed {start + len(chunk)} of {len(pending)} children")
+
+
+def per_child_phase_functions():
+    """
+    The functions implementing the per-child phases.
+
+    Returns:
+        dict: Phase name to function, called as apply(approver, batch)
+    """
+    from chore_app.cron import apply_daily_bonus, incomplete_chore_penalty  # Import here to avoid circular imports
+    return {
+        INCOMPLETE_CHORE_PENALTY: incomplete_chore_penalty,
+        APPLY_DAILY_BONUS: apply_daily_bonus,
+    }
+
+
+def run_per_child_phases_parallel(journal, approver, settings, children, batch_size, workers):
+    """
+    Apply the per-child phases on a pool of worker processes.
+
+    Pending children are split into batches of batch_size and each batch is
+    handed to a worker, which applies every per-child phase to it in order.
+    A child's penalty and bonus depend only on that child, so the result is
+    the same as running the phases serially. Workers journal their batches,
+    so a failed run resumes the same way as a serial one.
+
+    Args:
+        journal: The run's NightlyJournal
+        approver: The user recorded as approver on generated point logs
+        settings: Dict of setting key to value
+        children: Queryset of all children
+        batch_size: Children per worker task
+        workers: Number of worker processes
+    """
+    pending = set()
+    for phase in PER_CHILD_PHASES:
+        pending.update(journal.pending_children(phase, children).values_list('pk', flat=True))
+    pending = sorted(pending)
+    if not pending:
+        return
+
+    chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    approver_pk = approver.pk if approver else None
+
+    # Workers are fresh interpreters that set Django up before unpickling
+    # their first task, and open their own database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=django.setup) as executor:
+        futures = [
+            executor.submit(_process_child_batch, journal.household_id, journal.run.pk, approver_pk, settings, chunk)
+            for chunk in chunks
+        ]
+        processed = 0
+        run = telemetry.current_run()
+        for future in futures:
+            count, work = future.result()
+            processed += count
+            if run is not None:
+                run.merge(work)
+            logger.info(f"Nightly per-child phases: processed {processed} of {len(pending)} children")
+
+
+def _process_child_batch(household_id, run_pk, approver_pk, settings, user_ids):
+    """
+    Worker task: apply the per-child phases to one batch of children.
+
+    Returns:
+        tuple: Number of children in the batch, and the work done per
+            phase (see RunTelemetry.work())
+    """
+    with use_household(registry.get(household_id)), telemetry.collecting() as run:
+        journal = NightlyJournal(models.NightlyRun.objects.get(pk=run_pk))
+        approver = models.User.objects.filter(pk=approver_pk).first() if approver_pk else None
+        children = models.User.objects.filter(household_id=household_id, role='Child', pk__in=user_ids)
+        functions = per_child_phase_functions()
+
+        for attempt in range(WORKER_LOCK_RETRIES + 1):
+            try:
+                for phase in PER_CHILD_PHASES:
+                    with run.observe(phase), query_source(f'nightly {phase}'):
+                        run_per_child_phase(journal, phase, functions[phase], approver, settings,
+                                            children, len(user_ids))
+                return len(user_ids), run.work()
+            except OperationalError as e:
+                # SQLite allows one writer; wait for the other workers. The
+                # journal makes the retry skip whatever was already committed.
+                if 'locked' not in str(e) or attempt == WORKER_LOCK_RETRIES:
+                    raise
+                time.sleep(WORKER_LOCK_BACKOFF_SECONDS * (attempt + 1))
@@ -0,0 +1,137 @@
+"""
+Keyset (seek) pagination for point log history.
+
+Pages are addressed by a cursor holding the (date_recorded, id) of the row at
+the page edge instead of a page number, so every page is an index range scan
+of per_page + 1 rows. There is no COUNT(*) and no OFFSET, and deep history
+pages cost the same as the first page.
+"""
+
+import base64
+import binascii
+import datetime
+import logging
+
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Query string parameters
+BEFORE_PARAM = 'before'
+AFTER_PARAM = 'after'
+PAGE_PARAM = 'page'
+LAST_PAGE = 'last'
+
+
+class KeysetPage:
+    """
+    One page of results, newest first, with cursors to its neighbours.
+    """
+
+    def __init__(self, items, has_next, has_previous):
+        self.object_list = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.object_list else ''
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.object_list else ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(row):
+    """
+    Encode a row's position as an opaque, URL-safe cursor.
+
+    Args:
+        row: A model instance or dict with date_recorded and id
+
+    Returns:
+        str: The cursor
+    """
+    if isinstance(row, dict):
+        date_recorded, pk = row['date_recorded'], row['id']
+    else:
+        date_recorded, pk = row.date_recorded, row.pk
+    raw = f"{date_recorded.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor().
+
+    Args:
+        cursor: The cursor string
+
+    Returns:
+        tuple: (date_recorded, id), or None if the cursor is invalid
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_part, pk_part = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(date_part), int(pk_part)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError) as e:
+        logger.warning(f"Invalid pagination cursor: {cursor}, error: {e}")
+        return None
+
+
+def _older_than(position):
+    date_recorded, pk = position
+    # The leading range keeps the condition usable by the date_recorded index
+    return Q(date_recorded__lte=date_recorded) & (Q(date_recorded__lt=date_recorded) | Q(id__lt=pk))
+
+
+def _newer_than(position):
+    date_recorded, pk = position
+    return Q(date_recorded__gte=date_recorded) & (Q(date_recorded__gt=date_recorded) | Q(id__gt=pk))
+
+
+def keyset_paginate(queryset, params, per_page):
+    """
+    Get one page of a queryset, newest first.
+
+    The page is chosen from the query string: ?before=<cursor> for older rows,
+    ?after=<cursor> for newer rows, ?page=last for the oldest rows, and
+    otherwise the newest rows.
+
+    Args:
+        queryset: The rows to page through; must have date_recorded and id
+        params: The request's GET parameters
+        per_page: Number of rows per page
+
+    Returns:
+        KeysetPage: The requested page
+    """
+    newest_first = queryset.order_by('-date_recorded', '-id')
+    oldest_first = queryset.order_by('date_recorded', 'id')
+
+    before = decode_cursor(params[BEFORE_PARAM]) if params.get(BEFORE_PARAM) else None
+    after = decode_cursor(params[AFTER_PARAM]) if params.get(AFTER_PARAM) else None
+
+    if after is not None:
+        rows = list(oldest_first.filter(_newer_than(after))[:per_page + 1])
+        if len(rows) > per_page:
+            return KeysetPage(rows[:per_page][::-1], has_next=True, has_previous=True)
+        # Back at the newest rows; serve a full first page
+
+    if params.get(PAGE_PARAM) == LAST_PAGE:
+        rows = list(oldest_first[:per_page + 1])
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], has_next=False, has_previous=has_previous)
+
+    if before is not None:
+        rows = list(newest_first.filter(_older_than(before))[:per_page + 1])
+        return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=True)
+
+    rows = list(newest_first[:per_page + 1])
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=False)
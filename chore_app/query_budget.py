@@ -0,0 +1,392 @@
+"""
+Query and time budgets for every view and nightly phase.
+
+Each view in urls.py has one or more cases: who makes the request, how, and
+the most queries and milliseconds it may take against the dataset built by
+seed_budget_dataset(). check_budgets() runs every case and every phase of the
+nightly run and reports those over budget with the SQL they ran, repeated
+statements first, which is how an N+1 shows itself.
+
+A case also fails if the response has the wrong status code, or a redirect
+goes somewhere other than expected, so an error page that runs fewer queries
+doesn't pass.
+
+Budgets are fixed, exact query counts for the seeded dataset, with no
+headroom, so any new query shows up. No case's count grows with the data:
+one that does is an N+1 to fix, not a budget to raise.
+
+Caches are cleared before each case, so the counts include every query a
+cache miss costs. Each case runs in a transaction that is rolled back, so
+cases don't see each other's writes. Run through the check_query_budgets
+command, which uses a throwaway test database, or as part of the test suite
+(chore_app/tests).
+"""
+
+import contextlib
+import datetime
+import re
+import time
+from urllib.parse import urlsplit
+from collections import Counter
+from io import StringIO
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, URLResolver, get_resolver, resolve, reverse
+from django.utils import timezone
+
+import chore_app.models as models
+from chore_app.config import config_cache
+from chore_app.constants import NIGHTLY_JOB_CODE
+from chore_app.nightly import PHASES
+from chore_app.seeding import seed_household
+from chore_app.tenancy import registry, use_household
+from chore_app.utils import nightly_action
+
+BUDGET_HOUSEHOLD = 'Budget'
+BUDGET_PASSWORD = 'budget-Password-1'
+
+# Default time budget for a request, in milliseconds. Generous: the counts
+# catch regressions, the times catch pathological ones
+DEFAULT_MAX_MS = 500
+# Requests that hash a password, which is slow on purpose
+PASSWORD_HASH_MAX_MS = 3000
+NIGHTLY_PHASE_MAX_MS = 2000
+
+# Size of the seeded household
+BUDGET_DATASET = {'children': 8, 'parents': 2, 'chores': 60, 'pending_claims': 20}
+
+# Views not measured, with the reason
+EXEMPT_VIEWS = {
+    'live_events': "an endless event stream; it shares one version check per worker, not per request",
+}
+
+
+class Case(NamedTuple):
+    view: str
+    # 'Parent', 'Child' or None for an anonymous request
+    role: Optional[str]
+    max_queries: int
+    method: str = 'GET'
+    # Callables taking the dataset dict
+    args: Optional[Callable] = None
+    data: Optional[Callable] = None
+    query: str = ''
+    max_ms: float = DEFAULT_MAX_MS
+    # Expected status code; None for 200 on GET, 302 on POST
+    status: Optional[int] = None
+    # URL name a redirect must go to
+    redirect: Optional[str] = None
+
+
+def _chore_form(dataset):
+    return {
+        'name': 'Budget chore', 'comment': '', 'points': '10', 'available': 'on', 'daily': 'on',
+        'assignment_type': 'any_selected', 'assigned_children': [dataset['child']],
+        'bonus_end_time': '10', 'available_time': '0',
+    }
+
+
+CASES = (
+    Case('register', None, 1),
+    Case('register', None, 10, 'POST', data=lambda d: {
+        'username': 'budget_new_child', 'email': '', 'role': 'Child', 'points_balance': '0',
+        'password1': BUDGET_PASSWORD, 'password2': BUDGET_PASSWORD,
+    }, max_ms=PASSWORD_HASH_MAX_MS, redirect='login'),
+    Case('login', None, 1),
+    Case('login', None, 15, 'POST', data=lambda d: {
+        'username': d['child_username'], 'password': BUDGET_PASSWORD,
+    }, max_ms=PASSWORD_HASH_MAX_MS, redirect='parent_profile'),
+    Case('logout', 'Child', 5, 'POST', redirect='login'),
+    Case('profile', 'Parent', 3, status=302, redirect='parent_profile'),
+    Case('parent_profile', 'Parent', 15),
+    Case('parent_profile', 'Parent', 15, query='?page=last'),
+    Case('child_profile', 'Child', 13),
+    Case('child_chore', 'Child', 3),
+    Case('child_chore', 'Child', 9, 'POST', data=lambda d: {'chore_name': 'Extra', 'points': '5', 'comment': ''},
+         redirect='child_profile'),
+    Case('kiosk', 'Child', 3),
+    Case('kiosk_service_worker', 'Child', 3),
+    Case('metrics', None, 1),
+    Case('create_chore', 'Parent', 4),
+    Case('create_chore', 'Parent', 18, 'POST', data=_chore_form, redirect='parent_profile'),
+    Case('edit_chore', 'Parent', 6, args=lambda d: [d['chore']]),
+    Case('edit_chore', 'Parent', 21, 'POST', args=lambda d: [d['chore']], data=_chore_form,
+         redirect='parent_profile'),
+    Case('toggle_availability', 'Parent', 11, 'POST', args=lambda d: [d['chore']], redirect='parent_profile'),
+    Case('delete_chore', 'Parent', 12, 'POST', args=lambda d: [d['chore']], redirect='parent_profile'),
+    Case('penalise_chore', 'Parent', 20, 'POST', args=lambda d: [d['chore']], redirect='parent_profile'),
+    Case('claim_chore', 'Child', 19, 'POST', args=lambda d: [d['claimable_chore']], redirect='child_profile'),
+    Case('return_chore', 'Child', 19, 'POST', args=lambda d: [d['claim']], redirect='child_profile'),
+    Case('approve_chore_claim', 'Parent', 22, 'POST', args=lambda d: [d['claim'], 0], redirect='parent_profile'),
+    Case('approve_selected_claims', 'Parent', 22, 'POST',
+         data=lambda d: {'claims': d['pending_claims'], 'penalty': '0'}, redirect='parent_profile'),
+    Case('reject_chore_claim', 'Parent', 22, 'POST', args=lambda d: [d['claim']], redirect='parent_profile'),
+    Case('point_adjustment', 'Parent', 3, args=lambda d: [d['child']]),
+    Case('point_adjustment', 'Parent', 12, 'POST', args=lambda d: [d['child']],
+         data=lambda d: {'points_change': '5', 'reason': 'Budget'}, redirect='parent_profile'),
+    Case('pocket_money_adjustment', 'Parent', 3, args=lambda d: [d['child']]),
+    Case('pocket_money_adjustment', 'Parent', 10, 'POST', args=lambda d: [d['child']],
+         data=lambda d: {'pocket_money': '1'}, redirect='parent_profile'),
+    Case('convert_points_to_money', 'Child', 18, 'POST', args=lambda d: [d['child']], redirect='child_profile'),
+    # The whole nightly job; its reset deletes every claim it approves
+    Case('daily_action', 'Parent', 104, 'POST', max_ms=NIGHTLY_PHASE_MAX_MS, redirect='parent_profile'),
+    Case('run_history', 'Parent', 5),
+    Case('export_point_log', 'Parent', 5),
+    Case('settings', 'Parent', 4),
+    Case('edit_settings', 'Parent', 4, args=lambda d: [d['setting']]),
+    Case('edit_settings', 'Parent', 7, 'POST', args=lambda d: [d['setting']],
+         data=lambda d: {'key': d['setting_key'], 'name': 'Budget setting', 'value': '240'}, redirect='settings'),
+    Case('messages', 'Parent', 4),
+    Case('edit_text', 'Parent', 4, args=lambda d: [d['text']]),
+    Case('edit_text', 'Parent', 7, 'POST', args=lambda d: [d['text']],
+         data=lambda d: {'key': d['text_key'], 'text': 'Budget message', 'enabled': 'on'}, redirect='parent_profile'),
+    Case('api_board', 'Child', 7),
+    Case('api_changes', 'Child', 9, query='?since=0'),
+    Case('api_claim_chore', 'Child', 21, 'POST', args=lambda d: [d['claimable_chore']], status=201),
+    Case('api_claims', 'Parent', 5),
+    Case('api_return_claim', 'Child', 20, 'POST', args=lambda d: [d['claim']], status=200),
+    Case('api_approve_claim', 'Parent', 23, 'POST', args=lambda d: [d['claim']], status=200),
+    Case('api_reject_claim', 'Parent', 23, 'POST', args=lambda d: [d['claim']], status=200),
+    Case('api_leaderboard', 'Parent', 5),
+    Case('api_history', 'Parent', 5),
+)
+
+# Most queries per nightly phase, run in-process
+NIGHTLY_BUDGETS = {
+    'auto_approve': 23,
+    'incomplete_chore_penalty': 14,
+    'apply_daily_bonus': 14,
+    'apply_leaderboard_scoring': 13,
+    'reset_daily_chores': 17,
+}
+
+
+class Result(NamedTuple):
+    name: str
+    queries: int
+    max_queries: int
+    ms: float
+    max_ms: float
+    status: Optional[int]
+    sql: list
+    expected_status: Optional[int] = None
+    # URL names the response redirected to and should have
+    redirect: Optional[str] = None
+    expected_redirect: Optional[str] = None
+
+    @property
+    def ok(self):
+        return (self.queries <= self.max_queries and self.ms <= self.max_ms
+                and self.status == self.expected_status and self.redirect == self.expected_redirect)
+
+
+
+def _redirect_name(response):
+    location = response.get('Location')
+    if not location:
+        return None
+    try:
+        return resolve(urlsplit(location).path).url_name
+    except Resolver404:
+        return location
+
+
+def seed_budget_dataset():
+    """
+    Load the default settings and seed the budget household.
+
+    Returns:
+        dict: The pks and names the cases use
+    """
+    call_command('loaddata', str(settings.BASE_DIR / 'settings.json'), verbosity=0)
+    household = seed_household(BUDGET_HOUSEHOLD, **BUDGET_DATASET, history_days=30, logs_per_child_per_day=4,
+                               password=BUDGET_PASSWORD)
+
+    pending = models.ChoreClaim.objects.filter(household=household, approved=0).order_by('pk')
+    claim = pending.first()
+    child = claim.user
+    claimed_by_child = models.ChoreClaim.objects.filter(user=child, approved=0).values('chore_id')
+    claimable = models.Chore.objects.filter(
+        household=household, available=True, assignment_type__in=('any_child', 'all_children'),
+    ).exclude(pk__in=claimed_by_child).order_by('pk').first()
+    # Cases measure the same work whatever the random data: the chore to edit
+    # has no selected children to replace, and the child can convert points
+    chore = models.Chore.objects.filter(
+        household=household, assignment_type__in=('any_child', 'all_children')).order_by('pk').first()
+    max_points = models.Settings.objects.get(household=household, key='max_points').value
+    models.User.objects.filter(pk=child.pk).update(points_balance=max_points)
+    # A few nights of run history
+    for night in range(1, 4):
+        started_at = timezone.now() - datetime.timedelta(days=night)
+        run = models.RunLog.objects.create(
+            household=household, job_code=NIGHTLY_JOB_CODE, run_date=started_at.date(), started_at=started_at,
+            finished_at=started_at + datetime.timedelta(seconds=2))
+        models.RunLogPhase.objects.bulk_create([models.RunLogPhase(run=run, phase=phase) for phase in PHASES])
+
+    setting = models.Settings.objects.filter(household=household).order_by('pk').first()
+    text = models.Text.objects.filter(household=household).order_by('pk').first()
+    return {
+        'household': household.pk,
+        'parent': models.User.objects.filter(household=household, role='Parent').order_by('pk').first().pk,
+        'child': child.pk,
+        'child_username': child.username,
+        'chore': chore.pk,
+        'claimable_chore': claimable.pk,
+        'claim': claim.pk,
+        'pending_claims': [str(pk) for pk in pending.values_list('pk', flat=True)],
+        'setting': setting.pk,
+        'setting_key': setting.key,
+        'text': text.pk,
+        'text_key': text.key,
+    }
+
+
+def _clear_caches():
+    cache.clear()
+    config_cache.invalidate()
+    registry.invalidate()
+
+
+@contextlib.contextmanager
+def _rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+    _clear_caches()
+
+
+def _user(dataset, role):
+    return models.User.objects.get(pk=dataset['parent'] if role == 'Parent' else dataset['child'])
+
+
+def run_case(case, dataset, time_scale=1.0):
+    """
+    Make a case's request and measure it.
+
+    Args:
+        case: The Case
+        dataset: From seed_budget_dataset()
+        time_scale: Multiplier for the time budget, for slow machines
+
+    Returns:
+        Result: Queries, time and the SQL run
+    """
+    path = reverse(case.view, args=case.args(dataset) if case.args else None) + case.query
+    name = f"{case.method} {path}"
+    with _rolled_back():
+        client = Client(raise_request_exception=False)
+        if case.role:
+            client.force_login(_user(dataset, case.role))
+        _clear_caches()
+        data = case.data(dataset) if case.data else {}
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if case.method == 'POST':
+                response = client.post(path, data)
+            else:
+                response = client.get(path)
+            if response.streaming:
+                # A streamed response runs its queries as it is read
+                b''.join(response.streaming_content)
+            ms = (time.perf_counter() - started) * 1000
+    expected_status = case.status or (302 if case.method == 'POST' else 200)
+    return Result(name, len(queries), case.max_queries, round(ms, 1), case.max_ms * time_scale,
+                  response.status_code, [query['sql'] for query in queries.captured_queries],
+                  expected_status, _redirect_name(response), case.redirect)
+
+
+def run_nightly(dataset, time_scale=1.0):
+    """
+    Run the nightly job for the budget household, measuring each phase.
+
+    Args:
+        dataset: From seed_budget_dataset()
+        time_scale: Multiplier for the time budget
+
+    Returns:
+        list: A Result per phase
+    """
+    results = []
+
+    @contextlib.contextmanager
+    def measure(phase):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            yield
+            ms = (time.perf_counter() - started) * 1000
+        results.append(Result(f"nightly {phase}", len(queries), NIGHTLY_BUDGETS[phase], round(ms, 1),
+                              NIGHTLY_PHASE_MAX_MS * time_scale, None,
+                              [query['sql'] for query in queries.captured_queries]))
+
+    with _rolled_back():
+        household = registry.get(dataset['household'])
+        with use_household(household):
+            approver = _user(dataset, 'Parent')
+            nightly_action(household.pk, approver=approver, workers=1, observe_phase=measure)
+    return results
+
+
+def named_views():
+    """Every URL name in the project's URLconf."""
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            elif pattern.name:
+                yield pattern.name
+    return set(walk(get_resolver().url_patterns))
+
+
+def check_budgets(time_scale=1.0):
+    """
+    Seed the dataset and measure every case and nightly phase.
+
+    Call with an empty test database.
+
+    Args:
+        time_scale: Multiplier for the time budgets
+
+    Returns:
+        tuple: (results, names of views with no case and no exemption)
+    """
+    missing = sorted(named_views() - {case.view for case in CASES} - set(EXEMPT_VIEWS))
+    # Count the dashboards' concurrent reads on this connection, and keep
+    # these requests out of the server's metrics
+    with override_settings(CONCURRENT_READS=False, METRICS_DIR=None):
+        _clear_caches()
+        dataset = seed_budget_dataset()
+        results = [run_case(case, dataset, time_scale) for case in CASES]
+        results += run_nightly(dataset, time_scale)
+    assert {result.name for result in results if result.name.startswith('nightly ')} == \
+        {f"nightly {phase}" for phase in PHASES}, "Nightly phases without a measurement"
+    return results, missing
+
+
+def normalize_sql(sql):
+    # Same statement with different values
+    return re.sub(r"\b\d+\b|'[^']*'", '?', sql)
+
+
+def format_sql(result):
+    """
+    The SQL a result ran, repeated statements first.
+
+    Args:
+        result: A Result
+
+    Returns:
+        str: Report text
+    """
+    out = StringIO()
+    repeated = [(count, sql) for sql, count in Counter(map(normalize_sql, result.sql)).most_common() if count > 1]
+    for count, sql in repeated:
+        out.write(f"    {count}x {sql}\n")
+    for number, sql in enumerate(result.sql, 1):
+        out.write(f"    {number:>3}. {sql}\n")
+    return out.getvalue()
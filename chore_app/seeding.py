@@ -0,0 +1,165 @@
+"""
+Synthetic households for benchmarks and query budgets.
+
+seed_household() fills a new household with children, parents, chores of
+every assignment type, pending and approved claims, point log history and
+today's standings, with bulk inserts in one transaction: a hundred thousand
+point logs take seconds, a million a few minutes. The same seed gives the
+same data.
+"""
+
+import contextlib
+import datetime
+import logging
+import random
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+import chore_app.models as models
+from chore_app.standings import rebuild_standings
+from chore_app.tenancy import current_database, registry, use_household
+from chore_app.versioning import bump_data_version, household_key
+
+logger = logging.getLogger(__name__)
+
+# Rows per bulk insert
+SEED_BATCH_SIZE = 5000
+
+ASSIGNMENT_WEIGHTS = (
+    ('any_child', 50),
+    ('all_children', 20),
+    ('any_selected', 15),
+    ('all_selected', 15),
+)
+AVAILABLE_TIMES = (0, 0, 0, 7, 15, -9, -20)
+HISTORY_REASONS = ('Approved', 'Approved', 'Approved', 'Daily Points', 'Rejected', 'Incomplete Chores')
+
+
+@contextlib.contextmanager
+def _explicit_dates(model, field_name):
+    # bulk_create stamps auto_now_add fields with the current time; history
+    # needs the dates it was given
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_household(name, children=8, parents=2, chores=60, pending_claims=20, history_days=30,
+                   logs_per_child_per_day=4, password=None, seed=0):
+    """
+    Create a household filled with synthetic data.
+
+    Args:
+        name: Household name; must not exist yet
+        children: Number of child accounts
+        parents: Number of parent accounts
+        chores: Number of chores, about 80% of them available
+        pending_claims: Number of claims awaiting approval
+        history_days: Days of point log history
+        logs_per_child_per_day: Point log entries per child per day
+        password: Password for every account, or None for unusable passwords
+        seed: Random seed
+
+    Returns:
+        Household: The new household
+
+    Raises:
+        ValueError: If the household already exists
+    """
+    if models.Household.objects.filter(name=name).exists():
+        raise ValueError(f"Household {name} already exists")
+    rng = random.Random(seed)
+    call_command('create_household', name, stdout=StringIO())
+    household = models.Household.objects.get(name=name)
+
+    with use_household(registry.get(household.pk)):
+        with transaction.atomic(using=current_database()):
+            # One hash for every account: hashing is slow on purpose
+            password_hash = make_password(password)
+            users = [
+                models.User(household=household, username=f'h{household.pk}_child_{i}', role='Child',
+                            password=password_hash, points_balance=Decimal(rng.randint(-100, 500)))
+                for i in range(children)
+            ] + [
+                models.User(household=household, username=f'h{household.pk}_parent_{i}', role='Parent',
+                            password=password_hash)
+                for i in range(parents)
+            ]
+            models.User.objects.bulk_create(users, batch_size=SEED_BATCH_SIZE)
+            child_ids = list(models.User.objects.filter(household=household, role='Child').values_list('pk', flat=True))
+            parent_ids = list(models.User.objects.filter(household=household, role='Parent').values_list('pk', flat=True))
+
+            assignment_types = [kind for kind, _ in ASSIGNMENT_WEIGHTS]
+            weights = [weight for _, weight in ASSIGNMENT_WEIGHTS]
+            models.Chore.objects.bulk_create((
+                models.Chore(
+                    household=household, name=f'Chore {i}', comment=f'Seeded chore {i}',
+                    points=Decimal(rng.randint(5, 50)), daily=rng.random() < 0.6,
+                    available=rng.random() < 0.8, early_bonus=rng.random() < 0.3,
+                    assignment_type=rng.choices(assignment_types, weights)[0],
+                    available_time=rng.choice(AVAILABLE_TIMES),
+                )
+                for i in range(chores)
+            ), batch_size=SEED_BATCH_SIZE)
+            chore_rows = list(models.Chore.objects.filter(household=household).values_list(
+                'pk', 'name', 'points', 'available', 'assignment_type'))
+
+            if child_ids:
+                Assignment = models.Chore.assigned_children.through
+                Assignment.objects.bulk_create((
+                    Assignment(chore_id=pk, user_id=child_id)
+                    for pk, _, _, _, kind in chore_rows if kind in ('any_selected', 'all_selected')
+                    for child_id in rng.sample(child_ids, min(len(child_ids), rng.randint(1, 3)))
+                ), batch_size=SEED_BATCH_SIZE)
+
+                available = [row for row in chore_rows if row[3]]
+                pairs = {(rng.choice(available)[0], rng.choice(child_ids)) for _ in range(pending_claims)} \
+                    if available else set()
+                by_pk = {row[0]: row for row in chore_rows}
+                models.ChoreClaim.objects.bulk_create((
+                    models.ChoreClaim(household=household, chore_id=chore_pk, user_id=child_id,
+                                      chore_name=by_pk[chore_pk][1], points=by_pk[chore_pk][2])
+                    for chore_pk, child_id in sorted(pairs)
+                ), batch_size=SEED_BATCH_SIZE)
+
+                now = timezone.now()
+                start = now - datetime.timedelta(days=history_days)
+                total = history_days * len(child_ids) * logs_per_child_per_day
+                history = (
+                    models.PointLog(
+                        household=household, user_id=rng.choice(child_ids),
+                        points_change=Decimal(rng.randint(-20, 60)), reason=rng.choice(HISTORY_REASONS),
+                        chore=rng.choice(chore_rows)[1] if chore_rows else '',
+                        approver_id=rng.choice(parent_ids) if parent_ids else None,
+                        date_recorded=start + datetime.timedelta(seconds=rng.uniform(0, history_days * 86400)),
+                    )
+                    for _ in range(total)
+                )
+                with _explicit_dates(models.PointLog, 'date_recorded'):
+                    for batch in _batches(history, SEED_BATCH_SIZE):
+                        models.PointLog.objects.bulk_create(batch)
+
+            rebuild_standings(household.pk)
+            bump_data_version(household_key(household.pk))
+
+    logger.info(f"Seeded household {name}: {children} children, {parents} parents, {chores} chores")
+    return household
@@ -47,12 +47,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chore_app.metrics.MetricsMiddleware',
+    'chore_app.slow_queries.SlowQueryMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'chore_app.static_assets.StaticAssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'chore_app.tenancy.HouseholdMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,15 +83,135 @@ WSGI_APPLICATION = 'chore_app.wsgi.application'
 
 CRON_CLASSES = [
     "chore_app.cron.NightlyAction",
+    "chore_app.cron.ArchivePointLogs",
 ]
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Production SQLite profile, on by default when DEBUG is off: write-ahead
+# logging so readers never wait on the writer, write transactions that take
+# the write lock up front (BEGIN IMMEDIATE) and queue on busy_timeout instead
+# of failing with "database is locked", and persistent connections so the
+# pragmas and page cache survive between requests.
+SQLITE_PRODUCTION = os.environ.get('CHORE_SQLITE_PRODUCTION', str(not DEBUG)).lower() == 'true'
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    # Safe with WAL: a power cut can lose the last commits, never corrupt
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA mmap_size=268435456',
+    # Negative is KiB: 64 MB of page cache per connection
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def sqlite_database(name):
+    """
+    Settings for one SQLite database file, with the production profile if enabled.
+
+    Args:
+        name: Path of the database file
+
+    Returns:
+        dict: The DATABASES entry
+    """
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+    }
+    if SQLITE_PRODUCTION:
+        database.update({
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': '; '.join(SQLITE_PRAGMAS),
+                # select_for_update() is a no-op on SQLite; this serializes writers instead
+                'transaction_mode': 'IMMEDIATE',
+            },
+        })
+    return database
+
+
 DATABASES = {
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3'),
+}
+
+# Households kept in their own SQLite file: every <name>.sqlite3 in this
+# directory is available as the database alias 'household_<name>'
+# (see chore_app/tenancy.py and the create_household command)
+HOUSEHOLD_DATABASE_DIR = os.environ.get('CHORE_HOUSEHOLD_DATABASE_DIR', '')
+
+if HOUSEHOLD_DATABASE_DIR:
+    for household_db in sorted(Path(HOUSEHOLD_DATABASE_DIR).glob('*.sqlite3')):
+        DATABASES[f'household_{household_db.stem}'] = sqlite_database(household_db)
+
+DATABASE_ROUTERS = ['chore_app.tenancy.HouseholdRouter']
+
+# Set by the upgrade_households command while it adds the household columns
+# to an install from before households; leave it off
+HOUSEHOLD_UPGRADE = os.environ.get('CHORE_HOUSEHOLD_UPGRADE', 'False').lower() == 'true'
+
+
+# Run the dashboards' independent reads side by side on worker threads
+# (chore_app/concurrent_reads.py); off, they run one after another
+CONCURRENT_READS = True
+
+# Worker processes for the per-child phases of the nightly job; 1 runs it in-process
+NIGHTLY_WORKERS = int(os.environ.get('CHORE_NIGHTLY_WORKERS', '1'))
+
+# Prometheus metrics at /metrics (chore_app/metrics.py). Each process writes
+# its metrics to a file in METRICS_DIR at most every METRICS_FLUSH_SECONDS,
+# and /metrics adds up every process's file
+METRICS_ENABLED = os.environ.get('CHORE_METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_DIR = os.environ.get('CHORE_METRICS_DIR', str(BASE_DIR / 'metrics'))
+METRICS_FLUSH_SECONDS = 5
+# Addresses allowed to read /metrics
+METRICS_ALLOWED_IPS = os.environ.get('CHORE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Log queries slower than SLOW_QUERY_MS, with their query plans, to
+# SLOW_QUERY_LOG_FILE (chore_app/slow_queries.py). Off unless asked for
+SLOW_QUERY_LOG = os.environ.get('CHORE_SLOW_QUERY_LOG', 'False').lower() == 'true'
+SLOW_QUERY_MS = float(os.environ.get('CHORE_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG_FILE = os.environ.get('CHORE_SLOW_QUERY_LOG_FILE', str(BASE_DIR / 'logs' / 'slow_queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            # Opened on the first slow query, once the directory exists
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'chore_app.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Used for dashboard fragments (see chore_app/fragment_cache.py)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chore_app',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
     }
 }
 
@@ -135,6 +259,19 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic target; served by chore_app.static_assets with DEBUG off
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+if not DEBUG:
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'chore_app.static_assets.CompressedManifestStaticFilesStorage',
+        },
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,116 @@
+"""
+Model signal receivers for the chore application.
+
+Receivers are connected per sender rather than to every model: a model with
+no delete receivers keeps Django's fast path for queryset deletes, which
+matters for bulk maintenance such as point log archival.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.expressions import Combinable
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+import chore_app.models as models
+import chore_app.sync as sync
+from chore_app.config import config_cache
+from chore_app.tenancy import current_database
+from chore_app.versioning import CONFIG_VERSION_KEY, bump_data_version, household_key
+
+# Models whose saves and deletes change what the dashboards show
+VERSIONED_MODELS = (
+    models.Settings,
+    models.Text,
+)
+
+# Versioned models that kiosks sync row by row: saves stamp the row and
+# deletes leave a tombstone (see chore_app.sync). The delete receiver costs
+# queries per row, so queryset deletes go through sync.delete_synced()
+SYNCED_MODELS = tuple(sync.TOMBSTONE_MODELS)
+
+# Append-only models: only inserts are tracked. Bulk maintenance that deletes
+# them (archival) bumps the version itself.
+VERSIONED_APPEND_ONLY_MODELS = (
+    models.PointLog,
+)
+
+# Models with a row version for lock-free claims (see chore_app.claims)
+ROW_VERSIONED_MODELS = (
+    models.Chore,
+    models.ChoreClaim,
+)
+
+# Models held in the process-wide configuration cache
+CONFIG_MODELS = (
+    models.Settings,
+    models.Text,
+    models.RunLog,
+)
+
+
+def bump_version_on_write(sender, instance, **kwargs):
+    bump_data_version(household_key(instance.household_id))
+
+
+def stamp_on_save(sender, instance, **kwargs):
+    instance.sync_version = sync.stamp_changes(instance.household_id, sender.objects.filter(pk=instance.pk))
+
+
+def bump_row_version_on_save(sender, instance, **kwargs):
+    # save() writes back every field; increment the version in SQL instead of
+    # restoring the one read, so a claim that read the row before can't match
+    if not instance._state.adding:
+        instance.version = F('version') + 1
+
+
+def refresh_row_version_on_save(sender, instance, created, **kwargs):
+    # Replace the expression left by bump_row_version_on_save with the saved
+    # number, so the instance can still be compared or saved again
+    if isinstance(instance.version, Combinable):
+        instance.refresh_from_db(fields=['version'])
+
+
+def tombstone_on_delete(sender, instance, **kwargs):
+    sync.record_deletion(instance.household_id, sync.TOMBSTONE_MODELS[sender], instance.pk)
+
+
+def stamp_on_assignment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # instance is the chore, or the child for changes made from the user side
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            chores = models.Chore.objects.filter(pk=instance.pk)
+        else:
+            chores = models.Chore.objects.filter(pk__in=pk_set or ())
+        sync.stamp_changes(instance.household_id, chores)
+
+
+def invalidate_config_on_write(sender, **kwargs):
+    # Tell other processes, then drop our copy now and again once the
+    # write is visible, so a reload mid-transaction can't stick
+    bump_data_version(CONFIG_VERSION_KEY)
+    config_cache.invalidate()
+    transaction.on_commit(config_cache.invalidate, using=current_database())
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_write, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+    post_delete.connect(bump_version_on_write, sender=model, dispatch_uid=f'bump_version_delete_{model.__name__}')
+
+for model in SYNCED_MODELS:
+    post_save.connect(stamp_on_save, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+    post_delete.connect(tombstone_on_delete, sender=model, dispatch_uid=f'bump_version_delete_{model.__name__}')
+
+for model in ROW_VERSIONED_MODELS:
+    pre_save.connect(bump_row_version_on_save, sender=model, dispatch_uid=f'bump_row_version_{model.__name__}')
+    post_save.connect(refresh_row_version_on_save, sender=model,
+                      dispatch_uid=f'refresh_row_version_{model.__name__}')
+
+for model in VERSIONED_APPEND_ONLY_MODELS:
+    post_save.connect(bump_version_on_write, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+
+m2m_changed.connect(stamp_on_assignment_change, sender=models.Chore.assigned_children.through,
+                    dispatch_uid='bump_version_assignment')
+
+for model in CONFIG_MODELS:
+    post_save.connect(invalidate_config_on_write, sender=model, dispatch_uid=f'invalidate_config_save_{model.__name__}')
+    post_delete.connect(invalidate_config_on_write, sender=model, dispatch_uid=f'invalidate_config_delete_{model.__name__}')
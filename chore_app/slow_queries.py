@@ -0,0 +1,195 @@
+"""
+Slow query log, with SQLite's query plan for each slow query.
+
+With SLOW_QUERY_LOG on, every database connection gets an execute wrapper
+that times its queries. A query slower than SLOW_QUERY_MS is written to the
+'chore_app.slow_queries' logger (a rotating file, see settings.LOGGING) as
+one JSON object per line with:
+    - the SQL and its parameters
+    - where it came from: the URL name of the view or the cron job and
+      nightly phase (query_source()), and the innermost chore_app frame
+    - the output of EXPLAIN QUERY PLAN, and the tables it reads with a full
+      scan, i.e. without an index
+
+so a query that misses its index on a hot path shows up in production.
+"""
+
+import contextlib
+import json
+import logging
+import time
+import traceback
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Statements worth a query plan
+EXPLAINED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+_APP_DIR = str(Path(__file__).resolve().parent)
+
+# What is running the queries: a view's URL name, a cron job or nightly phase
+_source = ContextVar('slow_query_source', default=None)
+# Set while running EXPLAIN, so the wrapper doesn't explain its own query
+_explaining = ContextVar('slow_query_explaining', default=False)
+
+
+class _Source:
+    def __init__(self, label=''):
+        self.label = label
+
+
+@contextlib.contextmanager
+def query_source(label):
+    """
+    Attribute slow queries run in this context to a source.
+
+    Args:
+        label: e.g. 'cron nightly_action' or 'nightly auto_approve'
+    """
+    token = _source.set(_Source(label))
+    try:
+        yield
+    finally:
+        _source.reset(token)
+
+
+def _caller():
+    # The innermost frame in chore_app's own code
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(_APP_DIR) and not frame.filename.endswith('slow_queries.py'):
+            return f"{Path(frame.filename).name}:{frame.lineno} {frame.name}"
+    return ''
+
+
+def query_plan(connection, sql, params):
+    """
+    SQLite's plan for a query.
+
+    Args:
+        connection: The connection the query ran on
+        sql: The query, with Django's placeholders
+        params: Its parameters
+
+    Returns:
+        list: The plan's steps, indented by depth; empty if the statement
+            has no plan or the database isn't SQLite
+    """
+    if connection.vendor != 'sqlite' or not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return []
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            rows = cursor.fetchall()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        _explaining.reset(token)
+    depths = {0: -1}
+    steps = []
+    for node, parent, _, detail in rows:
+        depths[node] = depths.get(parent, -1) + 1
+        steps.append('  ' * depths[node] + detail)
+    return steps
+
+
+def full_scans(plan):
+    """
+    The plan steps that read a whole table rather than using an index.
+
+    Args:
+        plan: From query_plan()
+
+    Returns:
+        list: The steps, e.g. ['SCAN chore_app_pointlog']
+    """
+    steps = (step.strip() for step in plan)
+    return [
+        step for step in steps
+        # Not an INSERT's VALUES list or a materialized subquery
+        if step.startswith('SCAN') and 'INDEX' not in step
+        and 'CONSTANT ROW' not in step and not step.startswith('SCAN (')
+    ]
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Database execute wrapper logging queries over SLOW_QUERY_MS."""
+    if _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    ms = (time.perf_counter() - started) * 1000
+    if ms >= settings.SLOW_QUERY_MS:
+        try:
+            plan = [] if many else query_plan(context['connection'], sql, params)
+            source = _source.get()
+            logger.warning(json.dumps({
+                'at': timezone.now().isoformat(),
+                'ms': round(ms, 1),
+                'source': source.label if source else '',
+                'caller': _caller(),
+                'database': context['connection'].alias,
+                'sql': sql,
+                'params': None if many else params,
+                'plan': plan,
+                'full_scans': full_scans(plan),
+            }, default=str))
+        except Exception as e:
+            # Never fail the query over its log entry
+            logger.error(f"Could not log slow query: {e}")
+    return result
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """connection_created receiver adding log_slow_queries to the connection."""
+    if not settings.SLOW_QUERY_LOG:
+        return
+    Path(settings.SLOW_QUERY_LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_queries)
+
+
+class SlowQueryMiddleware:
+    """
+    Attribute each request's slow queries to its view's URL name.
+
+    Not used with SLOW_QUERY_LOG off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _source.set(_Source(request.path))
+        try:
+            return self.get_response(request)
+        finally:
+            _source.reset(token)
+
+    async def __acall__(self, request):
+        token = _source.set(_Source(request.path))
+        try:
+            return await self.get_response(request)
+        finally:
+            _source.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The view's name is known once the URL is resolved
+        source = _source.get()
+        if source is not None and request.resolver_match:
+            source.label = f"view {request.resolver_match.url_name or request.resolver_match.view_name}"
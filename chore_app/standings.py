@@ -0,0 +1,168 @@
+"""
+Daily leaderboard standings.
+
+Each child's chore points for the day are kept in a DailyStanding row, updated
+in the same transaction as the PointLog insert that earns them. Reading the
+leaderboard is then an indexed lookup of at most one row per child instead of
+a GROUP BY over the day's point logs.
+
+A PointLog counts towards the leaderboard when it is linked to a chore
+(chore != ''), i.e. approvals and rejections. Days are in the active time
+zone, which is the household's during requests and nightly runs.
+"""
+
+import datetime
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.utils import timezone
+
+import chore_app.models as models
+from chore_app.tenancy import current_database
+
+logger = logging.getLogger(__name__)
+
+
+def standing_day(moment=None):
+    """
+    The leaderboard day a moment falls on, in the site's time zone.
+
+    Args:
+        moment: An aware datetime; defaults to now
+
+    Returns:
+        date: The local date
+    """
+    return timezone.localdate(moment)
+
+
+def day_bounds(day):
+    """
+    The start and end of a local day as aware datetimes.
+
+    Filtering date_recorded on this range can use its index, unlike
+    date_recorded__date, which casts every row.
+
+    Args:
+        day: The local date
+
+    Returns:
+        tuple: (start, end), end exclusive
+    """
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def record_points(user_id, points, day=None):
+    """
+    Add chore points to a child's standing for the day.
+
+    Call inside the transaction that creates the matching PointLog. A zero
+    change still creates the row, so the child appears on the leaderboard
+    just as the point log would have placed them.
+
+    Args:
+        user_id: The child's user id
+        points: Points earned (may be zero)
+        day: The leaderboard day; defaults to today
+    """
+    day = day or standing_day()
+    updated = models.DailyStanding.objects.filter(user_id=user_id, day=day).update(
+        total_points=F('total_points') + points)
+    if updated:
+        return
+    try:
+        with transaction.atomic(using=current_database()):
+            models.DailyStanding.objects.create(user_id=user_id, day=day, total_points=points)
+    except IntegrityError:
+        # Created concurrently; add to it instead
+        models.DailyStanding.objects.filter(user_id=user_id, day=day).update(
+            total_points=F('total_points') + points)
+
+
+def record_points_bulk(totals, day=None):
+    """
+    Add chore points to several children's standings for the day.
+
+    The bulk form of record_points(): one statement updates the existing
+    standings and one creates the missing ones.
+
+    Args:
+        totals: Dict of user id to points earned (may be zero)
+        day: The leaderboard day; defaults to today
+    """
+    if not totals:
+        return
+    day = day or standing_day()
+    existing = set(models.DailyStanding.objects.filter(
+        day=day, user_id__in=list(totals)
+    ).values_list('user_id', flat=True))
+    if existing:
+        models.DailyStanding.objects.filter(day=day, user_id__in=existing).update(
+            total_points=F('total_points') + Case(
+                *[When(user_id=user_id, then=Value(totals[user_id])) for user_id in existing],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+    missing = [user_id for user_id in totals if user_id not in existing]
+    try:
+        with transaction.atomic(using=current_database()):
+            models.DailyStanding.objects.bulk_create([
+                models.DailyStanding(user_id=user_id, day=day, total_points=totals[user_id])
+                for user_id in missing
+            ])
+    except IntegrityError:
+        # Some were created concurrently; fall back to one at a time
+        for user_id in missing:
+            record_points(user_id, totals[user_id], day)
+
+
+def get_leaderboard(household_id, day=None):
+    """
+    Get a household's leaderboard for a day, highest total first.
+
+    Args:
+        household_id: The household's pk
+        day: The leaderboard day; defaults to today
+
+    Returns:
+        QuerySet: Dicts with 'user', 'user__username' and 'total_points'
+    """
+    day = day or standing_day()
+    return models.DailyStanding.objects.filter(day=day, user__household_id=household_id).values(
+        'user', 'user__username', 'total_points'
+    ).order_by('-total_points', 'id')
+
+
+def rebuild_standings(household_id, day=None):
+    """
+    Recompute a household's standings for a day from the point logs.
+
+    Used to backfill the table, or to repair it after point logs were edited
+    outside the application.
+
+    Args:
+        household_id: The household's pk
+        day: The leaderboard day; defaults to today
+
+    Returns:
+        int: Number of standings written
+    """
+    day = day or standing_day()
+    start, end = day_bounds(day)
+    totals = models.PointLog.objects.filter(
+        household_id=household_id, date_recorded__gte=start, date_recorded__lt=end
+    ).exclude(
+        chore=''
+    ).values('user').annotate(total_points=Sum('points_change'))
+
+    with transaction.atomic(using=current_database()):
+        models.DailyStanding.objects.filter(day=day, user__household_id=household_id).delete()
+        models.DailyStanding.objects.bulk_create([
+            models.DailyStanding(user_id=row['user'], day=day, total_points=row['total_points'])
+            for row in totals
+        ])
+    logger.info(f"Rebuilt {len(totals)} daily standings for {day}")
+    return len(totals)
@@ -0,0 +1,305 @@
+// Offline-capable kiosk dashboard.
+//
+// Kiosk.start() registers the service worker that caches this page, then
+// keeps a copy of the child's board in localStorage and brings it up to
+// date with the API's "changes since version N" endpoint. While nothing
+// changes each sync is a few bytes.
+//
+// Claims go into a queue, also in localStorage, and are sent at the start
+// of every sync. While the server is unreachable they wait there and show
+// as queued, as they do while the server answers with an error or asks to
+// slow down; a claim the server turns down (taken meanwhile) is dropped
+// with a notice.
+var Kiosk = (function () {
+    var SYNC_INTERVAL_MS = 15000;
+    var RENDER_INTERVAL_MS = 60000;
+    var CSRF_COOKIE = 'csrftoken';
+
+    var options = null;
+    var state = null;
+    var syncing = false;
+    var notice = '';
+
+    function storageKey() {
+        return 'kiosk:' + options.userId;
+    }
+
+    function emptyState() {
+        return { v: 0, chores: {}, claims: {}, balance: null, queue: [] };
+    }
+
+    function load() {
+        try {
+            return JSON.parse(localStorage.getItem(storageKey())) || emptyState();
+        } catch (e) {
+            return emptyState();
+        }
+    }
+
+    function save() {
+        localStorage.setItem(storageKey(), JSON.stringify(state));
+    }
+
+    function csrfToken() {
+        var match = document.cookie.match(new RegExp('(?:^|; )' + CSRF_COOKIE + '=([^;]*)'));
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function post(url) {
+        return fetch(url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'X-CSRFToken': csrfToken() }
+        });
+    }
+
+    function objectUrl(template, id) {
+        return template.replace('/0/', '/' + id + '/');
+    }
+
+    function applyChanges(data) {
+        if (data.full) {
+            state.chores = {};
+            state.claims = {};
+        }
+        (data.chores || []).forEach(function (chore) {
+            state.chores[chore.id] = chore;
+        });
+        (data.removed_chores || []).forEach(function (id) {
+            delete state.chores[id];
+        });
+        (data.claims || []).forEach(function (claim) {
+            state.claims[claim.id] = claim;
+        });
+        (data.removed_claims || []).forEach(function (id) {
+            delete state.claims[id];
+        });
+        if (data.balance) {
+            state.balance = data.balance;
+        }
+        state.v = data.v;
+    }
+
+    function replayQueue() {
+        // Send queued claims in order; stop at the first network failure or
+        // server fault, keeping the claim for the next sync
+        if (!state.queue.length) {
+            return Promise.resolve();
+        }
+        var queued = state.queue[0];
+        return post(objectUrl(options.claimUrl, queued.choreId)).then(function (response) {
+            if (response.status === 401 || response.status === 403) {
+                throw new Error('signed out');
+            }
+            if (response.status >= 500 || response.status === 429) {
+                throw new Error('server error ' + response.status);
+            }
+            if (!response.ok) {
+                // Refused, e.g. already claimed: drop it and say why
+                return response.json().then(function (body) {
+                    notice = queued.name + ': ' + (body.error || 'could not be claimed');
+                }, function () {
+                    notice = queued.name + ': could not be claimed';
+                });
+            }
+        }).then(function () {
+            state.queue.shift();
+            save();
+            return replayQueue();
+        });
+    }
+
+    function sync() {
+        if (syncing) {
+            return;
+        }
+        syncing = true;
+        replayQueue().then(function () {
+            return fetch(options.changesUrl + '?since=' + state.v, { credentials: 'same-origin' });
+        }).then(function (response) {
+            if (response.status === 401 || response.status === 403 || response.redirected) {
+                throw new Error('signed out');
+            }
+            if (!response.ok) {
+                throw new Error('server error ' + response.status);
+            }
+            return response.json();
+        }).then(function (data) {
+            applyChanges(data);
+            save();
+            render(true);
+        }).catch(function (error) {
+            if (error.message === 'signed out') {
+                window.location.href = options.loginUrl + '?next=' + encodeURIComponent(window.location.pathname);
+                return;
+            }
+            // Unreachable: keep showing the last copy
+            render(false);
+        }).then(function () {
+            syncing = false;
+        });
+    }
+
+    function claim(chore) {
+        state.queue.push({ choreId: chore.id, name: chore.name });
+        save();
+        render(navigator.onLine);
+        sync();
+    }
+
+    function returnClaim(claimRow) {
+        post(objectUrl(options.returnUrl, claimRow.id)).then(function (response) {
+            if (!response.ok) {
+                notice = claimRow.chore_name + ' could not be returned';
+            }
+            sync();
+        }).catch(function () {
+            notice = 'Returning a chore needs a connection; try again soon';
+            render(false);
+        });
+    }
+
+    // Same rules as chore_app.board.chore_time_bucket
+    function timeBucket(availableTime, hour) {
+        if (availableTime === 0) {
+            return 'available';
+        }
+        if (availableTime > 0) {
+            return hour >= availableTime ? 'available' : 'future';
+        }
+        return hour > -availableTime ? 'missed' : 'available';
+    }
+
+    function choreBlock(title, description, right, className) {
+        var block = document.createElement('div');
+        block.className = 'innerBlock' + (className ? ' ' + className : '');
+        var container = document.createElement('div');
+        container.className = 'buttonContainer';
+        var left = document.createElement('div');
+        left.className = 'choreLeft';
+        left.textContent = title;
+        var small = document.createElement('div');
+        small.className = 'small-text description';
+        small.textContent = description;
+        left.appendChild(small);
+        var rightBlock = document.createElement('div');
+        rightBlock.className = className === undefined ? 'choreRight' : 'choreRightClaimed';
+        rightBlock.textContent = right;
+        container.appendChild(left);
+        container.appendChild(rightBlock);
+        block.appendChild(container);
+        return block;
+    }
+
+    function fill(id, blocks) {
+        var element = document.getElementById(id);
+        element.innerHTML = '';
+        blocks.forEach(function (block) {
+            element.appendChild(block);
+        });
+        return blocks.length;
+    }
+
+    function render(online) {
+        var hour = new Date().getHours();
+        var claims = Object.keys(state.claims).map(function (id) {
+            return state.claims[id];
+        }).filter(function (claimRow) {
+            return claimRow.user_id === options.userId;
+        });
+        var claimedNames = {};
+        claims.forEach(function (claimRow) {
+            claimedNames[claimRow.chore_name] = true;
+        });
+        state.queue.forEach(function (queued) {
+            claimedNames[queued.name] = true;
+        });
+
+        var buckets = { available: [], future: [], missed: [] };
+        Object.keys(state.chores).map(function (id) {
+            return state.chores[id];
+        }).sort(function (a, b) {
+            return a.id - b.id;
+        }).forEach(function (chore) {
+            if (claimedNames[chore.name]) {
+                return;
+            }
+            var bucket = timeBucket(chore.available_time, hour);
+            var block;
+            if (bucket === 'available') {
+                block = choreBlock(chore.name, chore.comment, chore.points);
+                block.onclick = function () {
+                    claim(chore);
+                };
+            } else if (bucket === 'future') {
+                block = choreBlock(chore.name, 'Available After ' + chore.available_time + ':00', chore.points);
+            } else {
+                block = choreBlock(chore.name, 'Was Available Before ' + (-chore.available_time) + ':00',
+                                   '-' + chore.points);
+            }
+            buckets[bucket].push(block);
+        });
+        fill('kiosk-available', buckets.available);
+        document.getElementById('kiosk-future-heading').style.display =
+            fill('kiosk-future', buckets.future) ? '' : 'none';
+        document.getElementById('kiosk-missed-heading').style.display =
+            fill('kiosk-missed', buckets.missed) ? '' : 'none';
+
+        var claimed = state.queue.map(function (queued) {
+            return choreBlock(queued.name, '', 'Queued, will be sent when back online', '');
+        });
+        claims.sort(function (a, b) {
+            return a.id - b.id;
+        }).forEach(function (claimRow) {
+            var approved = parseFloat(claimRow.approved);
+            var block;
+            if (approved > 0) {
+                block = choreBlock(claimRow.chore_name, claimRow.comment, 'Approved for ' + claimRow.approved, 'approved');
+            } else if (approved < 0) {
+                block = choreBlock(claimRow.chore_name, claimRow.comment, 'Penalty of ' + claimRow.points, 'penalised');
+            } else {
+                block = choreBlock(claimRow.chore_name, claimRow.comment, 'Pending Approval for ' + claimRow.points, '');
+                block.onclick = function () {
+                    returnClaim(claimRow);
+                };
+            }
+            claimed.push(block);
+        });
+        fill('kiosk-claimed', claimed);
+
+        if (state.balance) {
+            document.getElementById('kiosk-points').textContent = state.balance.points_balance;
+            document.getElementById('kiosk-money').textContent =
+                (parseFloat(state.balance.pocket_money) / 100).toFixed(2);
+            document.getElementById('kiosk-place-1').textContent = state.balance.place_1;
+            document.getElementById('kiosk-place-2').textContent = state.balance.place_2;
+            document.getElementById('kiosk-place-3').textContent = state.balance.place_3;
+        }
+
+        var status = online ? '' : 'Offline: showing the last update.';
+        if (state.queue.length) {
+            status += ' ' + state.queue.length + ' claim(s) waiting to be sent.';
+        }
+        document.getElementById('kiosk-status').textContent = (notice ? notice + ' ' : '') + status;
+        notice = '';
+    }
+
+    function start(config) {
+        options = config;
+        state = load();
+        render(navigator.onLine);
+
+        if ('serviceWorker' in navigator) {
+            navigator.serviceWorker.register(options.serviceWorkerUrl);
+        }
+        sync();
+        setInterval(sync, SYNC_INTERVAL_MS);
+        // Time-based chores move between buckets on the hour
+        setInterval(function () {
+            render(navigator.onLine);
+        }, RENDER_INTERVAL_MS);
+        window.addEventListener('online', sync);
+    }
+
+    return { start: start };
+})();
@@ -0,0 +1,126 @@
+// Live dashboard updates over Server-Sent Events.
+//
+// Each page calls LiveUpdates.start() with the events URL and a map of
+// event name -> ids of the blocks that event affects. When an event arrives
+// the page is fetched again in the background and only those blocks are
+// swapped in. If the server cannot stream (no ASGI server) the page falls
+// back to a full refresh every 60 seconds, like before.
+var LiveUpdates = (function () {
+    var FALLBACK_REFRESH_MS = 60000;
+    var DEBOUNCE_MS = 300;
+
+    var options = null;
+    var pendingBlocks = {};
+    var pendingTimer = null;
+    var fallbackTimer = null;
+
+    function allBlocks() {
+        var blocks = {};
+        Object.keys(options.blocks).forEach(function (eventName) {
+            options.blocks[eventName].forEach(function (id) {
+                blocks[id] = true;
+            });
+        });
+        return Object.keys(blocks);
+    }
+
+    function queueRefresh(ids) {
+        ids.forEach(function (id) {
+            pendingBlocks[id] = true;
+        });
+        if (pendingTimer === null) {
+            pendingTimer = setTimeout(refreshPending, DEBOUNCE_MS);
+        }
+    }
+
+    function refreshPending() {
+        var ids = Object.keys(pendingBlocks);
+        pendingBlocks = {};
+        pendingTimer = null;
+
+        fetch(window.location.href, { credentials: 'same-origin' })
+            .then(function (response) {
+                if (response.redirected || !response.ok) {
+                    // Logged out or an error page; let the browser handle it
+                    window.location.reload();
+                    return null;
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                if (html === null) {
+                    return;
+                }
+                var fresh = new DOMParser().parseFromString(html, 'text/html');
+                ids.forEach(function (id) {
+                    var current = document.getElementById(id);
+                    var replacement = fresh.getElementById(id);
+                    if (current && replacement) {
+                        current.innerHTML = replacement.innerHTML;
+                    }
+                });
+                if (options.onUpdate) {
+                    options.onUpdate(ids);
+                }
+            })
+            .catch(function () {
+                window.location.reload();
+            });
+    }
+
+    function startFallback() {
+        if (fallbackTimer === null) {
+            fallbackTimer = setInterval(function () {
+                window.location.reload();
+            }, FALLBACK_REFRESH_MS);
+        }
+    }
+
+    function scheduleHourlyRefresh() {
+        // Time-based chores move between buckets on the hour
+        var now = new Date();
+        var untilNextHour = (60 - now.getMinutes()) * 60000 - now.getSeconds() * 1000 + 1000;
+        setTimeout(function () {
+            queueRefresh(allBlocks());
+            scheduleHourlyRefresh();
+        }, untilNextHour);
+    }
+
+    function start(config) {
+        options = config;
+        if (!window.EventSource || !window.fetch || !window.DOMParser) {
+            startFallback();
+            return;
+        }
+
+        var source = new EventSource(options.url);
+        var connected = false;
+
+        source.onopen = function () {
+            if (connected) {
+                // Reconnected after a drop; we may have missed events
+                queueRefresh(allBlocks());
+            }
+            connected = true;
+        };
+        source.onerror = function () {
+            if (source.readyState === EventSource.CLOSED) {
+                // Server answered without a stream (e.g. 204 under WSGI)
+                startFallback();
+            }
+        };
+        Object.keys(options.blocks).forEach(function (eventName) {
+            source.addEventListener(eventName, function () {
+                queueRefresh(options.blocks[eventName]);
+            });
+        });
+        // Changed by another process; we don't know what, so refresh it all
+        source.addEventListener('data_changed', function () {
+            queueRefresh(allBlocks());
+        });
+
+        scheduleHourlyRefresh();
+    }
+
+    return { start: start };
+})();
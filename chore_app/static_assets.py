@@ -0,0 +1,195 @@
+"""
+Static files for production.
+
+collectstatic with CompressedManifestStaticFilesStorage writes every file
+under a content-hashed name (styles.3f2a9c1b.css) next to the original, plus
+gzip and, if the brotli package is installed, brotli copies of text files.
+StaticAssetMiddleware then serves STATIC_ROOT from the app itself: the
+smallest copy the browser accepts, with far-future cache headers on hashed
+names. A tablet fetches each asset once per release instead of revalidating
+it on every page load.
+
+Runserver with DEBUG on serves the app's static directories as before.
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import posixpath
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Files worth compressing
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml')
+
+# Cache lifetimes, in seconds
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+UNHASHED_MAX_AGE = 60
+
+# Accept-Encoding token to compressed file suffix, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes pre-compressed copies of text files.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        compressed = sum(self._compress(name) for name in sorted(names))
+        logger.info(f"Wrote {compressed} compressed static files")
+
+    def _compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return 0
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        written = 0
+        # mtime=0 keeps the output identical between runs
+        copies = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            copies.append(('.br', brotli.compress(content)))
+        for suffix, data in copies:
+            # Not worth a Content-Encoding header for a few saved bytes
+            if len(data) < len(content) * 0.95:
+                with open(path + suffix, 'wb') as f:
+                    f.write(data)
+                written += 1
+        return written
+
+
+class StaticAsset:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        stat = os.stat(path)
+        self.mtime = stat.st_mtime
+        self.variants = {
+            encoding: path + suffix
+            for encoding, suffix in ENCODINGS
+            if os.path.exists(path + suffix)
+        }
+
+    def choose(self, accept_encoding):
+        # Returns (path, encoding), encoding None for the uncompressed file
+        accepted = {token.split(';')[0].strip() for token in accept_encoding.split(',')}
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in self.variants:
+                return self.variants[encoding], encoding
+        return self.path, None
+
+
+def load_assets(static_root, static_url, hashed_names):
+    """
+    Index the collected static files by URL path.
+
+    Args:
+        static_root: The collectstatic directory
+        static_url: URL path prefix, e.g. '/static/'
+        hashed_names: Names under static_root that carry a content hash
+
+    Returns:
+        dict: URL path to StaticAsset
+    """
+    compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    assets = {}
+    for directory, _, files in os.walk(static_root):
+        for file_name in files:
+            if file_name.endswith(compressed_suffixes):
+                continue
+            path = os.path.join(directory, file_name)
+            name = os.path.relpath(path, static_root).replace(os.sep, '/')
+            assets[posixpath.join(static_url, name)] = StaticAsset(path, name in hashed_names)
+    return assets
+
+
+class StaticAssetMiddleware:
+    """
+    Serve collected static files, pre-compressed, with long cache lifetimes.
+
+    Goes near the top of MIDDLEWARE, so static requests skip sessions,
+    authentication and the household lookup. Not used with DEBUG on, or
+    before collectstatic has run.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        static_url = '/' + settings.STATIC_URL.lstrip('/')
+        self.assets = load_assets(settings.STATIC_ROOT, static_url, hashed_names)
+        if not self.assets:
+            logger.warning(f"No static files in {settings.STATIC_ROOT}; run manage.py collectstatic")
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def serve(self, request):
+        """
+        Args:
+            request: HTTP request object
+
+        Returns:
+            The file response, or None if the request is not for a static file
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        asset = self.assets.get(request.path_info)
+        if asset is None:
+            return None
+
+        if asset.immutable:
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            cache_control = f'public, max-age={UNHASHED_MAX_AGE}'
+            if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), asset.mtime):
+                response = HttpResponseNotModified()
+                response['Cache-Control'] = cache_control
+                return response
+
+        path, encoding = asset.choose(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = FileResponse(open(path, 'rb'), content_type=asset.content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if asset.variants:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = cache_control
+        response['Last-Modified'] = http_date(asset.mtime)
+        return response
@@ -0,0 +1,230 @@
+"""
+Delta sync for kiosk tablets.
+
+Users, chores and claims carry a sync_version: the household data version
+of their last change. Deleting one leaves a SyncTombstone with the version
+of the delete. A kiosk keeps the version it last synced to and asks for
+what changed since; the answer is an index range scan on
+(household, sync_version) per table, and just the version lookup when
+nothing changed.
+
+The version is bumped and the rows stamped in one transaction, and SQLite
+runs one writer at a time, so a stamp is never visible before its version:
+a kiosk that has seen version N has seen every row stamped N or lower.
+"""
+
+import datetime
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+import chore_app.models as models
+from chore_app.board import eligible_chores
+from chore_app.tenancy import current_database
+from chore_app.versioning import bump_data_version, get_data_version, household_key
+
+logger = logging.getLogger(__name__)
+
+# Versions at or below this have had their tombstones pruned; kiosks
+# further behind must start over
+SYNC_HORIZON_KEY = 'sync_horizon'
+
+# Tombstone model names
+CHORE = 'chore'
+CLAIM = 'claim'
+USER = 'user'
+
+# Rows per statement in delete_synced(), under SQLite's variable limit
+DELETE_BATCH_SIZE = 500
+
+TOMBSTONE_MODELS = {
+    models.Chore: CHORE,
+    models.ChoreClaim: CLAIM,
+    models.User: USER,
+}
+
+
+def next_sync_version(household_id):
+    """
+    Bump a household's data version and return it.
+
+    Call inside the transaction that stamps rows with the version.
+
+    Args:
+        household_id: The household's pk
+
+    Returns:
+        int: The new version
+    """
+    key = household_key(household_id)
+    bump_data_version(key)
+    return get_data_version(key)[0]
+
+
+def stamp_changes(household_id, *querysets):
+    """
+    Record that rows changed, bumping the household's data version.
+
+    Saves are stamped by signal receivers; call this after writes that send
+    no signals, such as update() and bulk_update(), in place of
+    bump_data_version().
+
+    Args:
+        household_id: The household's pk
+        *querysets: The changed rows, of synced models
+
+    Returns:
+        int: The version the rows were stamped with
+    """
+    with transaction.atomic(using=current_database()):
+        version = next_sync_version(household_id)
+        for queryset in querysets:
+            queryset.update(sync_version=version)
+    return version
+
+
+def record_deletion(household_id, model, object_id):
+    """
+    Leave a tombstone for a deleted synced row, bumping the data version.
+
+    Args:
+        household_id: The household's pk
+        model: CHORE, CLAIM or USER
+        object_id: The deleted row's pk
+    """
+    with transaction.atomic(using=current_database()):
+        version = next_sync_version(household_id)
+        models.SyncTombstone.objects.create(
+            household_id=household_id, model=model, object_id=object_id, sync_version=version)
+
+
+def delete_synced(household_id, queryset):
+    """
+    Delete synced rows, leaving their tombstones under one version bump.
+
+    Queryset deletes of a model with delete receivers fetch every row and
+    leave each tombstone on its own; this takes one version, inserts the
+    tombstones in bulk and deletes the rows without per-row signals. Only for
+    models nothing else points at, as there is no cascade.
+
+    Args:
+        household_id: The household's pk
+        queryset: The rows to delete, of a synced model
+
+    Returns:
+        int: Number of rows deleted
+    """
+    model = queryset.model
+    if any(relation.auto_created and not relation.concrete
+           for relation in model._meta.get_fields(include_hidden=True) if relation.is_relation):
+        raise ValueError(f"{model.__name__} rows are referenced by other rows; delete them one by one")
+    using = current_database()
+    with transaction.atomic(using=using):
+        pks = list(queryset.values_list('pk', flat=True))
+        if not pks:
+            return 0
+        version = next_sync_version(household_id)
+        models.SyncTombstone.objects.bulk_create([
+            models.SyncTombstone(household_id=household_id, model=TOMBSTONE_MODELS[model],
+                                 object_id=pk, sync_version=version)
+            for pk in pks
+        ], batch_size=DELETE_BATCH_SIZE)
+        deleted = 0
+        for start in range(0, len(pks), DELETE_BATCH_SIZE):
+            deleted += model._base_manager.using(using).filter(
+                pk__in=pks[start:start + DELETE_BATCH_SIZE])._raw_delete(using)
+    return deleted
+
+
+def prune_tombstones(household_id, days):
+    """
+    Delete a household's tombstones older than a number of days.
+
+    Kiosks that last synced before the newest pruned tombstone get a full
+    sync next time.
+
+    Args:
+        household_id: The household's pk
+        days: Tombstones to keep, in days
+
+    Returns:
+        int: Number of tombstones deleted
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    old = models.SyncTombstone.objects.filter(household_id=household_id, deleted_at__lt=cutoff)
+    with transaction.atomic(using=current_database()):
+        horizon = max(old.values_list('sync_version', flat=True), default=None)
+        if horizon is None:
+            return 0
+        models.DataVersion.objects.update_or_create(
+            key=household_key(household_id, SYNC_HORIZON_KEY),
+            defaults={'version': horizon, 'updated_at': timezone.now()})
+        deleted, _ = old.delete()
+    logger.info(f"Pruned {deleted} sync tombstones up to version {horizon}")
+    return deleted
+
+
+def changes_since(child, since, chore_fields, claim_fields, balance_fields):
+    """
+    What changed on a child's board since a data version.
+
+    Chores come back when they changed and are on the child's board; chores
+    that changed and left the board, or were deleted, are listed by id.
+    Time-of-day bucketing and hiding chores the child has claimed are left
+    to the kiosk.
+
+    Args:
+        child: The child user
+        since: The version the kiosk last synced to; 0 for everything
+        chore_fields: Chore fields to send; must include id
+        claim_fields: ChoreClaim fields to send
+        balance_fields: The child's User fields to send
+
+    Returns:
+        dict: 'v', the current version, and unless nothing changed:
+            'full' (the kiosk must drop what it has), 'chores',
+            'removed_chores', 'claims', 'removed_claims' and 'balance'
+            (None if unchanged)
+    """
+    household_id = child.household_id
+    # Read the version first: every row stamped up to it is already visible
+    version = get_data_version(household_key(household_id))[0]
+    if since == version:
+        return {'v': version}
+
+    horizon = get_data_version(household_key(household_id, SYNC_HORIZON_KEY))[0]
+    full = since <= 0 or since > version or since < horizon
+    if full:
+        since = -1
+
+    chores = list(eligible_chores(child).filter(sync_version__gt=since).values(*chore_fields))
+    board_ids = {chore['id'] for chore in chores}
+    removed_chores = [] if full else [
+        pk for pk in models.Chore.objects.filter(
+            household_id=household_id, sync_version__gt=since
+        ).values_list('id', flat=True)
+        if pk not in board_ids
+    ]
+    claims = list(models.ChoreClaim.objects.filter(
+        household_id=household_id, user=child, sync_version__gt=since
+    ).values(*claim_fields))
+    removed_claims = []
+    if not full:
+        for model, object_id in models.SyncTombstone.objects.filter(
+                household_id=household_id, sync_version__gt=since).values_list('model', 'object_id'):
+            if model == CHORE:
+                removed_chores.append(object_id)
+            elif model == CLAIM:
+                removed_claims.append(object_id)
+    balance = models.User.objects.filter(pk=child.pk, sync_version__gt=since).values(*balance_fields).first()
+
+    return {
+        'v': version,
+        'full': full,
+        'chores': chores,
+        'removed_chores': removed_chores,
+        'claims': claims,
+        'removed_claims': removed_claims,
+        'balance': balance,
+    }
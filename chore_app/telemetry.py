@@ -0,0 +1,207 @@
+"""
+Telemetry of nightly runs, saved in RunLog.
+
+run_nightly_job() runs nightly_action and saves the attempt as a RunLog row,
+with a RunLogPhase row per phase: when it started, how long it took, the rows
+it wrote and the sum of the point changes it logged. The run keeps the number
+of claims auto-approved, the points taken as penalties and given as bonuses,
+and, if it failed, the error. The parents' run history page shows them.
+
+Phases report their work with record() as they go; it counts once the
+phase's transaction commits, so work that is rolled back and retried is
+counted once. Worker processes of a parallel run collect their own and hand it
+back with their results. In a parallel run both per-child phases run while the
+first is timed, so the second has work but no time of its own.
+"""
+
+import contextlib
+import logging
+import time
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+import chore_app.models as models
+from chore_app.metrics import record_nightly_run
+from chore_app.tenancy import current_database
+
+logger = logging.getLogger(__name__)
+
+# Runs shown on the run history page
+RUN_HISTORY_LENGTH = 30
+
+_current_run = ContextVar('nightly_telemetry', default=None)
+
+
+class RunTelemetry:
+    """Time and work of each phase of one nightly run."""
+
+    def __init__(self):
+        # Phase name to dict of started_at, seconds, rows and points, in run order
+        self.phases = {}
+        self.current_phase = None
+
+    def _phase(self, phase):
+        return self.phases.setdefault(phase, {'started_at': None, 'seconds': 0.0, 'rows': 0, 'points': Decimal(0)})
+
+    @contextlib.contextmanager
+    def observe(self, phase):
+        """Time a phase; an observe_phase hook for nightly_action."""
+        row = self._phase(phase)
+        if row['started_at'] is None:
+            row['started_at'] = timezone.now()
+        self.current_phase = phase
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            row['seconds'] += time.perf_counter() - started
+            self.current_phase = None
+
+    def add(self, phase, rows=0, points=0):
+        row = self._phase(phase)
+        row['rows'] += rows
+        row['points'] += Decimal(points)
+
+    def work(self):
+        """
+        Returns:
+            dict: Phase name to (rows, points), for merge()
+        """
+        return {phase: (row['rows'], row['points']) for phase, row in self.phases.items()}
+
+    def merge(self, work):
+        """Add work done elsewhere, e.g. by a worker process."""
+        for phase, (rows, points) in work.items():
+            self.add(phase, rows, points)
+
+
+@contextlib.contextmanager
+def collecting():
+    """
+    Collect the work recorded in this context.
+
+    Yields:
+        RunTelemetry: The run's telemetry
+    """
+    run = RunTelemetry()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def record(rows=0, points=0):
+    """
+    Add to the current phase's work once the current transaction commits.
+
+    Does nothing outside a run that collects telemetry.
+
+    Args:
+        rows: Rows written
+        points: Sum of the point changes logged
+    """
+    run = _current_run.get()
+    if run is None or run.current_phase is None:
+        return
+    phase = run.current_phase
+    transaction.on_commit(lambda: run.add(phase, rows, points), using=current_database())
+
+
+def current_run():
+    """The telemetry being collected, or None."""
+    return _current_run.get()
+
+
+def save_run(household_id, job_code, run, started_at, error=None):
+    """
+    Save a run's telemetry as a RunLog with its phases.
+
+    Args:
+        household_id: The household's pk
+        job_code: The job's code
+        run: The RunTelemetry
+        started_at: When the run started
+        error: The exception it failed with, or None
+
+    Returns:
+        RunLog: The saved run
+    """
+    from chore_app.nightly import APPLY_DAILY_BONUS, AUTO_APPROVE, INCOMPLETE_CHORE_PENALTY  # Import here to avoid circular imports
+
+    phases = run.phases
+    with transaction.atomic(using=current_database()):
+        log = models.RunLog.objects.create(
+            household_id=household_id,
+            job_code=job_code,
+            run_date=timezone.localdate(),
+            started_at=started_at,
+            finished_at=timezone.now(),
+            succeeded=error is None,
+            error=f"{type(error).__name__}: {error}" if error else '',
+            auto_approved=phases.get(AUTO_APPROVE, {}).get('rows', 0),
+            penalty_total=-phases.get(INCOMPLETE_CHORE_PENALTY, {}).get('points', Decimal(0)),
+            bonus_total=phases.get(APPLY_DAILY_BONUS, {}).get('points', Decimal(0)),
+        )
+        models.RunLogPhase.objects.bulk_create([
+            models.RunLogPhase(run=log, phase=phase, started_at=row['started_at'], seconds=row['seconds'],
+                               rows=row['rows'], points=row['points'])
+            for phase, row in phases.items()
+        ])
+    return log
+
+
+def run_nightly_job(household_id, approver, job_code, workers=None):
+    """
+    Run the nightly job for a household, saving its telemetry and metrics.
+
+    Call with the household's database and time zone active.
+
+    Args:
+        household_id: The household's pk
+        approver: The user performing the action (for logging)
+        job_code: The job's code, as checked by has_run_today()
+        workers: Worker processes for the per-child phases (see nightly_action)
+
+    Returns:
+        RunLog: The saved run
+
+    Raises:
+        Whatever nightly_action raised, after saving the failed run
+    """
+    from chore_app.utils import nightly_action  # Import here to avoid circular imports
+
+    started_at = timezone.now()
+    started = time.monotonic()
+    with collecting() as run:
+        try:
+            nightly_action(household_id, approver=approver, workers=workers, observe_phase=run.observe)
+        except Exception as e:
+            record_nightly_run(household_id, time.monotonic() - started, succeeded=False)
+            save_run(household_id, job_code, run, started_at, error=e)
+            raise
+    record_nightly_run(household_id, time.monotonic() - started, succeeded=True)
+    log = save_run(household_id, job_code, run, started_at)
+    logger.info(f"Nightly run for household {household_id} took {log.duration:.1f}s")
+    return log
+
+
+def run_history(household_id, job_code, limit=RUN_HISTORY_LENGTH):
+    """
+    A household's latest runs of a job, with their phases.
+
+    Args:
+        household_id: The household's pk
+        job_code: The job's code
+        limit: Number of runs
+
+    Returns:
+        list: RunLog rows, newest first
+    """
+    return list(
+        models.RunLog.objects.filter(household_id=household_id, job_code=job_code)
+        .order_by('-started_at', '-pk').prefetch_related('phases')[:limit]
+    )
@@ -0,0 +1,65 @@
+{% load static %}// Kiosk service worker: serves the app shell when the server is unreachable.
+//
+// The shell page is fetched from the network first and cached, so it stays
+// current while online; its static assets are served from the cache. API
+// requests are never cached here: the kiosk script keeps its own copy of
+// the board and queues claims while offline.
+var CACHE_NAME = 'kiosk-v2';
+var SHELL_URL = '{% url 'kiosk' %}';
+var ASSETS = ['{% static 'styles.css' %}', '{% static 'kiosk.js' %}'];
+
+self.addEventListener('install', function (event) {
+    event.waitUntil(
+        caches.open(CACHE_NAME).then(function (cache) {
+            return cache.addAll([SHELL_URL].concat(ASSETS));
+        }).then(function () {
+            return self.skipWaiting();
+        })
+    );
+});
+
+self.addEventListener('activate', function (event) {
+    event.waitUntil(
+        caches.keys().then(function (names) {
+            return Promise.all(names.filter(function (name) {
+                return name !== CACHE_NAME;
+            }).map(function (name) {
+                return caches.delete(name);
+            }));
+        }).then(function () {
+            return self.clients.claim();
+        })
+    );
+});
+
+self.addEventListener('fetch', function (event) {
+    var url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (url.pathname === SHELL_URL) {
+        event.respondWith(
+            fetch(event.request).then(function (response) {
+                if (response.ok && !response.redirected) {
+                    var copy = response.clone();
+                    caches.open(CACHE_NAME).then(function (cache) {
+                        cache.put(SHELL_URL, copy);
+                    });
+                }
+                return response;
+            }).catch(function () {
+                return caches.match(SHELL_URL);
+            })
+        );
+        return;
+    }
+
+    if (ASSETS.indexOf(url.pathname) !== -1) {
+        event.respondWith(
+            caches.match(event.request).then(function (cached) {
+                return cached || fetch(event.request);
+            })
+        );
+    }
+});
@@ -0,0 +1,36 @@
+from django import template
+
+from chore_app.fragment_cache import get_or_render
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return get_or_render(name, vary_on, lambda: self.nodelist.render(context))
+
+
+@register.tag(name='fragment_cache')
+def fragment_cache(parser, token):
+    """
+    Cache a block of template output, counting hits and misses.
+
+    Usage: {% fragment_cache "name" var1 var2 %} ... {% endfragment_cache %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least a fragment name.")
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
@@ -0,0 +1,271 @@
+"""
+Multi-household tenancy.
+
+Every family is a Household. In the default setup all households share one
+database and every query is filtered by household. A household can instead be
+given its own SQLite file (Household.database names the alias, see
+HOUSEHOLD_DATABASE_DIR in settings), so its writes, nightly run and history
+scans never contend with another family's for SQLite's single writer lock.
+
+The household registry (name, time zone, domain, database) is always read from
+the default database and kept in a process-wide cache. HouseholdMiddleware
+picks the household's database from the request's host name, then activates
+the signed-in user's household time zone for the rest of the request.
+HouseholdRouter sends chore_app queries to the database picked for the
+current context.
+"""
+
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+import zoneinfo
+from typing import NamedTuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# How often to reload the household registry
+REGISTRY_RECHECK_SECONDS = 60
+
+# Database alias for the current request or nightly run; None for the default
+_current_database = contextvars.ContextVar('household_database', default=None)
+
+
+class HouseholdInfo(NamedTuple):
+    pk: int
+    name: str
+    timezone: str
+    domain: str
+    database: str
+
+    @property
+    def tzinfo(self):
+        return zoneinfo.ZoneInfo(self.timezone)
+
+    @property
+    def database_alias(self):
+        return self.database or DEFAULT_DB_ALIAS
+
+
+class HouseholdRegistry:
+    """
+    Process-wide cache of every household, by pk and by domain.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_pk = None
+        self._loaded_at = 0.0
+
+    def _households(self):
+        now = time.monotonic()
+        by_pk = self._by_pk
+        if by_pk is not None and now - self._loaded_at < REGISTRY_RECHECK_SECONDS:
+            return by_pk
+        with self._lock:
+            if self._by_pk is None or now - self._loaded_at >= REGISTRY_RECHECK_SECONDS:
+                from chore_app.models import Household  # Import here to avoid circular imports
+                self._by_pk = {
+                    row[0]: HouseholdInfo(*row)
+                    for row in Household.objects.using(DEFAULT_DB_ALIAS).values_list(
+                        'pk', 'name', 'timezone', 'domain', 'database')
+                }
+                self._loaded_at = now
+            return self._by_pk
+
+    def get(self, pk):
+        """
+        Args:
+            pk: The household's pk
+
+        Returns:
+            HouseholdInfo: The household, or None if there is no such household
+        """
+        info = self._households().get(pk)
+        if info is None:
+            # Possibly created since the last load
+            self.invalidate()
+            info = self._households().get(pk)
+        return info
+
+    def for_domain(self, domain):
+        """
+        Args:
+            domain: A request's host name, without the port
+
+        Returns:
+            HouseholdInfo: The household served on the domain, or None
+        """
+        for info in self._households().values():
+            if info.domain and info.domain == domain:
+                return info
+        return None
+
+    def all(self):
+        return sorted(self._households().values(), key=lambda info: info.pk)
+
+    def invalidate(self):
+        with self._lock:
+            self._by_pk = None
+
+
+registry = HouseholdRegistry()
+
+
+def current_database():
+    """The database alias chore_app queries go to in this context."""
+    return _current_database.get() or DEFAULT_DB_ALIAS
+
+
+@contextlib.contextmanager
+def use_household(household):
+    """
+    Route queries to a household's database and use its time zone.
+
+    Args:
+        household: A HouseholdInfo or Household
+    """
+    token = _current_database.set(household.database or None)
+    try:
+        with timezone.override(zoneinfo.ZoneInfo(household.timezone)):
+            yield
+    finally:
+        _current_database.reset(token)
+
+
+def household_models():
+    """The chore_app models with a household foreign key."""
+    from django.apps import apps  # Import here, as this module loads before the app registry
+    return [
+        model for model in apps.get_app_config('chore_app').get_models()
+        if any(field.name == 'household' and field.is_relation for field in model._meta.fields)
+    ]
+
+
+def missing_household_columns(using=DEFAULT_DB_ALIAS):
+    """
+    Tables of an install from before households, which have no household column yet.
+
+    Args:
+        using: Database alias
+
+    Returns:
+        list: Table names; empty for a fresh or upgraded install
+    """
+    from django.db import connections
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        return [
+            model._meta.db_table for model in household_models()
+            if model._meta.db_table in tables and 'household_id' not in {
+                column.name for column in connection.introspection.get_table_description(cursor, model._meta.db_table)
+            }
+        ]
+
+
+def backfill_households(using=DEFAULT_DB_ALIAS):
+    """
+    Give every row without a household the default one.
+
+    Args:
+        using: Database alias
+
+    Returns:
+        int: Rows updated
+    """
+    from django.db import transaction
+    from chore_app.models import DEFAULT_HOUSEHOLD_NAME, Household  # Import here to avoid circular imports
+    with transaction.atomic(using=using):
+        household, _ = Household.objects.using(using).get_or_create(name=DEFAULT_HOUSEHOLD_NAME)
+        updated = sum(
+            model._base_manager.using(using).filter(household__isnull=True).update(household=household)
+            for model in household_models()
+        )
+    registry.invalidate()
+    return updated
+
+
+class HouseholdRouter:
+    """
+    Sends chore_app models, including users, to the current household's
+    database. Everything else (sessions, cron logs) stays in the default one.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'chore_app':
+            return _current_database.get()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every household database holds the full schema
+        return None
+
+
+class HouseholdMiddleware:
+    """
+    Select the household for a request.
+
+    Must come after AuthenticationMiddleware: the database is chosen from the
+    host name before the lazy request.user is first loaded from it. Runs
+    natively under ASGI, so async views get a loaded request.user without a
+    thread hop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _activate(self, request, household, host_household):
+        request.household = household or host_household
+        if request.household:
+            timezone.activate(request.household.tzinfo)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        host_household = registry.for_domain(request.get_host().split(':')[0])
+        token = _current_database.set(host_household.database or None if host_household else None)
+        try:
+            household = None
+            if request.user.is_authenticated:
+                household = registry.get(request.user.household_id)
+            self._activate(request, household, host_household)
+            try:
+                return self.get_response(request)
+            finally:
+                timezone.deactivate()
+        finally:
+            _current_database.reset(token)
+
+    async def __acall__(self, request):
+        # The registry may reload from the database
+        host_household = await sync_to_async(registry.for_domain)(request.get_host().split(':')[0])
+        token = _current_database.set(host_household.database or None if host_household else None)
+        try:
+            household = None
+            user = await request.auser()
+            # Sync code, the condition callbacks and templates read request.user
+            request.user = user
+            if user.is_authenticated:
+                household = await sync_to_async(registry.get)(user.household_id)
+            self._activate(request, household, host_household)
+            try:
+                return await self.get_response(request)
+            finally:
+                timezone.deactivate()
+        finally:
+            _current_database.reset(token)
@@ -0,0 +1,17 @@
+from django.test import TestCase
+
+from chore_app.query_budget import check_budgets, format_sql
+
+
+class QueryBudgetTests(TestCase):
+    def test_every_view_and_nightly_phase_within_budget(self):
+        results, missing = check_budgets()
+
+        self.assertEqual(missing, [], "Views with no budget in chore_app/query_budget.py")
+        failed = [result for result in results if not result.ok]
+        self.assertEqual([result.name for result in failed], [], '\n'.join(
+            f"{result.name}: {result.queries}/{result.max_queries} queries, {result.ms}/{result.max_ms:.0f} ms, "
+            f"status {result.status} (expected {result.expected_status}), "
+            f"redirect {result.redirect} (expected {result.expected_redirect})\n{format_sql(result)}"
+            for result in failed
+        ))
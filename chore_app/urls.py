@@ -32,6 +32,10 @@ urlpatterns = [
     path('parent_profile/', views.parent_profile, name='parent_profile'),
     path('child_profile/', views.child_profile, name='child_profile'),
     path('child_chore/', views.child_chore, name='child_chore'),
+    path('events/', views.live_events, name='live_events'),
+    path('kiosk/', views.kiosk, name='kiosk'),
+    path('kiosk/sw.js', views.kiosk_service_worker, name='kiosk_service_worker'),
+    path('metrics', views.metrics, name='metrics'),
 
     path('create_chore/', views.create_chore, name='create_chore'),
     path('edit_chore/<int:pk>/', views.edit_chore, name='edit_chore'),
@@ -44,6 +48,8 @@ urlpatterns = [
     path('return_chore/<int:pk>/', views.return_chore, name='return_chore'),
     path('approve_chore_claim/<int:pk>/<int:penalty>/',
          views.approve_chore_claim, name='approve_chore_claim'),
+    path('approve_selected_claims/',
+         views.approve_selected_claims, name='approve_selected_claims'),
     path('reject_chore_claim/<int:pk>/',
          views.reject_chore_claim, name='reject_chore_claim'),
 
@@ -54,10 +60,14 @@ urlpatterns = [
     path('convert_points_to_money/<int:pk>/',
          views.convert_points_to_money, name='convert_points_to_money'),
     path('daily_action/', views.daily_action, name='daily_action'),
+    path('run_history/', views.run_history, name='run_history'),
+    path('export_point_log/', views.export_point_log, name='export_point_log'),
 
     path('settings/', views.settings, name='settings'),
     path('edit_settings/<int:pk>/', views.edit_settings, name='edit_settings'),
     path('messages/', views.messages, name='messages'),
     path('edit_text/<int:pk>/', views.edit_text, name='edit_text'),
 
+    path('api/v1/', include('chore_app.api_urls')),
+
 ]
@@ -2,10 +2,13 @@
 Utility functions for the chore application.
 """
 
+import contextlib
 import logging
 from django.http import Http404
 from django.shortcuts import redirect
-from datetime import datetime
+from django.utils import timezone
+
+from chore_app.slow_queries import query_source
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +36,7 @@ def validate_pk(pk):
         raise Http404("Invalid ID provided")
 
 
-def safe_get_object_or_404(model_class, pk, error_message="Object not found"):
+def safe_get_object_or_404(model_class, pk, error_message="Object not found", **filters):
     """
     Safely get an object by pk with proper error handling.
 
@@ -41,6 +44,7 @@ def safe_get_object_or_404(model_class, pk, error_message="Object not found"):
         model_class: The model class to query
         pk: The primary key to look up
         error_message: Custom error message for logging
+        **filters: Further lookups the object must match, e.g. household_id
 
     Returns:
         The model instance
@@ -50,33 +54,45 @@ def safe_get_object_or_404(model_class, pk, error_message="Object not found"):
     """
     try:
         validated_pk = validate_pk(pk)
-        return model_class.objects.get(pk=validated_pk)
+        return model_class.objects.get(pk=validated_pk, **filters)
     except model_class.DoesNotExist:
         logger.warning(f"{error_message}: {model_class.__name__} with pk={pk} not found")
         raise Http404(f"{error_message}")
 
 
-def has_run_today(job_code):
+def has_run_today(job_code, household_id, use_cache=True):
     """
-    Check if a job has already run today.
+    Check if a job has already run today for a household.
+
+    "Today" is in the active time zone, which is the household's during
+    requests and nightly runs.
 
     Args:
         job_code: The job code to check
+        household_id: The household's pk
+        use_cache: Read the run state from the process-wide config cache.
+            Pass False before actually running the job, since another
+            process may have run it within the last few seconds.
 
     Returns:
         bool: True if the job has run today, False otherwise
     """
+    current_date = timezone.localdate()
+    if use_cache:
+        from chore_app.config import get_config  # Import here to avoid circular imports
+        return get_config(household_id).last_run(job_code) == current_date
+
     from chore_app.models import RunLog  # Import here to avoid circular imports
-    last_run = RunLog.objects.filter(job_code=job_code).order_by('-run_date').first()
+    last_run = RunLog.objects.filter(
+        household_id=household_id, job_code=job_code, succeeded=True).order_by('-run_date').first()
     if not last_run:
         return False
-    current_date = datetime.now().date()
     return last_run.run_date == current_date
 
 
-def nightly_action(approver=None):
+def nightly_action(household_id, approver=None, workers=None, observe_phase=None):
     """
-    Perform the nightly maintenance actions for the chore app.
+    Perform the nightly maintenance actions for one household.
 
     This includes:
     - Auto-approving pending chores
@@ -85,19 +101,39 @@ def nightly_action(approver=None):
     - Calculating leaderboard rewards
     - Resetting daily chores
 
+    Penalties, bonuses and leaderboard rewards are applied to many children
+    at once by chore_app.nightly.NightlyBatch. Every phase is recorded in the
+    run journal as it commits; if a run fails part way, calling this again
+    resumes it and skips the work already done. Runs left unfinished on
+    earlier days are completed first.
+
+    With more than one worker the per-child phases (penalties and bonuses)
+    run on a pool of worker processes; leaderboard scoring and the reset
+    then run once all children are done.
+
+    Call with the household's database and time zone active (see
+    chore_app.tenancy.use_household); requests get both from the middleware.
+
     Args:
+        household_id: The household's pk
         approver: The user performing the action (for logging)
+        workers: Worker processes for the per-child phases; defaults to
+            settings.NIGHTLY_WORKERS, and 1 runs everything in this process
+        observe_phase: Optional callable taking a phase name and returning a
+            context manager entered around the phase, e.g. to time it
     """
+    from django.conf import settings as django_settings
     from chore_app.models import User, Settings  # Import here to avoid circular imports
-    from .cron import (  # Import functions from cron module
-        auto_approve, incomplete_chore_penalty, apply_daily_bonus,
-        apply_leaderboard_scoring, reset_daily_chores
-    )
+    from chore_app.nightly import NightlyJournal
+
+    if workers is None:
+        workers = django_settings.NIGHTLY_WORKERS
 
     try:
-        children = User.objects.filter(role='Child')
+        children = User.objects.filter(household_id=household_id, role='Child')
         settings = {
-            setting['key']: setting['value'] for setting in Settings.objects.values('key', 'value')}
+            setting['key']: setting['value']
+            for setting in Settings.objects.filter(household_id=household_id).values('key', 'value')}
 
         # Log initial balances
         for child in children:
@@ -107,33 +143,75 @@ def nightly_action(approver=None):
         logging.error(e)
         raise
 
-    auto_approve(approver, settings)
-
-    # Process each child's incomplete chores penalties and bonuses
-    for child in children:
+    for journal in NightlyJournal.unfinished(household_id) + [NightlyJournal.for_date(household_id)]:
         try:
-            incomplete_chore_penalty(approver=approver, child=child, settings=settings)
-            apply_daily_bonus(approver=approver, child=child, settings=settings)
+            _run_nightly_phases(journal, approver, settings, children, workers, observe_phase)
         except Exception as e:
-            logging.error(e)
+            logging.error(f"Nightly run for {journal.day} stopped: {e}")
             raise
 
-    try:
-        apply_leaderboard_scoring(
-            approver=approver, children=children, settings=settings)
-    except Exception as e:
-        logging.error(e)
-        raise
-
-    # Reset all chores
-    try:
-        reset_daily_chores()
-    except Exception as e:
-        logging.error(e)
-        raise
-
     # Log final balances
-    children_final = User.objects.filter(role='Child')
+    children_final = User.objects.filter(household_id=household_id, role='Child')
     for child in children_final:
         logging.info(f"Final balance for {child.username}: points={child.points_balance}, pocket_money={child.pocket_money}")
 
+
+def _run_nightly_phases(journal, approver, settings, children, workers=1, observe_phase=None):
+    """
+    Run the phases of one nightly run that its journal has not recorded.
+
+    Args:
+        journal: The run's NightlyJournal
+        approver: The user performing the action (for logging)
+        settings: Dict of setting key to value
+        children: Queryset of all children
+        workers: Worker processes for the per-child phases
+        observe_phase: Optional callable returning a context manager for a phase
+    """
+    from django.db import transaction
+    from chore_app.tenancy import current_database
+    from chore_app import nightly
+    from chore_app.constants import NIGHTLY_CHILD_BATCH_SIZE
+    from .cron import (  # Import functions from cron module
+        auto_approve, apply_leaderboard_scoring, reset_daily_chores
+    )
+
+    if journal.finished:
+        logging.info(f"Nightly run for {journal.day} has already finished")
+        return
+
+    per_child = nightly.per_child_phase_functions()
+
+    for phase in nightly.PHASES:
+        if journal.is_done(phase):
+            logging.info(f"Nightly {phase} for {journal.day} already done; skipping")
+            continue
+
+        with observe_phase(phase) if observe_phase else contextlib.nullcontext(), query_source(f'nightly {phase}'):
+            if phase in per_child:
+                if workers > 1:
+                    # Every per-child phase at once, then a barrier before the
+                    # phases that need all children finished
+                    nightly.run_per_child_phases_parallel(journal, approver, settings, children,
+                                                          NIGHTLY_CHILD_BATCH_SIZE, workers)
+                    for per_child_phase in nightly.PER_CHILD_PHASES:
+                        if not journal.is_done(per_child_phase):
+                            journal.record(per_child_phase)
+                    continue
+                nightly.run_per_child_phase(journal, phase, per_child[phase], approver, settings,
+                                            children, NIGHTLY_CHILD_BATCH_SIZE)
+                journal.record(phase)
+                continue
+
+            with transaction.atomic(using=current_database()):
+                if phase == nightly.AUTO_APPROVE:
+                    auto_approve(approver, settings, journal.household_id)
+                elif phase == nightly.APPLY_LEADERBOARD_SCORING:
+                    batch = nightly.NightlyBatch(journal.household_id, approver, settings, children, day=journal.day)
+                    apply_leaderboard_scoring(approver=approver, batch=batch)
+                    batch.flush()
+                elif phase == nightly.RESET_DAILY_CHORES:
+                    reset_daily_chores(journal.household_id)
+                journal.record(phase)
+
+    journal.finish()
@@ -0,0 +1,162 @@
+"""
+Data version stamp for the dashboards.
+
+Every write to a household's dashboard data bumps that household's DataVersion
+row. Readers use the stamp to answer conditional GETs with 304 and to notice changes made by other
+processes (the cron job, other server workers) without re-running the page
+queries.
+"""
+
+import functools
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Dashboard data: users, chores, claims, point logs, settings and texts.
+# Kept per household, see household_key()
+DATA_VERSION_KEY = 'data'
+# Configuration and run state: settings, texts and the nightly run log
+CONFIG_VERSION_KEY = 'config'
+
+
+def household_key(household_id, key=DATA_VERSION_KEY):
+    """
+    The version stamp key for one household's data.
+
+    Args:
+        household_id: The household's pk
+        key: The stamp
+
+    Returns:
+        str: The key
+    """
+    return f"{key}:{household_id}"
+
+
+def bump_data_version(key=DATA_VERSION_KEY):
+    """
+    Record that data changed.
+
+    Called from model signals, and directly after bulk writes such as
+    QuerySet.update() that do not send signals.
+
+    Args:
+        key: Which version stamp to bump
+    """
+    from chore_app.models import DataVersion  # Import here to avoid circular imports
+    now = timezone.now()
+    updated = DataVersion.objects.filter(key=key).update(
+        version=F('version') + 1, updated_at=now)
+    if not updated:
+        DataVersion.objects.get_or_create(
+            key=key, defaults={'version': 1, 'updated_at': now})
+
+
+def get_data_version(key=DATA_VERSION_KEY):
+    """
+    Get the current version of a stamp.
+
+    Args:
+        key: Which version stamp to read
+
+    Returns:
+        tuple: (version, updated_at); (0, None) if nothing has been written yet
+    """
+    from chore_app.models import DataVersion  # Import here to avoid circular imports
+    row = DataVersion.objects.filter(key=key).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+async def aget_data_version(key=DATA_VERSION_KEY, using=None):
+    """Async version of get_data_version(), optionally on a given database."""
+    from chore_app.models import DataVersion  # Import here to avoid circular imports
+    queryset = DataVersion.objects.using(using) if using else DataVersion.objects
+    row = await queryset.filter(key=key).values_list('version', 'updated_at').afirst()
+    return row or (0, None)
+
+
+def request_data_version(request):
+    # Both condition callbacks need the stamp; look it up once per request
+    if not hasattr(request, '_data_version'):
+        request._data_version = get_data_version(household_key(request.user.household_id))
+    return request._data_version
+
+
+def prefetch_data_version(view):
+    """
+    Load the data version before an async view's conditional GET checks.
+
+    condition() calls profile_etag() and profile_last_modified() without
+    awaiting them, and they cannot query the database from the event loop.
+    Goes between login_required and condition.
+
+    Args:
+        view: The async view
+
+    Returns:
+        The wrapped view
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if user.is_authenticated and not hasattr(request, '_data_version'):
+            request._data_version = await aget_data_version(household_key(user.household_id))
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def profile_etag(request, *args, **kwargs):
+    """
+    ETag for a dashboard page.
+
+    Besides the data version, the page depends on who is viewing it, the
+    query string (pagination), the current hour (time-based chores, today's
+    leaderboard) and the CSRF cookie embedded in its forms. Pages with pending
+    flash messages are never treated as unchanged.
+
+    Args:
+        request: HTTP request object with authenticated user
+
+    Returns:
+        str: The ETag value, or None to skip conditional handling
+    """
+    if not request.user.is_authenticated:
+        return None
+    from django.contrib import messages as django_messages
+    if len(django_messages.get_messages(request)):
+        return None
+
+    version, _ = request_data_version(request)
+    hour = timezone.localtime().strftime('%Y%m%d%H')
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    variant = hashlib.md5(
+        f"{request.get_full_path()}|{csrf_cookie}".encode(), usedforsecurity=False
+    ).hexdigest()[:12]
+    return f"{version}-{request.user.household_id}-{request.user.pk}-{hour}-{variant}"
+
+
+def profile_last_modified(request, *args, **kwargs):
+    """
+    Last-Modified for a dashboard page.
+
+    The later of the last data write and the start of the current hour, since
+    time-based chores move between buckets on the hour.
+
+    Args:
+        request: HTTP request object with authenticated user
+
+    Returns:
+        datetime: The last modification time, or None
+    """
+    if not request.user.is_authenticated:
+        return None
+    _, updated_at = request_data_version(request)
+    hour_start = timezone.now().replace(minute=0, second=0, microsecond=0)
+    if updated_at is None:
+        return hour_start
+    return max(updated_at, hour_start)
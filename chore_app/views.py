@@ -1,23 +1,43 @@
-import datetime
 import logging
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, get_user_model, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages as django_messages
-from django.core.paginator import Paginator
+from django.conf import settings as django_settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import F, Q, Sum
+from django.db.models import F
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
-from django.views.decorators.http import require_POST
+from django.utils import timezone
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition, require_POST
 
+import chore_app.claims as claims
+import chore_app.events as events
 import chore_app.forms as forms
+import chore_app.metrics as app_metrics
 import chore_app.models as models
-from chore_app.utils import has_run_today, safe_get_object_or_404, nightly_action
+from chore_app.approvals import approve_claims
+from chore_app.archive import point_log_csv
+from chore_app.board import get_chore_board
+from chore_app.concurrent_reads import gather_reads
+from chore_app.config import get_config
+from chore_app.utils import has_run_today, safe_get_object_or_404, validate_pk
+from chore_app.pagination import keyset_paginate
+from chore_app.standings import get_leaderboard
+from chore_app.sync import stamp_changes
+from chore_app.telemetry import run_history as nightly_run_history, run_nightly_job
+from chore_app.fragment_cache import csrf_variant, get_stats as fragment_cache_stats
+from chore_app.tenancy import current_database
+from chore_app.versioning import (
+    prefetch_data_version, profile_etag, profile_last_modified, request_data_version
+)
 from chore_app.constants import (
-    POINTS_TO_MONEY_CONVERSION_RATE, POINT_VALUE_MULTIPLIER, EARLY_BONUS_START_HOUR,
-    POINT_LOGS_PER_PAGE, CHILD_POINT_LOGS_PER_PAGE, MAX_PENALTY_PERCENTAGE,
-    REJECTION_PENALTY, ALWAYS_AVAILABLE_TIME
+    POINTS_TO_MONEY_CONVERSION_RATE, POINT_VALUE_MULTIPLIER,
+    POINT_LOGS_PER_PAGE, CHILD_POINT_LOGS_PER_PAGE, MAX_PENALTY_PERCENTAGE, NIGHTLY_JOB_CODE
 )
 
 UserModel = get_user_model()
@@ -45,7 +65,15 @@ def register(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            form.save()
+            user = form.save(commit=False)
+            # Join the registering parent's household, else the one served on this domain
+            if request.user.is_authenticated:
+                user.household_id = request.user.household_id
+            elif request.household:
+                user.household_id = request.household.pk
+            else:
+                user.household_id = models.default_household_id()
+            user.save()
             return redirect('login')
     else:
         form = CustomUserCreationForm()
@@ -74,7 +102,8 @@ def profile(request):
 def settings(request):
     if request.user.role == 'Parent':
         context = {
-            'settings': models.Settings.objects.all()
+            'settings': models.Settings.objects.filter(household_id=request.user.household_id),
+            'fragment_cache_stats': sorted(fragment_cache_stats().items())
         }
         response = render(request, 'settings.html', context)
         response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -89,7 +118,8 @@ def edit_settings(request, pk):
         return redirect('child_profile')
     
     try:
-        settings = safe_get_object_or_404(models.Settings, pk, "Settings not found")
+        settings = safe_get_object_or_404(models.Settings, pk, "Settings not found",
+                                          household_id=request.user.household_id)
         if request.method == 'POST':
             form = forms.EditSettingsForm(request.POST, instance=settings)
             if form.is_valid():
@@ -106,7 +136,7 @@ def edit_settings(request, pk):
 def messages(request):
     if request.user.role == 'Parent':
         context = {
-            'messages': models.Text.objects.all()
+            'messages': models.Text.objects.filter(household_id=request.user.household_id)
         }
         response = render(request, 'messages.html', context)
         response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -114,13 +144,39 @@ def messages(request):
     else:
         return redirect('child_profile')
 
+@login_required
+def run_history(request):
+    """
+    The household's latest nightly runs, with the time and work of each phase.
+    """
+    if request.user.role != 'Parent':
+        return redirect('child_profile')
+    context = {'runs': nightly_run_history(request.user.household_id, NIGHTLY_JOB_CODE)}
+    response = render(request, 'run_history.html', context)
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+
+@login_required
+def export_point_log(request):
+    """
+    The household's whole point log, archived entries included, as a CSV download.
+    """
+    if request.user.role != 'Parent':
+        return redirect('child_profile')
+    response = StreamingHttpResponse(point_log_csv(request.user.household_id), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="point_log_{timezone.localdate():%Y-%m-%d}.csv"'
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+
 @login_required
 def edit_text(request, pk):
     if request.user.role != 'Parent':
         return redirect('child_profile')
     
     try:
-        text = safe_get_object_or_404(models.Text, pk, "Text not found")
+        text = safe_get_object_or_404(models.Text, pk, "Text not found", household_id=request.user.household_id)
         if request.method == 'POST':
             form = forms.EditTextForm(request.POST, instance=text)
             if form.is_valid():
@@ -134,148 +190,151 @@ def edit_text(request, pk):
         return redirect('parent_profile')
 
 @login_required
-def parent_profile(request):
+@prefetch_data_version
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
+async def parent_profile(request):
     if request.user.role != 'Parent':
         return redirect('child_profile')
 
-    point_logs = models.PointLog.objects.all().order_by('-date_recorded')
-    paginator = Paginator(point_logs, POINT_LOGS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    chore_points = models.PointLog.objects.filter(
-        date_recorded__date=datetime.date.today()
-    ).exclude(
-        chore=''
-    ).values(
-        'user', 'user__username'
-    ).annotate(
-        total_points=Sum('points_change')
-    ).order_by('-total_points')
+    household_id = request.user.household_id
 
-    daily_task_can_run = not has_run_today('chore_app.cron.nightly_action')
+    point_logs = models.PointLog.objects.filter(household_id=household_id).select_related('user', 'approver')
+    # Independent reads, run side by side
+    page_obj, chore_points, already_run = await gather_reads(
+        lambda: keyset_paginate(point_logs, request.GET, POINT_LOGS_PER_PAGE),
+        lambda: list(get_leaderboard(household_id)),
+        lambda: has_run_today(NIGHTLY_JOB_CODE, household_id),
+    )
 
     context = {
-        'available_chores': models.Chore.objects.filter(available=True),
-        'unavailable_chores': models.Chore.objects.filter(available=False),
-        'claimed_chores': models.ChoreClaim.objects.filter(approved=0).select_related('chore', 'user'),
+        'available_chores': models.Chore.objects.filter(household_id=household_id, available=True),
+        'unavailable_chores': models.Chore.objects.filter(household_id=household_id, available=False),
+        'claimed_chores': models.ChoreClaim.objects.filter(
+            household_id=household_id, approved=0).select_related('chore', 'user'),
         'chore_points': chore_points,
         'point_logs': page_obj,
-        'children': models.User.objects.filter(role='Child'),
-        'daily_task_can_run': daily_task_can_run
+        'children': models.User.objects.filter(household_id=household_id, role='Child'),
+        'daily_task_can_run': not already_run,
+        # Fragment cache keys; the querysets above only run on a cache miss
+        'household_id': household_id,
+        'data_version': request_data_version(request)[0],
+        'csrf_variant': csrf_variant(request),
+        'today': timezone.localdate(),
     }
-    response = render(request, 'parent_profile.html', context)
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    # Rendering may run the fragment querysets, which are sync
+    response = await sync_to_async(render)(request, 'parent_profile.html', context)
+    # Let browsers keep the page but revalidate it (ETag) on every poll
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
 @login_required
-def child_profile(request):
-    current_time = datetime.datetime.now().time()
-    current_hour = current_time.hour
-
-    point_logs = models.PointLog.objects.filter(
-        user=request.user).order_by('-date_recorded')
-    paginator = Paginator(point_logs, CHILD_POINT_LOGS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    chore_points = models.PointLog.objects.filter(
-        date_recorded__date=datetime.date.today()
-    ).exclude(
-        chore=''
-    ).values(
-        'user', 'user__username'
-    ).annotate(
-        total_points=Sum('points_change')
-    ).order_by('-total_points')
-
-    # Optimize queries to avoid N+1 problems
-    chores = models.Chore.objects.filter(available=True).prefetch_related('assigned_children')
-    claimed_chores = models.ChoreClaim.objects.filter(
-        user=request.user).select_related('chore')
-    
-    # Get claimed chore names for filtering
-    claimed_chore_names = list(claimed_chores.values_list('chore_name', flat=True))
-    
-    # Get chores claimed by other children for "any_selected" tasks
-    # This prevents other selected children from seeing tasks already claimed by someone else
-    claimed_by_others = models.ChoreClaim.objects.filter(
-        chore__assignment_type='any_selected',
-        chore__assigned_children=request.user
-    ).values_list('chore', flat=True)
-    
-    # Filter chores based on assignment type and user eligibility using database queries
-    # Use Q objects to combine conditions instead of union
-    eligible_chores_qs = chores.filter(
-        Q(assignment_type__in=['any_child', 'all_children']) |
-        Q(assignment_type__in=['any_selected', 'all_selected'], assigned_children=request.user)
-    )
-    
-    # Apply time-based filtering
-    # Available chores: always available OR (positive time and current time >= available_time) OR (negative time and current time <= abs(available_time))
-    available_time_filter = (
-        Q(available_time__exact=ALWAYS_AVAILABLE_TIME) |
-        Q(available_time__gte=0, available_time__lte=current_hour) |
-        Q(available_time__lt=0, available_time__lte=-current_hour)
+@prefetch_data_version
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
+async def child_profile(request):
+    current_hour = timezone.localtime().hour
+    user = request.user
+
+    point_logs = models.PointLog.objects.filter(user=user).select_related('approver')
+    # Independent reads, run side by side. The board is a single query for all
+    # eligible chores, bucketed by the current hour
+    page_obj, chore_points, board, config = await gather_reads(
+        lambda: keyset_paginate(point_logs, request.GET, CHILD_POINT_LOGS_PER_PAGE),
+        lambda: list(get_leaderboard(user.household_id)),
+        lambda: get_chore_board(user, current_hour),
+        lambda: get_config(user.household_id),
     )
-    
-    # Future chores: positive time and current time < available_time
-    future_time_filter = Q(available_time__gte=0, available_time__gt=current_hour)
-    
-    # Missed chores: negative time and current time > abs(available_time)
-    # For negative available_time, missed means current_time.hour > abs(available_time)
-    # This means: available_time < 0 AND current_time.hour > abs(available_time)
-    # Which is equivalent to: available_time < 0 AND -available_time < current_time.hour
-    # In Django Q: available_time < 0 AND -available_time < current_hour
-    # Which is: available_time < 0 AND available_time > -current_hour
-    missed_time_filter = Q(available_time__lt=0) & Q(available_time__gt=-current_hour)
-    
-    # The issue is that both available and missed conditions can be true for the same chore
-    # We need to prioritize missed over available for negative time values
-    # So available should exclude missed chores
-    available_time_filter = available_time_filter & ~missed_time_filter
-    
-    filtered_chores = eligible_chores_qs.exclude(
-        name__in=claimed_chore_names
-    ).exclude(
-        id__in=claimed_by_others
-    ).filter(available_time_filter)
-    
-    future_chores = eligible_chores_qs.exclude(
-        name__in=claimed_chore_names
-    ).exclude(
-        id__in=claimed_by_others
-    ).filter(future_time_filter)
-    
-    missed_chores = eligible_chores_qs.exclude(
-        name__in=claimed_chore_names
-    ).exclude(
-        id__in=claimed_by_others
-    ).filter(missed_time_filter)
-    
-
-    settings = {setting.key: setting.value for setting in models.Settings.objects.all()}
+    settings = config.settings
 
     context = {
         'minimum_points': settings['max_points'] / 2,
-        'pocket_money': request.user.pocket_money / 100,
+        'pocket_money': user.pocket_money / 100,
         'pocket_money_amount': settings['point_value'],
-        'points': request.user.points_balance,
-        'chores': filtered_chores,
+        'points': user.points_balance,
+        'chores': board['available'],
         'chore_points': chore_points,
         'point_logs': page_obj,  # Use the paginated page_obj instead of the original queryset
-        'claimed_chores': claimed_chores,
-        'future_chores': future_chores,
-        'missed_chores': missed_chores,
+        'claimed_chores': board['claimed'],
+        'future_chores': board['future'],
+        'missed_chores': board['missed'],
         'max_points': settings['max_points'],
         'min_points': settings['min_points'],
         'leaderboard_awards': settings['leaderboard_awards'],
         'incomplete_chores_penalty': settings['incomplete_chores_penalty'],
-        'daily_message': models.Text.objects.get(key='daily_message')
+        'daily_message': config.text('daily_message')
     }
-    response = render(request, 'child_profile.html', context)
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response = await sync_to_async(render)(request, 'child_profile.html', context)
+    # Let browsers keep the page but revalidate it (ETag) on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@ensure_csrf_cookie
+def kiosk(request):
+    """
+    Offline-capable child dashboard for wall tablets.
+
+    The page is an app shell with no data in it: a service worker caches it
+    and its assets, and the script syncs the board through the JSON API's
+    delta endpoint, queueing claims made while the server is unreachable.
+
+    Args:
+        request: HTTP request object with authenticated user
+
+    Returns:
+        The kiosk app shell
+    """
+    if request.user.role != 'Child':
+        return redirect('parent_profile')
+    response = render(request, 'kiosk.html')
+    # The service worker serves it offline; online, always revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def kiosk_service_worker(request):
+    """
+    The kiosk's service worker, served from /kiosk/ so that is its scope.
+    """
+    response = render(request, 'kiosk_sw.js', content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def metrics(request):
+    """
+    Prometheus metrics of every server process, for a local scraper.
+    """
+    if request.META.get('REMOTE_ADDR') not in django_settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(app_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+async def live_events(request):
+    """
+    Stream board change events to a dashboard as Server-Sent Events.
+
+    Holding a connection open is only cheap under an ASGI server. Under WSGI
+    this returns 204, which tells the browser's EventSource not to reconnect,
+    and the page falls back to a timed refresh.
+
+    Args:
+        request: HTTP request object with authenticated user
+
+    Returns:
+        A text/event-stream response, or 204 when not served over ASGI
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    response = StreamingHttpResponse(events.event_stream(user.household_id, current_database()),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
     return response
 
 
@@ -285,15 +344,19 @@ def create_chore(request):
         return redirect('child_profile')
     
     if request.method == 'POST':
-        form = forms.ChoreForm(request.POST)
+        form = forms.ChoreForm(request.POST, household_id=request.user.household_id)
         if form.is_valid():
-            form.save()
+            chore = form.save(commit=False)
+            chore.household_id = request.user.household_id
+            chore.save()
+            form.save_m2m()
+            events.publish_on_commit(events.AVAILABILITY_CHANGED, chore.household_id, chore=chore.pk)
             django_messages.success(request, 'Chore created successfully!')
             return redirect('parent_profile')
     else:
-        form = forms.ChoreForm()
+        form = forms.ChoreForm(household_id=request.user.household_id)
     
-    children = models.User.objects.filter(role='Child')
+    children = models.User.objects.filter(household_id=request.user.household_id, role='Child')
     return render(request, 'create_chore.html', {'form': form, 'children': children})
 
 
@@ -303,17 +366,20 @@ def edit_chore(request, pk):
         return redirect('child_profile')
     
     try:
-        chore = models.Chore.objects.get(pk=pk)
+        # The template checks each child against the chore's assignments
+        chore = models.Chore.objects.prefetch_related('assigned_children').get(
+            pk=pk, household_id=request.user.household_id)
         if request.method == 'POST':
-            form = forms.EditChoreForm(request.POST, instance=chore)
+            form = forms.EditChoreForm(request.POST, instance=chore, household_id=chore.household_id)
             if form.is_valid():
                 form.save()
+                events.publish_on_commit(events.AVAILABILITY_CHANGED, chore.household_id, chore=chore.pk)
                 django_messages.success(request, 'Chore updated successfully!')
                 return redirect('parent_profile')
         else:
-            form = forms.EditChoreForm(instance=chore)
+            form = forms.EditChoreForm(instance=chore, household_id=chore.household_id)
         
-        children = models.User.objects.filter(role='Child')
+        children = models.User.objects.filter(household_id=chore.household_id, role='Child')
         return render(request, 'edit_chore.html', {'form': form, 'chore': chore, 'children': children})
     except (models.Chore.DoesNotExist, Exception) as e:
         logger.error(f"Error in edit_chore: {e}")
@@ -328,9 +394,10 @@ def toggle_availability(request, pk):
     
     if request.method == 'POST':
         try:
-            chore = models.Chore.objects.get(pk=pk)
+            chore = models.Chore.objects.get(pk=pk, household_id=request.user.household_id)
             chore.available = not chore.available
             chore.save()
+            events.publish_on_commit(events.AVAILABILITY_CHANGED, chore.household_id, chore=chore.pk)
             status = "available" if chore.available else "unavailable"
             django_messages.success(request, f'Chore is now {status}!')
         except (models.Chore.DoesNotExist, Exception) as e:
@@ -347,20 +414,20 @@ def convert_points_to_money(request, pk):
 
     if request.method == 'POST':
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=current_database()):
                 user = models.User.objects.select_for_update().get(pk=pk)
 
                 # Get required settings
-                try:
-                    max_points_setting = models.Settings.objects.get(key='max_points')
-                    point_value_setting = models.Settings.objects.get(key='point_value')
-                except models.Settings.DoesNotExist as e:
-                    logger.error(f"Required setting not found: {e}")
+                config = get_config(user.household_id)
+                max_points = config.setting('max_points')
+                point_value = config.setting('point_value')
+                if max_points is None or point_value is None:
+                    logger.error("Required setting not found: max_points or point_value")
                     django_messages.error(request, 'System configuration error. Please contact administrator.')
                     return redirect('child_profile')
 
                 original_balance = user.points_balance
-                minimum_points = max_points_setting.value / 2
+                minimum_points = max_points / 2
 
                 logger.info(f"Convert points to money for {user.username}: original_balance={original_balance}, minimum_points={minimum_points}, conversion_rate={POINTS_TO_MONEY_CONVERSION_RATE}")
 
@@ -377,7 +444,7 @@ def convert_points_to_money(request, pk):
                     return redirect('child_profile')
 
                 # Calculate money amount
-                money_amount = POINTS_TO_MONEY_CONVERSION_RATE * point_value_setting.value
+                money_amount = POINTS_TO_MONEY_CONVERSION_RATE * point_value
 
                 # Update user's balance
                 user.pocket_money += money_amount
@@ -388,6 +455,7 @@ def convert_points_to_money(request, pk):
 
                 # Create point log entry
                 models.PointLog.objects.create(
+                    household_id=user.household_id,
                     user=user,
                     points_change=-POINTS_TO_MONEY_CONVERSION_RATE,
                     penalty=0,
@@ -395,6 +463,7 @@ def convert_points_to_money(request, pk):
                     chore='',
                     approver=user
                 )
+                events.publish_on_commit(events.BALANCE_CHANGED, user.household_id, user=user.pk)
                 django_messages.success(request, f'Successfully converted {POINTS_TO_MONEY_CONVERSION_RATE} points to ${money_amount:.2f} pocket money!')
 
         except (models.User.DoesNotExist, Exception) as e:
@@ -412,8 +481,9 @@ def delete_chore(request, pk):
     
     if request.method == 'POST':
         try:
-            chore = models.Chore.objects.get(pk=pk)
+            chore = models.Chore.objects.get(pk=pk, household_id=request.user.household_id)
             chore.delete()
+            events.publish_on_commit(events.AVAILABILITY_CHANGED, chore.household_id, chore=pk)
         except (models.Chore.DoesNotExist, Exception) as e:
             logger.error(f"Error in delete_chore: {e}")
     return redirect('parent_profile')
@@ -426,13 +496,19 @@ def penalise_chore(request, pk):
     
     if request.method == 'POST':
         try:
-            chore = models.Chore.objects.get(pk=pk)
-            chore.available = False
-            chore.save()
-            for child in models.User.objects.filter(role='Child'):
-                models.ChoreClaim.objects.create(
-                    chore=chore, user=child, chore_name=chore.name, points=(-chore.points), approved=(-chore.points), comment='Penalty for incomplete chore'
-                )
+            chore = models.Chore.objects.get(pk=pk, household_id=request.user.household_id)
+            with transaction.atomic(using=current_database()):
+                chore.available = False
+                chore.save()
+                penalties = models.ChoreClaim.objects.bulk_create([
+                    models.ChoreClaim(
+                        household_id=chore.household_id, chore=chore, user=child, chore_name=chore.name, points=(-chore.points), approved=(-chore.points), comment='Penalty for incomplete chore'
+                    )
+                    for child in models.User.objects.filter(household_id=chore.household_id, role='Child')
+                ])
+                # bulk_create sends no signals
+                stamp_changes(chore.household_id, models.ChoreClaim.objects.filter(pk__in=[claim.pk for claim in penalties]))
+            events.publish_on_commit(events.AVAILABILITY_CHANGED, chore.household_id, chore=chore.pk)
         except (models.Chore.DoesNotExist, Exception) as e:
             logger.error(f"Error in penalise_chore: {e}")
     return redirect('parent_profile')
@@ -442,91 +518,10 @@ def penalise_chore(request, pk):
 @require_POST
 def claim_chore(request, pk):
     try:
-        current_time = datetime.datetime.now().time()
-        
-        with transaction.atomic():
-            # Use select_for_update to prevent race conditions
-            chore = models.Chore.objects.select_for_update().get(pk=pk)
-            
-            if not chore.available:
-                django_messages.warning(request, 'This chore is no longer available.')
-                return redirect('child_profile')
-            
-            # Check if user is allowed to claim this chore based on assignment type
-            can_claim = False
-            if chore.assignment_type == 'any_child':
-                can_claim = True
-            elif chore.assignment_type == 'all_children':
-                can_claim = True
-            elif chore.assignment_type == 'any_selected':
-                can_claim = chore.assigned_children.filter(id=request.user.id).exists()
-            elif chore.assignment_type == 'all_selected':
-                can_claim = chore.assigned_children.filter(id=request.user.id).exists()
-            
-            if not can_claim:
-                django_messages.warning(request, 'You are not allowed to claim this chore.')
-                return redirect('child_profile')
-            
-            # Check if user has already claimed this chore
-            existing_claim = models.ChoreClaim.objects.filter(
-                chore=chore, 
-                user=request.user, 
-                approved=0
-            ).exists()
-            
-            if existing_claim:
-                django_messages.warning(request, 'You have already claimed this chore.')
-                return redirect('child_profile')
-            
-            # Calculate points and bonus
-            if current_time <= datetime.time(chore.bonus_end_time) \
-                    and current_time > datetime.time(EARLY_BONUS_START_HOUR) \
-                    and chore.early_bonus:
-                try:
-                    bonus_percent = models.Settings.objects.get(key='bonus_percent').value
-                    addPoints = chore.points * ((bonus_percent + 100) / 100)
-                    bonus_points = addPoints - chore.points
-                    comment = f'Early Bonus of {bonus_points:.0f} points: {chore.comment}'
-                except models.Settings.DoesNotExist:
-                    addPoints = chore.points
-                    comment = chore.comment
-            else:
-                addPoints = chore.points
-                comment = chore.comment
-            
-            # Create the chore claim
-            models.ChoreClaim.objects.create(
-                chore=chore, 
-                user=request.user, 
-                chore_name=chore.name, 
-                points=addPoints, 
-                comment=comment
-            )
-            
-            # Determine if chore should remain available after being claimed
-            if chore.assignment_type == 'any_child':
-                chore.available = False
-                chore.save()
-            elif chore.assignment_type == 'all_children':
-                # Keep available for all children
-                pass
-            elif chore.assignment_type == 'any_selected':
-                # For "Any of Selected Children", hide after ANY selected child claims it
-                chore.available = False
-                chore.save()
-            elif chore.assignment_type == 'all_selected':
-                # For "All of Selected Children", only hide after ALL selected children claim it
-                selected_children = chore.assigned_children.all()
-                claimed_by_selected = models.ChoreClaim.objects.filter(
-                    chore=chore, 
-                    user__in=selected_children
-                ).values_list('user', flat=True).distinct()
-                if set(claimed_by_selected) == set(selected_children.values_list('id', flat=True)):
-                    chore.available = False
-                    chore.save()
-            
-            django_messages.success(request, f'Successfully claimed "{chore.name}"!')
-            
+        claim = claims.claim_chore(request.user, pk)
+        django_messages.success(request, f'Successfully claimed "{claim.chore_name}"!')
+    except claims.ClaimError as e:
+        django_messages.warning(request, str(e))
     except (models.Chore.DoesNotExist, models.Settings.DoesNotExist, Exception) as e:
         logger.error(f"Error in claim_chore: {e}")
         django_messages.error(request, 'Error claiming chore. Please try again.')
@@ -538,16 +533,9 @@ def claim_chore(request, pk):
 @require_POST
 def return_chore(request, pk):
     try:
-        choreClaim = models.ChoreClaim.objects.get(pk=pk)
-        if choreClaim.approved == 0:
-            if choreClaim.chore:
-                try:
-                    chore = models.Chore.objects.get(pk=choreClaim.chore.pk)
-                    chore.available = True
-                    chore.save()
-                except (models.Chore.DoesNotExist, Exception) as e:
-                    logger.error(f"Error in return_chore (chore lookup): {e}")
-            choreClaim.delete()
+        claims.return_claim(request.user.household_id, pk)
+    except claims.ClaimError as e:
+        django_messages.warning(request, str(e))
     except (models.ChoreClaim.DoesNotExist, Exception) as e:
         logger.error(f"Error in return_chore: {e}")
     return redirect('child_profile')
@@ -559,79 +547,18 @@ def approve_chore_claim(request, pk, penalty, auto=False):
         return redirect('child_profile')
     
     if request.method == 'POST' or auto:
-        try:
-            with transaction.atomic():
-                # Validate penalty is within acceptable range
-                if penalty < 0 or penalty > 100:
-                    if not auto:
-                        django_messages.error(request, 'Invalid penalty percentage.')
-                        return redirect('parent_profile')
-                    else:
-                        logger.error(f"Invalid penalty percentage: {penalty}")
-                        return HttpResponse("Error: Invalid penalty")
-                
-                choreClaim = models.ChoreClaim.objects.select_for_update().get(pk=pk)
-                
-                # Check if already processed
-                if choreClaim.approved != 0:
-                    if not auto:
-                        django_messages.warning(request, 'This chore claim has already been processed.')
-                        return redirect('parent_profile')
-                    else:
-                        logger.warning(f"Chore claim {pk} already processed")
-                        return HttpResponse("Already processed")
-                
-                approver = request.user if not auto else None
-                # Convert penalty to Decimal to avoid type errors
-                from decimal import Decimal
-                penalty_decimal = Decimal(str(penalty))
-                points_awarded = choreClaim.points - (choreClaim.points * (penalty_decimal / 100))
-                
-                # Validate points_awarded is not negative
-                if points_awarded < 0:
-                    points_awarded = 0
-                
-                # Create point log entry
-                models.PointLog.objects.create(
-                    user=choreClaim.user, 
-                    points_change=points_awarded, 
-                    penalty=penalty, 
-                    reason='Approved', 
-                    chore=choreClaim.chore_name, 
-                    approver=approver
-                )
-                
-                # Update user's points balance
-                user = models.User.objects.select_for_update().get(pk=choreClaim.user.pk)
-                user.points_balance += points_awarded
-                user.save()
-                
-                # Update chore claim
-                choreClaim.approved = points_awarded
-                choreClaim.save()
-                
-                # For non-daily chores, ensure they remain unavailable after completion
-                if choreClaim.chore and not choreClaim.chore.daily:
-                    choreClaim.chore.available = False
-                    choreClaim.chore.save()
-                
-                if not auto:
-                    django_messages.success(request, f'Chore claim approved for {points_awarded} points!')
-                
-        except models.ChoreClaim.DoesNotExist:
-            if not auto:
-                django_messages.error(request, 'Chore claim not found.')
-                return redirect('parent_profile')
-            else:
-                logger.error(f"Chore claim {pk} not found")
-                return HttpResponse("Error: Chore claim not found")
-        except models.User.DoesNotExist:
+        # Validate penalty is within acceptable range
+        if penalty < 0 or penalty > 100:
             if not auto:
-                django_messages.error(request, 'User not found.')
+                django_messages.error(request, 'Invalid penalty percentage.')
                 return redirect('parent_profile')
             else:
-                logger.error(f"User not found for chore claim {pk}")
-                return HttpResponse("Error: User not found")
+                logger.error(f"Invalid penalty percentage: {penalty}")
+                return HttpResponse("Error: Invalid penalty")
+
+        try:
+            approver = request.user if not auto else None
+            approved = approve_claims(request.user.household_id, {pk: penalty}, approver)
         except Exception as e:
             if not auto:
                 logger.error(f"Error in approve_chore_claim: {e}")
@@ -640,14 +567,60 @@ def approve_chore_claim(request, pk, penalty, auto=False):
             else:
                 logger.error(f"Error in approve_chore_claim (auto): {e}")
                 return HttpResponse("Error: Internal error")
+
+        if not approved:
+            # Missing, or approved or rejected in the meantime
+            if not auto:
+                django_messages.warning(request, 'This chore claim has already been processed.')
+                return redirect('parent_profile')
+            else:
+                logger.warning(f"Chore claim {pk} not found or already processed")
+                return HttpResponse("Already processed")
+
+        if not auto:
+            _, points_awarded = approved[0]
+            django_messages.success(request, f'Chore claim approved for {points_awarded} points!')
     
     if not auto:
         return redirect('parent_profile')
     else:
         # For auto mode, return a simple success response
-        from django.http import HttpResponse
         return HttpResponse("OK")
 
+
+@login_required
+@require_POST
+def approve_selected_claims(request):
+    if request.user.role != 'Parent':
+        return redirect('child_profile')
+
+    try:
+        penalty = int(request.POST.get('penalty', 0))
+        claim_pks = [validate_pk(pk) for pk in request.POST.getlist('claims')]
+    except (ValueError, Http404):
+        django_messages.error(request, 'Invalid approval request.')
+        return redirect('parent_profile')
+
+    if not claim_pks:
+        django_messages.warning(request, 'No chore claims selected.')
+        return redirect('parent_profile')
+    if penalty < 0 or penalty > 100:
+        django_messages.error(request, 'Invalid penalty percentage.')
+        return redirect('parent_profile')
+
+    try:
+        approved = approve_claims(request.user.household_id, {pk: penalty for pk in claim_pks}, request.user)
+    except Exception as e:
+        logger.error(f"Error in approve_selected_claims: {e}")
+        django_messages.error(request, 'Error approving chore claims.')
+        return redirect('parent_profile')
+
+    if len(approved) < len(claim_pks):
+        django_messages.warning(request, f'{len(claim_pks) - len(approved)} chore claims had already been processed.')
+    if approved:
+        django_messages.success(request, f'Approved {len(approved)} chore claims!')
+    return redirect('parent_profile')
+
 @login_required
 @require_POST
 def reject_chore_claim(request, pk):
@@ -656,17 +629,7 @@ def reject_chore_claim(request, pk):
     
     if request.method == 'POST':
         try:
-            choreClaim = models.ChoreClaim.objects.get(pk=pk)
-            if choreClaim.chore:
-                try:
-                    chore = models.Chore.objects.get(pk=choreClaim.chore.pk)
-                    chore.available = True
-                    chore.save()
-                except (models.Chore.DoesNotExist, Exception) as e:
-                    logger.error(f"Error in reject_chore_claim (chore lookup): {e}")
-            models.PointLog.objects.create(user=choreClaim.user, points_change=0, penalty=REJECTION_PENALTY,
-                                           reason='Rejected', chore=choreClaim.chore_name, approver=request.user)
-            choreClaim.delete()
+            claims.reject_claim(request.user.household_id, pk, request.user)
         except (models.ChoreClaim.DoesNotExist, Exception) as e:
             logger.error(f"Error in reject_chore_claim: {e}")
     return redirect('parent_profile')
@@ -680,7 +643,7 @@ def point_adjustment(request, pk):
     if request.method == 'POST':
         form = forms.PointAdjustmentForm(request.POST)
         if form.is_valid():
-            user = models.User.objects.get(pk=pk)
+            user = models.User.objects.get(pk=pk, household_id=request.user.household_id)
             points_change = form.cleaned_data['points_change']
             original_balance = user.points_balance
             new_balance = original_balance + points_change
@@ -688,12 +651,14 @@ def point_adjustment(request, pk):
             logger.info(f"Point adjustment for {user.username}: original_balance={original_balance}, change={points_change}, new_balance={new_balance}")
 
             point_log = form.save(commit=False)
+            point_log.household_id = user.household_id
             point_log.user = user
             point_log.approver = request.user
             point_log.save()
 
             user.points_balance += points_change
             user.save()
+            events.publish_on_commit(events.BALANCE_CHANGED, user.household_id, user=user.pk)
             return redirect('parent_profile')
     else:
         form = forms.PointAdjustmentForm()
@@ -708,10 +673,11 @@ def pocket_money_adjustment(request, pk):
     if request.method == 'POST':
         form = forms.PocketMoneyAdjustmentForm(request.POST)
         if form.is_valid():
-            user = models.User.objects.get(pk=pk)
+            user = models.User.objects.get(pk=pk, household_id=request.user.household_id)
 
             user.pocket_money += form.cleaned_data['pocket_money']
             user.save()
+            events.publish_on_commit(events.BALANCE_CHANGED, user.household_id, user=user.pk)
             return redirect('parent_profile')
     else:
         form = forms.PocketMoneyAdjustmentForm()
@@ -723,8 +689,10 @@ def child_chore(request):
         form = forms.CustomChildChore(request.POST)
         if form.is_valid():
             chore_claim = form.save(commit=False)
+            chore_claim.household_id = request.user.household_id
             chore_claim.user = request.user
             chore_claim.save()
+            events.publish_on_commit(events.CHORE_CLAIMED, request.user.household_id, chore=None, user=request.user.pk)
             return redirect('child_profile')
     else:
         form = forms.CustomChildChore()
@@ -733,7 +701,7 @@ def child_chore(request):
 @login_required
 def daily_action(request):
     # Check if the daily task has already been run today
-    if has_run_today('chore_app.cron.nightly_action'):
+    if has_run_today(NIGHTLY_JOB_CODE, request.user.household_id, use_cache=False):
         # If it has already run, redirect back to parent profile with an error message
         django_messages.error(request, 'Daily action has already been run today.')
         return redirect('parent_profile')
@@ -744,7 +712,7 @@ def daily_action(request):
         return redirect('child_profile')
     
     try:
-        nightly_action(approver=request.user)
+        run_nightly_job(request.user.household_id, request.user, NIGHTLY_JOB_CODE)
         django_messages.success(request, 'Daily action completed successfully!')
     except Exception as e:
         logger.error(f"Error in daily_action: {e}", exc_info=True)
@@ -32,6 +32,7 @@ pkgs.mkShell {
     
     # Run Django migrations if needed
     echo "Running Django migrations..."
+    python manage.py upgrade_households
     python manage.py makemigrations
     python manage.py makemigrations chore_app
     python manage.py migrate
@@ -17,6 +17,7 @@ if %errorlevel% neq 0 (
     python -m pip install django django-allauth django-cron
 )
 
+python manage.py upgrade_households
 python manage.py makemigrations
 python manage.py makemigrations chore_app
 python manage.py migrate
@@ -23,6 +23,7 @@ if ! command -v django-admin &>/dev/null; then
     python3 -m pip install django django-allauth django-cron
 fi
 
+python3 manage.py upgrade_households
 python3 manage.py makemigrations
 python3 manage.py makemigrations chore_app
 python3 manage.py migrate
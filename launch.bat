@@ -1,7 +1,25 @@
 @echo off
+rem Usage: launch.bat             development server (runserver, DEBUG on)
+rem        launch.bat production  uvicorn with CHORE_WORKERS worker processes
+rem                               (default: one per CPU core), DEBUG off
+if "%1"=="production" goto production
 python3 manage.py runserver 0.0.0.0:8000
+goto done
+
+:production
+set DJANGO_DEBUG=False
+if not defined CHORE_WORKERS set CHORE_WORKERS=%NUMBER_OF_PROCESSORS%
+rem Hashed, pre-compressed copies of the static files
+python3 manage.py collectstatic --noinput
+if errorlevel 1 exit /b 1
+rem Metrics start from zero with each launch
+if not defined CHORE_METRICS_DIR set CHORE_METRICS_DIR=metrics
+if exist "%CHORE_METRICS_DIR%\*.json" del /q "%CHORE_METRICS_DIR%\*.json"
+python3 -m uvicorn chore_app.asgi:application --host 0.0.0.0 --port 8000 --workers %CHORE_WORKERS%
+
+:done
 if errorlevel 1 (
     echo Server failed to start.
 ) else (
     echo Server is running.
-)
\ No newline at end of file
+)
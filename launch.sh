@@ -1,8 +1,23 @@
+# Usage: ./launch.sh             development server (runserver, DEBUG on)
+#        ./launch.sh production  uvicorn with CHORE_WORKERS worker processes
+#                                (default: one per CPU core), DEBUG off
+if [ "$1" = "production" ]; then
+    export DJANGO_DEBUG=False
+    WORKERS="${CHORE_WORKERS:-$(python3 -c 'import os; print(os.cpu_count() or 1)')}"
+    # Hashed, pre-compressed copies of the static files
+    python3 manage.py collectstatic --noinput || exit 1
+    # Metrics start from zero with each launch
+    rm -f "${CHORE_METRICS_DIR:-metrics}"/*.json
+    SERVER="python3 -m uvicorn chore_app.asgi:application --host 0.0.0.0 --port 8000 --workers $WORKERS"
+else
+    SERVER="python3 manage.py runserver 0.0.0.0:8000"
+fi
+
 if ! command -v screen &>/dev/null; then
     echo "Screen is is not installed. Running in the foreground..."
-    python3 manage.py runserver 0.0.0.0:8000
+    $SERVER
 else
-    screen -d -m -S "chore_app" python3 manage.py runserver 0.0.0.0:8000
+    screen -d -m -S "chore_app" $SERVER
     if [ $? -eq 0 ]; then
         echo "Running chore_app in Screen. Run screen -r chore_app to attach."
     else
@@ -15,7 +15,7 @@ source venv/bin/activate
 # Install/upgrade packages
 echo "Installing/upgrading Python packages..."
 pip install --upgrade pip
-pip install django django-allauth django-cron
+pip install django django-allauth django-cron uvicorn brotli
 
 # Fix django-cron migrations for Django 5.2+ compatibility
 echo "Fixing django-cron migrations for Django 5.2+ compatibility..."
@@ -23,6 +23,7 @@ python fix_django_cron_migrations.py
 
 # Run migrations
 echo "Running Django migrations..."
+python manage.py upgrade_households
 python manage.py makemigrations
 python manage.py makemigrations chore_app
 python manage.py migrate